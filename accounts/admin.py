@@ -22,5 +22,13 @@ class UserAdmin(BaseUserAdmin):
 # Re-register UserAdmin
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
-admin.site.register(UserProfile)
+
+
+@admin.register(UserProfile)
+class UserProfileAdmin(admin.ModelAdmin):
+    """Admin interface for UserProfile model."""
+    list_display = ['user', 'role', 'phone_number']
+    list_filter = ['role']
+    list_select_related = ['user']
+    search_fields = ['^user__username']
 
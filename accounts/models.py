@@ -52,3 +52,10 @@ def save_user_profile(sender, instance, **kwargs):
     if hasattr(instance, 'profile'):
         instance.profile.save()
 
+
+
+async def ais_admin(user):
+    """Check if user is an admin, from async code, with a single profile lookup."""
+    if not user.is_authenticated:
+        return False
+    return await UserProfile.objects.filter(user_id=user.pk, role='admin').aexists()
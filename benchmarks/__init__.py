@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for the pizza shop.
+
+Run from the project root, e.g. ``python -m benchmarks.bench_sessions``.
+"""
@@ -0,0 +1,83 @@
+"""
+Measure the admin order list's HTML size per order row, raw and compressed.
+
+The page is fetched through the full middleware stack with few and with many
+orders; the difference divided by the extra rows is the cost of one row.
+Orders vary in customer, status, total, items and date (seeded), since gzip
+would all but remove rows that repeat each other.
+
+    python -m benchmarks.bench_admin_payload [--orders 200] [--seed 1]
+"""
+import argparse
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.common import (create_catalog, create_user, setup_django,
+                               test_database)
+
+
+def page_sizes(client):
+    """Return (raw bytes, gzip bytes) of the admin order list."""
+    from django.urls import reverse
+
+    url = reverse('orders:admin_order_list')
+    raw = len(client.get(url).content)
+    compressed = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+    gzipped = len(compressed.content) if compressed.get('Content-Encoding') == 'gzip' else raw
+    return raw, gzipped
+
+
+def run(orders, seed):
+    random.seed(seed)
+    from django.test import Client
+    from django.utils import timezone
+
+    from orders.models import Order, OrderItem
+
+    products = create_catalog()
+    create_user('bench-admin', role='admin')
+    customers = [create_user(f'bench-customer-{random.randbytes(3).hex()}') for _ in range(25)]
+    statuses = [status for status, _ in Order.STATUS_CHOICES]
+    now = timezone.now()
+    client = Client()
+    client.login(username='bench-admin', password='benchpass123')
+
+    def add_orders(count):
+        for _ in range(count):
+            lines = [(product, random.randint(1, 4)) for product in random.sample(products, random.randint(1, 4))]
+            order = Order.objects.create(
+                customer=random.choice(customers),
+                status=random.choice(statuses),
+                total_price=sum(product.price * quantity for product, quantity in lines),
+            )
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+                for product, quantity in lines
+            )
+            created_at = now - timedelta(minutes=random.randint(0, 60 * 24 * 30))
+            Order.objects.filter(pk=order.pk).update(created_at=created_at, updated_at=created_at)
+
+    add_orders(10)
+    base_raw, base_gzip = page_sizes(client)
+    add_orders(orders - 10)
+    raw, gzipped = page_sizes(client)
+    rows = orders - 10
+
+    print(f'{"":14} {"10 orders":>10} {f"{orders} orders":>12} {"per row":>9}')
+    print(f'{"raw bytes":14} {base_raw:10d} {raw:12d} {(raw - base_raw) / rows:9.1f}')
+    print(f'{"gzip bytes":14} {base_gzip:10d} {gzipped:12d} {(gzipped - base_gzip) / rows:9.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', type=int, default=200, help='Orders on the large page (at least 11).')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the generated orders.')
+    args = parser.parse_args()
+    setup_django()
+    with test_database():
+        run(max(args.orders, 11), args.seed)
+
+
+if __name__ == '__main__':
+    main()
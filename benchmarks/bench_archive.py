@@ -0,0 +1,118 @@
+"""
+Time the hot order queries before and after archiving old orders.
+
+Seeds a long order history (mostly old, delivered or cancelled orders plus a
+recent tail), times the queries customers and admins run against Order, runs
+the archival in batches and times them again. Archived orders are then only
+reached through the slower fallback, which is timed as well.
+
+    python -m benchmarks.bench_archive [--orders 200000] [--recent 0.05] [--iterations 200]
+"""
+import argparse
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.common import (create_catalog, create_user, setup_django,
+                               summarize, test_database)
+
+SEED_BATCH = 5000
+CUSTOMERS = 50
+
+
+def seed(customers, products, count, recent_share):
+    """Insert ``count`` orders; all but ``recent_share`` of them are old and finished."""
+    from django.utils import timezone
+
+    from orders.models import Order, OrderItem
+
+    now = timezone.now()
+    recent_from = int(count * (1 - recent_share))
+    for offset in range(0, count, SEED_BATCH):
+        orders = []
+        stamps = defaultdict(list)
+        for i in range(offset, min(offset + SEED_BATCH, count)):
+            if i < recent_from:
+                status, age = ('delivered', 'cancelled')[i % 10 == 0], timedelta(days=400 - i * 200 // count)
+            else:
+                status, age = ('pending', 'paid', 'delivered')[i % 3], timedelta(days=(count - i) % 30)
+            orders.append(Order(customer=customers[i % len(customers)], status=status, total_price=Decimal('19.98')))
+            stamps[now - age].append(len(orders) - 1)
+        created = Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[order.pk % len(products)], quantity=2, price=Decimal('9.99'))
+            for order in created
+        ])
+        # auto_now_add/auto_now cannot be set on insert; backdate per day instead.
+        for stamp, positions in stamps.items():
+            Order.objects.filter(pk__in=[created[p].pk for p in positions]).update(created_at=stamp, updated_at=stamp)
+
+
+def hot_queries(customer, recent_id, archived_id):
+    """name -> callable, the reads views run on every request."""
+    from orders import archive
+    from orders.models import Order
+
+    return {
+        'customer order list': lambda: list(Order.objects.filter(customer=customer).prefetch_related('items')),
+        'admin pending list': lambda: list(Order.objects.filter(status='pending').select_related('customer')[:100]),
+        'order count': lambda: Order.objects.count(),
+        'recent order detail': lambda: archive.get_order(recent_id),
+        'archived order detail': lambda: archive.get_order(archived_id),
+    }
+
+
+def time_queries(queries, iterations):
+    results = {}
+    for name, query in queries.items():
+        query()
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = summarize(timings)
+    return results
+
+
+def run(orders, recent_share, iterations, batch_size):
+    from orders import archive
+    from orders.models import Order
+
+    products = create_catalog()
+    customers = [create_user(f'bench-customer-{i}') for i in range(CUSTOMERS)]
+    seed(customers, products, orders, recent_share)
+    recent_id = Order.objects.order_by('-pk').values_list('pk', flat=True)[1]
+    archived_id = Order.objects.filter(status='delivered').order_by('pk').values_list('pk', flat=True).first()
+    queries = hot_queries(customers[0], recent_id, archived_id)
+
+    before = time_queries(queries, iterations)
+    hot_rows = Order.objects.count()
+    started = time.perf_counter()
+    moved, batches = archive.archive_orders(archive.cutoff(), batch_size=batch_size)
+    archive_seconds = time.perf_counter() - started
+    after = time_queries(queries, iterations)
+
+    print(f'Archived {moved} of {hot_rows} orders in {batches} batches ({archive_seconds:.1f}s); '
+          f'{Order.objects.count()} left in Order.')
+    print(f'{"query":24} {"before_ms":>10} {"after_ms":>10} {"speedup":>8}')
+    for name in queries:
+        b, a = before[name]['mean_ms'], after[name]['mean_ms']
+        print(f'{name:24} {b:10.3f} {a:10.3f} {b / a if a else 0:7.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', type=int, default=200000, help='Orders in the history.')
+    parser.add_argument('--recent', type=float, default=0.05, help='Share of recent (not archivable) orders.')
+    parser.add_argument('--iterations', type=int, default=200, help='Timed runs per query.')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Orders archived per transaction.')
+    args = parser.parse_args()
+    setup_django()
+    with test_database():
+        run(args.orders, args.recent, args.iterations, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
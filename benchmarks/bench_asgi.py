@@ -0,0 +1,142 @@
+"""
+Compare the sync read views under WSGI with their async variants under ASGI.
+
+Both handlers run in-process: WSGI requests are driven from a thread pool,
+ASGI requests from concurrent asyncio tasks, so the numbers show handler and
+view overhead under concurrency without a network stack in the way.
+
+    python -m benchmarks.bench_asgi [--concurrency 32] [--requests 2000]
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import (create_catalog, create_user, setup_django,
+                               summarize, test_database)
+
+# (sync route, async route, args factory, needs login)
+ROUTES = [
+    ('core:home', 'core:home_async', lambda ctx: [], False),
+    ('products:product_list', 'products:product_list_async', lambda ctx: [], False),
+    ('products:product_detail', 'products:product_detail_async', lambda ctx: [ctx['product'].pk], False),
+    ('products:category_detail', 'products:category_detail_async', lambda ctx: [ctx['category'].slug], False),
+    ('orders:order_list', 'orders:order_list_async', lambda ctx: [], True),
+    ('orders:order_detail', 'orders:order_detail_async', lambda ctx: [ctx['order'].pk], True),
+]
+
+
+def build_context():
+    from django.test import Client
+
+    from orders.models import Order, OrderItem
+
+    products = create_catalog()
+    user = create_user('bench-asgi')
+    order = Order.objects.create(customer=user)
+    for product in products[:5]:
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+    client = Client()
+    client.login(username='bench-asgi', password='benchpass123')
+    return {
+        'product': products[0],
+        'category': products[0].category,
+        'order': order,
+        'cookie': f'sessionid={client.cookies["sessionid"].value}',
+    }
+
+
+def run_wsgi(path, cookie, concurrency, total):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test.client import RequestFactory
+
+    handler = WSGIHandler()
+    factory = RequestFactory()
+
+    def one_request(_):
+        environ = factory._base_environ(PATH_INFO=path, REQUEST_METHOD='GET', HTTP_COOKIE=cookie)
+        status = []
+        started = time.perf_counter()
+        body = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+        b''.join(body)
+        elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, status[0].startswith('200')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_request, range(total)))
+    return results, time.perf_counter() - started
+
+
+def run_asgi(path, cookie, concurrency, total):
+    from django.core.handlers.asgi import ASGIHandler
+    from django.test.client import AsyncRequestFactory
+
+    handler = ASGIHandler()
+    factory = AsyncRequestFactory()
+    results = []
+
+    async def one_request():
+        scope = factory._base_scope(path=path, method='GET')
+        scope['headers'] = [(b'cookie', cookie.encode())]
+        messages = []
+        finished = asyncio.Event()
+        pending = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # Keep the connection open until the response has been sent.
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                finished.set()
+
+        started = time.perf_counter()
+        await handler(scope, receive, send)
+        elapsed = (time.perf_counter() - started) * 1000
+        results.append((elapsed, messages[0]['status'] == 200))
+
+    async def worker(count):
+        for _ in range(count):
+            await one_request()
+
+    async def main():
+        per_worker, extra = divmod(total, concurrency)
+        await asyncio.gather(*(worker(per_worker + (i < extra)) for i in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return results, time.perf_counter() - started
+
+
+def run(concurrency, total):
+    from django.urls import reverse
+
+    ctx = build_context()
+    print(f'{"route":32} {"server":6} {"req/s":>8} {"p50_ms":>8} {"p95_ms":>8} {"p99_ms":>8} {"errors":>6}')
+    for sync_name, async_name, args, needs_login in ROUTES:
+        cookie = ctx['cookie'] if needs_login else ''
+        for server, name, runner in (('wsgi', sync_name, run_wsgi), ('asgi', async_name, run_asgi)):
+            results, elapsed = runner(reverse(name, args=args(ctx)), cookie, concurrency, total)
+            stats = summarize([r[0] for r in results])
+            errors = sum(1 for r in results if not r[1])
+            print(f'{sync_name:32} {server:6} {total / elapsed:8.1f} {stats["p50_ms"]:8.2f} '
+                  f'{stats["p95_ms"]:8.2f} {stats["p99_ms"]:8.2f} {errors:6d}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients.')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per route and server.')
+    args = parser.parse_args()
+    setup_django()
+    with test_database():
+        run(args.concurrency, args.requests)
+
+
+if __name__ == '__main__':
+    main()
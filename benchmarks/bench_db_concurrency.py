@@ -0,0 +1,118 @@
+"""
+Parallel checkouts against a file-backed SQLite database.
+
+Runs the same workload with SQLITE_TUNING off (rollback journal, deferred
+transactions) and on (WAL, busy timeout, immediate transactions). Checkout
+workers place orders while browse workers read the menu, and the script
+reports checkout throughput, latency and "database is locked" failures.
+
+    python -m benchmarks.bench_db_concurrency [--checkout-workers 8] [--browse-workers 8] [--seconds 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import (BASE_DIR, create_catalog, create_user,
+                               setup_django, summarize, test_database)
+
+
+def checkout_worker(username, products, deadline, timings, errors):
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client()
+    client.login(username=username, password='benchpass123')
+    i = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            for product in (products[i % len(products)], products[(i + 1) % len(products)]):
+                client.get(reverse('orders:add_to_cart', args=[product.pk]))
+            client.post(reverse('orders:checkout'))
+            timings.append((time.perf_counter() - started) * 1000)
+        except Exception as e:
+            errors.append(type(e).__name__)
+        i += 1
+    connection.close()
+
+
+def browse_worker(deadline, counter, errors):
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client()
+    while time.perf_counter() < deadline:
+        try:
+            client.get(reverse('products:product_list'))
+            counter.append(1)
+        except Exception as e:
+            errors.append(type(e).__name__)
+    connection.close()
+
+
+def run_child(checkout_workers, browse_workers, seconds):
+    from django.conf import settings
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django()
+        with test_database(name=os.path.join(tmp, 'bench.sqlite3')):
+            products = create_catalog()
+            usernames = [create_user(f'bench-{i}').username for i in range(checkout_workers)]
+            timings, browse, errors = [], [], []
+            deadline = time.perf_counter() + seconds
+            threads = [
+                threading.Thread(target=checkout_worker, args=(u, products, deadline, timings, errors))
+                for u in usernames
+            ] + [
+                threading.Thread(target=browse_worker, args=(deadline, browse, errors))
+                for _ in range(browse_workers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            print(json.dumps({
+                'tuning': settings.SQLITE_TUNING,
+                'checkouts_per_s': round(len(timings) / seconds, 1),
+                'browse_per_s': round(len(browse) / seconds, 1),
+                'errors': len(errors),
+                'checkout': summarize(timings),
+            }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--checkout-workers', type=int, default=8)
+    parser.add_argument('--browse-workers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.checkout_workers, args.browse_workers, args.seconds)
+        return
+
+    print(f'{"tuning":>6} {"checkouts/s":>12} {"browse/s":>9} {"p50_ms":>8} {"p99_ms":>8} {"errors":>6}')
+    for tuning in ('0', '1'):
+        env = dict(os.environ, SQLITE_TUNING=tuning, USE_POSTGRESQL='False')
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_db_concurrency', '--child',
+             '--checkout-workers', str(args.checkout_workers),
+             '--browse-workers', str(args.browse_workers),
+             '--seconds', str(args.seconds)],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        print(f'{str(result["tuning"]):>6} {result["checkouts_per_s"]:12.1f} {result["browse_per_s"]:9.1f} '
+              f'{result["checkout"]["p50_ms"]:8.2f} {result["checkout"]["p99_ms"]:8.2f} {result["errors"]:6d}')
+
+
+if __name__ == '__main__':
+    main()
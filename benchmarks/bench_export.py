@@ -0,0 +1,99 @@
+"""
+Measure the streaming CSV order export at growing table sizes.
+
+Orders with line items are bulk-inserted in steps; after each step the full
+export is streamed into a byte counter once for throughput and once under
+tracemalloc for peak Python memory. Throughput should stay level and the peak
+flat as the row count grows into the millions; a list-based export would grow
+linearly instead. With --asgi the async iterator the view streams under ASGI
+is measured, which adds one sync_to_async hop per chunk.
+
+    python -m benchmarks.bench_export [--orders 400000] [--items 3] [--steps 4] [--chunk-size 2000] [--asgi]
+"""
+import argparse
+import time
+import tracemalloc
+from decimal import Decimal
+
+from benchmarks.common import (create_catalog, create_user, setup_django,
+                               test_database)
+
+SEED_BATCH = 5000
+
+
+def seed(customer, products, count, items):
+    """Insert ``count`` orders with ``items`` line items each."""
+    from orders.models import Order, OrderItem
+
+    statuses = ['pending', 'paid', 'delivered', 'cancelled']
+    for offset in range(0, count, SEED_BATCH):
+        batch = Order.objects.bulk_create([
+            Order(customer=customer, status=statuses[i % 4], total_price=Decimal('29.97'))
+            for i in range(offset, min(offset + SEED_BATCH, count))
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[(order.pk + n) % len(products)], quantity=1 + n, price=Decimal('9.99'))
+            for order in batch
+            for n in range(items)
+        ])
+
+
+def stream(chunk_size, asgi=False):
+    """Stream the whole export and return (bytes, lines, seconds)."""
+    from asgiref.sync import async_to_sync
+
+    from orders import export
+
+    totals = [0, 0]
+
+    def count(chunk):
+        totals[0] += len(chunk.encode())
+        totals[1] += chunk.count('\n')
+
+    async def consume():
+        async for chunk in export.acsv_chunks(chunk_size=chunk_size):
+            count(chunk)
+
+    started = time.perf_counter()
+    if asgi:
+        async_to_sync(consume)()
+    else:
+        for chunk in export.csv_chunks(chunk_size=chunk_size):
+            count(chunk)
+    return totals[0], totals[1], time.perf_counter() - started
+
+
+def run(orders, items, steps, chunk_size, asgi=False):
+    products = create_catalog()
+    customer = create_user('bench-customer')
+    step = orders // steps
+
+    print(f'{"rows":>10} {"MB":>8} {"seconds":>8} {"rows/s":>10} {"peak_MB":>8}')
+    for _ in range(steps):
+        seed(customer, products, step, items)
+        size, lines, seconds = stream(chunk_size, asgi)
+        tracemalloc.start()
+        try:
+            stream(chunk_size, asgi)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        rows = lines - 1
+        print(f'{rows:10d} {size / 1e6:8.1f} {seconds:8.2f} {rows / seconds:10.0f} {peak / 1e6:8.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', type=int, default=400000, help='Orders in the largest step.')
+    parser.add_argument('--items', type=int, default=3, help='Line items per order.')
+    parser.add_argument('--steps', type=int, default=4, help='Table sizes to measure.')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per cursor fetch and per streamed chunk.')
+    parser.add_argument('--asgi', action='store_true', help='Stream the async iterator used under ASGI.')
+    args = parser.parse_args()
+    setup_django()
+    with test_database():
+        run(args.orders, args.items, max(args.steps, 1), args.chunk_size, args.asgi)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Count django_session writes per browse-to-checkout flow.
+
+Compares the stock DB and cached DB engines with the low-write engine in
+core.sessions, with and without SESSION_SAVE_EVERY_REQUEST.
+
+    python -m benchmarks.bench_sessions [--flows N]
+"""
+import argparse
+import time
+
+from benchmarks.common import (create_catalog, create_user, setup_django,
+                               test_database)
+
+ENGINES = [
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+    'core.sessions',
+]
+
+
+def checkout_flow(client, products):
+    """Run one customer flow and return the number of requests made."""
+    from django.urls import reverse
+
+    steps = [
+        ('get', reverse('core:home'), None),
+        ('get', reverse('products:product_list'), None),
+    ]
+    for product in products[:3]:
+        steps.append(('get', reverse('orders:add_to_cart', args=[product.pk]), None))
+    steps += [
+        ('get', reverse('orders:cart'), None),
+        # Same quantity as in the cart: marks the session modified without changing it.
+        ('post', reverse('orders:update_cart', args=[products[0].pk]), {'quantity': '1'}),
+        ('post', reverse('orders:update_cart', args=[products[1].pk]), {'quantity': '2'}),
+        ('get', reverse('orders:cart'), None),
+        ('post', reverse('orders:checkout'), None),
+        ('get', reverse('orders:order_list'), None),
+    ]
+    for method, url, data in steps:
+        getattr(client, method)(url, data)
+    return len(steps)
+
+
+def count_session_writes(queries):
+    writes = 0
+    for query in queries:
+        sql = query['sql'].lstrip().upper()
+        if 'DJANGO_SESSION' in sql and sql.startswith(('INSERT', 'UPDATE')):
+            writes += 1
+    return writes
+
+
+def run(flows):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+
+    products = create_catalog()
+    results = []
+    for save_every_request in (False, True):
+        for engine in ENGINES:
+            with override_settings(SESSION_ENGINE=engine, SESSION_SAVE_EVERY_REQUEST=save_every_request):
+                writes = 0
+                requests = 0
+                started = time.perf_counter()
+                for i in range(flows):
+                    username = f'bench-{engine.rsplit(".", 1)[-1]}-{int(save_every_request)}-{i}'
+                    create_user(username)
+                    client = Client()
+                    client.login(username=username, password='benchpass123')
+                    with CaptureQueriesContext(connection) as ctx:
+                        requests += checkout_flow(client, products)
+                    writes += count_session_writes(ctx.captured_queries)
+                elapsed = time.perf_counter() - started
+            results.append((engine, save_every_request, writes / flows, requests / flows, elapsed))
+
+    print(f'{"engine":45} {"save_every":>10} {"writes/flow":>12} {"requests":>9} {"seconds":>8}')
+    for engine, save_every_request, writes, requests, elapsed in results:
+        print(f'{engine:45} {str(save_every_request):>10} {writes:12.1f} {requests:9.0f} {elapsed:8.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--flows', type=int, default=20, help='Checkout flows per engine.')
+    args = parser.parse_args()
+    setup_django()
+    with test_database():
+        run(args.flows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Measure the cost of idle order-status streams and the fan-out of one change.
+
+Opens N server-sent event connections to orders:order_events through the
+ASGI application in-process (pizzashop.asgi, the full middleware stack),
+waits until each has received the current status, then reports the traced
+Python memory per idle connection and the threads alive. One status change
+is then applied through orders.transitions and the time until every stream
+has received it is reported.
+
+    python -m benchmarks.bench_sse [--connections 1000]
+"""
+import argparse
+import asyncio
+import threading
+import time
+import tracemalloc
+
+from benchmarks.common import create_user, setup_django, test_database
+
+
+def build_context():
+    from django.test import Client
+
+    from orders.models import Order
+
+    user = create_user('bench-sse')
+    order = Order.objects.create(customer=user)
+    client = Client()
+    client.login(username='bench-sse', password='benchpass123')
+    return order, f'sessionid={client.cookies["sessionid"].value}'
+
+
+async def open_streams(handler, path, cookie, count):
+    from django.test.client import AsyncRequestFactory
+
+    factory = AsyncRequestFactory()
+    events = [0] * count
+    received = {1: asyncio.Event(), 2: asyncio.Event()}
+    totals = {1: 0, 2: 0}
+    statuses = []
+
+    async def stream(index):
+        scope = factory._base_scope(path=path, method='GET')
+        scope['headers'] = [(b'host', b'testserver'), (b'cookie', cookie.encode())]
+        pending = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        done = asyncio.Event()
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+            elif message['type'] == 'http.response.body':
+                if b'event: status' in message.get('body', b''):
+                    events[index] += 1
+                    totals[events[index]] = totals.get(events[index], 0) + 1
+                    if totals[events[index]] == count:
+                        received[events[index]].set()
+                if not message.get('more_body'):
+                    done.set()
+
+        await handler(scope, receive, send)
+
+    tasks = [asyncio.create_task(stream(i)) for i in range(count)]
+    return tasks, received, statuses
+
+
+async def scenario(handler, order, cookie, count):
+    from asgiref.sync import sync_to_async
+    from django.urls import reverse
+
+    from orders import transitions
+
+    path = reverse('orders:order_events', args=[order.pk])
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    tasks, received, statuses = await open_streams(handler, path, cookie, count)
+    await received[1].wait()
+    open_seconds = time.perf_counter() - started
+    await asyncio.sleep(0.5)
+    per_stream = (tracemalloc.get_traced_memory()[0] - baseline) / count
+    tracemalloc.stop()
+    threads = threading.active_count()
+
+    started = time.perf_counter()
+    await sync_to_async(transitions.apply)({order.pk: 'delivered'})
+    await received[2].wait()
+    fanout_ms = (time.perf_counter() - started) * 1000
+    await asyncio.gather(*tasks)
+
+    errors = sum(1 for status in statuses if status != 200)
+    print(f'{count} streams opened in {open_seconds:.2f}s ({errors} errors)')
+    print(f'idle memory per stream: {per_stream / 1024:.1f} KiB traced; {threads} threads alive')
+    print(f'one status change reached all streams in {fanout_ms:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--connections', type=int, default=1000, help='Concurrent idle streams.')
+    args = parser.parse_args()
+    setup_django()
+    from django.test.utils import override_settings
+
+    with test_database(), override_settings(PUBSUB_BACKEND='core.pubsub.LocalBackend'):
+        order, cookie = build_context()
+        from pizzashop.asgi import application as handler
+        asyncio.run(scenario(handler, order, cookie, args.connections))
+
+
+if __name__ == '__main__':
+    main()
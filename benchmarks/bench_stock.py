@@ -0,0 +1,95 @@
+"""
+Concurrent checkouts competing for the last units of a limited special.
+
+Each worker logs in and repeatedly puts the special and a regular pizza in
+its cart and checks out, all against a file-backed SQLite database (the
+settings' WAL and immediate-transaction tuning applies), until the special
+has sold out and every worker has made its attempts. Reports checkout
+throughput and latency, and the units of the special sold against its
+starting stock: any surplus is an oversell.
+
+    python -m benchmarks.bench_stock [--workers 16] [--stock 100] [--attempts 20] [--quantity 1]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.common import (create_catalog, create_user, setup_django,
+                               summarize, test_database)
+
+
+def worker(username, special, regular, attempts, quantity, barrier, timings, errors):
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client()
+    client.login(username=username, password='benchpass123')
+    barrier.wait()
+    for _ in range(attempts):
+        started = time.perf_counter()
+        try:
+            # Sold out once add_to_cart answers 404; the regular pizza still sells.
+            client.get(reverse('orders:add_to_cart', args=[special.pk]), {'quantity': quantity})
+            client.get(reverse('orders:add_to_cart', args=[regular.pk]))
+            client.post(reverse('orders:checkout'))
+            timings.append((time.perf_counter() - started) * 1000)
+        except Exception as e:
+            errors.append(type(e).__name__)
+    connection.close()
+
+
+def run(workers, stock, attempts, quantity):
+    from django.db.models import Sum
+
+    from orders.models import OrderItem
+    from products.models import Product
+
+    # add_to_cart answering 404 after the sell-out is expected here.
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    products = create_catalog()
+    special, regular = products[0], products[1]
+    Product.objects.filter(pk=special.pk).update(stock=stock)
+    usernames = [create_user(f'bench-stock-{i}').username for i in range(workers)]
+    timings, errors = [], []
+    barrier = threading.Barrier(workers + 1)
+    threads = [
+        threading.Thread(target=worker, args=(u, special, regular, attempts, quantity, barrier, timings, errors))
+        for u in usernames
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    special.refresh_from_db()
+    sold = OrderItem.objects.filter(product=special).aggregate(units=Sum('quantity'))['units'] or 0
+    print(f'{len(timings)} checkouts by {workers} workers in {seconds:.2f}s '
+          f'({len(timings) / seconds:.1f}/s, {len(errors)} errors)')
+    print(f'checkout latency: {summarize(timings)}')
+    print(f'special: stock {stock}, sold {sold}, left {special.stock}, available {special.is_available}; '
+          f'oversold {max(0, sold - stock)} units')
+    if sold + special.stock != stock:
+        raise SystemExit('Stock does not add up.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent customers.')
+    parser.add_argument('--stock', type=int, default=100, help='Starting units of the special.')
+    parser.add_argument('--attempts', type=int, default=20, help='Checkouts per customer.')
+    parser.add_argument('--quantity', type=int, default=1, help='Units of the special per checkout.')
+    args = parser.parse_args()
+    setup_django()
+    with tempfile.TemporaryDirectory() as tmp, test_database(name=os.path.join(tmp, 'bench.sqlite3')):
+        run(args.workers, args.stock, args.attempts, args.quantity)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Render every template under templates/ with seeded context.
+
+Each template is rendered through the configured engine (cached loader,
+context processors, an admin request with a filled cart), and the per-render
+time plus the slowest {% extends %}/{% include %}/{% block %} parts are
+reported, so template regressions show up without going through the views.
+Part timings need PERF_TEMPLATE_DETAIL (on by default).
+
+    python -m benchmarks.bench_templates [--iterations N] [--orders N] [--json report.json]
+"""
+import argparse
+import json
+import time
+from decimal import Decimal
+
+from benchmarks.common import (BASE_DIR, create_catalog, create_user,
+                               setup_django, summarize, test_database)
+
+TEMPLATES_DIR = BASE_DIR / 'templates'
+
+
+def seeded_context(orders):
+    """One context that satisfies every template: catalog, orders, cart and forms."""
+    from django.contrib.auth.forms import UserCreationForm
+    from django.core.paginator import Paginator
+    from django.forms import modelform_factory
+    from django.utils import timezone
+
+    from core import memory
+    from orders.models import Order, OrderItem
+    from products.models import Category, Product
+    from products.views import ProductCreateView, ProductListView
+
+    products = create_catalog(categories=4, products_per_category=10)
+    admin = create_user('bench-admin', role='admin')
+    for i in range(orders):
+        order = Order.objects.create(customer=admin, status='pending', total_price=Decimal('0.00'))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1 + i % 3, price=product.price)
+            for product in products[i % 10:i % 10 + 3]
+        ])
+    order_list = list(Order.objects.select_related('customer').prefetch_related('items__product'))
+    page = Paginator(Product.objects.select_related('category').order_by('id'), ProductListView.paginate_by).page(1)
+    cart_items = [
+        {'product': product, 'quantity': 2, 'total': product.price * 2}
+        for product in products[:5]
+    ]
+    product = products[0]
+    context = {
+        'products': page.object_list,
+        'featured_products': products[:6],
+        'categories': list(Category.objects.all()),
+        'category': product.category,
+        'selected_category': product.category.slug,
+        'page_obj': page,
+        'is_paginated': True,
+        'product': product,
+        'object': product,
+        'orders': order_list,
+        'order': order_list[0] if order_list else None,
+        'status_filter': '',
+        'cart_items': cart_items,
+        'total': sum(item['total'] for item in cart_items),
+        'profile': admin.profile,
+        'is_admin': True,
+        'profiles': [
+            {'name': f'{i}-core.home-12ms.prof', 'url_name': 'core:home', 'duration_ms': 12,
+             'captured_at': timezone.now(), 'size': 40960}
+            for i in range(10)
+        ],
+        'profiling_enabled': True,
+        'report': memory.report(),
+    }
+    forms = {
+        'accounts/register.html': UserCreationForm(),
+        'products/product_form.html': modelform_factory(Product, fields=ProductCreateView.fields)(instance=product),
+    }
+    return admin, context, forms
+
+
+def make_request(user):
+    from django.contrib.messages.storage.fallback import FallbackStorage
+    from django.contrib.sessions.backends.cache import SessionStore
+    from django.test import RequestFactory
+
+    request = RequestFactory().get('/')
+    request.user = user
+    request.session = SessionStore()
+    request.session['cart'] = {'1': {'quantity': 2, 'price': '9.99'}, '2': {'quantity': 1, 'price': '12.50'}}
+    request._messages = FallbackStorage(request)
+    return request
+
+
+def run(iterations, orders):
+    from django.template import engines
+
+    from core import instrumentation
+
+    engine = engines['django']
+    instrumentation.install()
+    admin, context, forms = seeded_context(orders)
+    request = make_request(admin)
+    names = sorted(path.relative_to(TEMPLATES_DIR).as_posix() for path in TEMPLATES_DIR.rglob('*.html'))
+
+    results = {}
+    for name in names:
+        template = engine.get_template(name)
+        template_context = {**context, 'form': forms.get(name)}
+        template.render(template_context, request)
+        timings = []
+        collector, token = instrumentation.start_request()
+        try:
+            for _ in range(iterations):
+                started = time.perf_counter()
+                template.render(template_context, request)
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            instrumentation.finish_request(token)
+        parts = {
+            key: round(seconds * 1000 / iterations, 3)
+            for key, (count, seconds) in sorted(
+                collector.template_timings.items(), key=lambda item: item[1][1], reverse=True,
+            )
+            if not key.startswith('template:')
+        }
+        results[name] = {**summarize(timings), 'parts': parts}
+
+    print(f'{"template":38} {"mean_ms":>8} {"p50_ms":>8} {"p95_ms":>8}  slowest block/include')
+    for name, r in sorted(results.items(), key=lambda item: item[1]['mean_ms'], reverse=True):
+        # The {% extends %} parent includes every block, so skip it here.
+        slowest = next(((key, ms) for key, ms in r['parts'].items() if not key.startswith('extends:')), ('-', 0))
+        print(f'{name:38} {r["mean_ms"]:8.3f} {r["p50_ms"]:8.3f} {r["p95_ms"]:8.3f}  {slowest[0]} {slowest[1]:.3f}ms')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=200, help='Renders per template.')
+    parser.add_argument('--orders', type=int, default=50, help='Orders in the order list templates.')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this file.')
+    args = parser.parse_args()
+    setup_django()
+    with test_database():
+        results = run(args.iterations, args.orders)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'templates': results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Shared helpers for benchmark scripts.
+"""
+import os
+import statistics
+import sys
+from contextlib import contextmanager
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    """Configure Django for a standalone benchmark script."""
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pizzashop.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database(name=None):
+    """
+    Create a throwaway test database for the duration of the block.
+
+    SQLite test databases live in memory unless a file name is given.
+    """
+    from django.db import connection
+    from django.test.utils import (override_settings, setup_test_environment,
+                                   teardown_test_environment)
+
+    if name:
+        connection.settings_dict['TEST']['NAME'] = str(name)
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        # Password hashing would otherwise dominate every login.
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def create_catalog(categories=3, products_per_category=8):
+    """Create a small menu and return the list of products."""
+    from products.models import Category, Product
+
+    products = []
+    for c in range(categories):
+        category = Category.objects.create(name=f'Category {c}', slug=f'category-{c}')
+        for p in range(products_per_category):
+            products.append(Product.objects.create(
+                name=f'Pizza {c}-{p}',
+                description='Benchmark pizza',
+                price=Decimal('9.99') + p,
+                category=category,
+                is_available=True,
+            ))
+    return products
+
+
+def create_user(username, password='benchpass123', role='customer'):
+    """Create a user with the given profile role."""
+    from django.contrib.auth.models import User
+
+    user = User.objects.create_user(username=username, password=password)
+    if role != 'customer':
+        user.profile.role = role
+        user.profile.save()
+    return user
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of values (nearest rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    """Return mean/p50/p95/p99 of a list of timings in milliseconds."""
+    return {
+        'count': len(values),
+        'mean_ms': round(statistics.fmean(values), 3) if values else 0.0,
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+    }
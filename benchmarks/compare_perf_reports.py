@@ -0,0 +1,49 @@
+"""
+Compare two query-budget reports written by tests/test_performance.py.
+
+    PERF_REPORT=before.json pytest tests/test_performance.py
+    ... change code ...
+    PERF_REPORT=after.json pytest tests/test_performance.py
+    python -m benchmarks.compare_perf_reports before.json after.json
+
+Exits with status 1 if any route/role issues more queries than before.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)['routes']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--all', action='store_true', help='Show unchanged routes too.')
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    regressions = 0
+    print(f'{"route":36} {"role":10} {"queries":>13} {"wall_ms":>19}')
+    for url_name in sorted(set(before) | set(after)):
+        for role in sorted(set(before.get(url_name, {})) | set(after.get(url_name, {}))):
+            old = before.get(url_name, {}).get(role)
+            new = after.get(url_name, {}).get(role)
+            if old is None or new is None:
+                print(f'{url_name:36} {role:10} {"added" if old is None else "removed":>13}')
+                continue
+            changed = old['queries'] != new['queries']
+            if new['queries'] > old['queries']:
+                regressions += 1
+            if changed or args.all:
+                print(f'{url_name:36} {role:10} {old["queries"]:>5} -> {new["queries"]:<5} '
+                      f'{old["wall_ms"]:>8.2f} -> {new["wall_ms"]:<8.2f}')
+    print(f'{regressions} query regression(s)')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
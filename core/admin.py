@@ -0,0 +1,100 @@
+"""
+Changelist helpers for admin pages over large tables.
+
+EstimatedCountPaginator takes the row count of an unfiltered changelist from
+the planner statistics instead of COUNT(*), which reads the whole table on
+PostgreSQL. IndexedSearchMixin keeps searches indexable: '=field' matches
+exactly and '^field' by prefix with the plain exact/startswith lookups
+(case-sensitive on PostgreSQL) instead of Django's UPPER()-wrapped
+iexact/istartswith, and numeric fields only see numeric terms rather than a
+LIKE over every id cast to text. Exact matches use an ordinary B-tree index;
+on PostgreSQL a prefix LIKE only does under the C collation or with a
+varchar_pattern_ops index on the column, so add one where a large table is
+searched by prefix. LargeTableAdmin combines the two and turns off the
+second, unfiltered count Django shows next to filtered results.
+"""
+import operator
+from functools import reduce
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.utils import (get_fields_from_path,
+                                        lookup_spawns_duplicates)
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.utils.functional import cached_property
+from django.utils.text import smart_split, unescape_string_literal
+
+
+def estimated_rows(model, using='default'):
+    """The planner's row estimate for the model's table, or None when there is none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)',
+                           [connection.ops.quote_name(table)])
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 exists once ANALYZE has run; a stat starts with the row count.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT max(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    # PostgreSQL reports -1 for tables never analyzed.
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Estimated counts for unfiltered querysets on tables of ADMIN_ESTIMATED_COUNT_MIN rows or more."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, models.QuerySet) and not queryset.query.where:
+            estimate = estimated_rows(queryset.model, using=queryset.db)
+            if estimate is not None and estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_MIN', 10000):
+                return estimate
+        return super().count
+
+
+class IndexedSearchMixin:
+    """get_search_results() for '=' (exact) and '^' (prefix) search_fields; others behave as usual."""
+
+    def get_search_results(self, request, queryset, search_term):
+        search_fields = self.get_search_fields(request)
+        if not search_term or not all(field[0] in '=^' for field in search_fields):
+            return super().get_search_results(request, queryset, search_term)
+        fields = [(field[0], field[1:], self._search_target(field[1:])) for field in search_fields]
+        may_have_duplicates = any(lookup_spawns_duplicates(self.opts, path) for _, path, _ in fields)
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            queries = []
+            for mode, path, target in fields:
+                value = bit
+                if isinstance(target, (models.IntegerField, models.AutoField)):
+                    # "#42" finds order 42; words never match a number.
+                    value = bit.removeprefix('#')
+                    if not value.isdigit():
+                        continue
+                    value = int(value)
+                lookup = path if mode == '=' else f'{path}__startswith'
+                queries.append(models.Q(**{lookup: value}))
+            queryset = queryset.filter(reduce(operator.or_, queries) if queries else models.Q(pk__in=[]))
+        return queryset, may_have_duplicates
+
+    def _search_target(self, path):
+        """The field a search path ends on, following a trailing relation to its key."""
+        field = get_fields_from_path(self.model, path)[-1]
+        return field.target_field if field.is_relation else field
+
+
+class LargeTableAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    """ModelAdmin for tables too big to count or scan on every changelist view."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
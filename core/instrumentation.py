@@ -0,0 +1,155 @@
+"""
+Lightweight per-request performance instrumentation.
+
+Queries and template renders are attributed to the request that is currently
+being served through a context variable, so the hooks work for sync views,
+async views and the async ORM's worker threads alike. Outside of an
+instrumented request the hooks only cost one context variable lookup.
+
+With PERF_TEMPLATE_DETAIL, every template, ``{% extends %}`` parent,
+``{% include %}`` and ``{% block %}`` render is also timed separately
+(inclusive of what renders inside it) under keys such as
+``template:orders/cart.html``, ``extends:base.html``, ``block:content``.
+"""
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import base as template_base
+from django.template import loader_tags
+
+_current = ContextVar('request_metrics', default=None)
+_installed = False
+_template_detail = False
+
+
+class RequestMetrics:
+    """Timings collected while serving one request."""
+
+    __slots__ = (
+        'started', 'queries', 'sql_time', 'template_time', 'template_timings', 'view_started', 'view_time',
+        '_template_depth',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        # key: [renders, seconds]
+        self.template_timings = {}
+        self.view_started = None
+        self.view_time = 0.0
+        self._template_depth = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def record_template(self, key, seconds):
+        timing = self.template_timings.get(key)
+        if timing is None:
+            self.template_timings[key] = [1, seconds]
+        else:
+            timing[0] += 1
+            timing[1] += seconds
+
+    def slowest_templates(self, limit=10):
+        """The most expensive template/extends/include/block renders as {key: ms}."""
+        ranked = sorted(self.template_timings.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return {key: round(seconds * 1000, 2) for key, (count, seconds) in ranked}
+
+
+def start_request():
+    """Begin collecting metrics for the current request; return the collector and reset token."""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current_metrics():
+    return _current.get()
+
+
+def _time_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += time.perf_counter() - started
+        metrics.queries += 1
+
+
+def _install_query_timer(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _timed_template_render(render):
+    def timed_render(self, context):
+        metrics = _current.get()
+        if metrics is None:
+            return render(self, context)
+        # Included templates render inside their parent; only time the outermost.
+        metrics._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics._template_depth -= 1
+            if not metrics._template_depth:
+                metrics.template_time += elapsed
+            if _template_detail:
+                metrics.record_template(f'template:{self.name}', elapsed)
+    timed_render.__wrapped__ = render
+    return timed_render
+
+
+def _literal(expression):
+    """The source of a tag argument, without quotes: 'base.html', not "'base.html'"."""
+    return getattr(expression, 'token', str(expression)).strip('"\'')
+
+
+def _timed_node_render(render, key):
+    def timed_render(self, context):
+        metrics = _current.get()
+        if metrics is None:
+            return render(self, context)
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            metrics.record_template(key(self), time.perf_counter() - started)
+    timed_render.__wrapped__ = render
+    return timed_render
+
+
+def install():
+    """Hook query execution and template rendering. Safe to call repeatedly."""
+    global _installed, _template_detail
+    if _installed:
+        return
+    connection_created.connect(_install_query_timer, dispatch_uid='core.instrumentation.query_timer')
+    for connection in connections.all(initialized_only=True):
+        _install_query_timer(None, connection)
+    template_base.Template.render = _timed_template_render(template_base.Template.render)
+    _template_detail = getattr(settings, 'PERF_TEMPLATE_DETAIL', False)
+    if _template_detail:
+        loader_tags.ExtendsNode.render = _timed_node_render(
+            loader_tags.ExtendsNode.render, lambda node: f'extends:{_literal(node.parent_name)}',
+        )
+        loader_tags.IncludeNode.render = _timed_node_render(
+            loader_tags.IncludeNode.render, lambda node: f'include:{_literal(node.template)}',
+        )
+        loader_tags.BlockNode.render = _timed_node_render(
+            loader_tags.BlockNode.render, lambda node: f'block:{node.name}',
+        )
+    _installed = True
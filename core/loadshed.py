@@ -0,0 +1,198 @@
+"""
+Adaptive load shedding by route class.
+
+Every request is put in a route class: ``checkout`` (cart, checkout and the
+customer's orders), ``auth``, ``admin`` or ``browse`` (home and catalog).
+The tracker counts requests in flight across all worker processes and,
+behind a trusted proxy (LOAD_SHEDDING_TRUST_REQUEST_START), keeps a moving
+average of queue latency: the time between the proxy accepting a request
+(its X-Request-Start header) and Django seeing it, per class and overall.
+Without one, pressure comes from the in-flight count alone, since clients
+can send the header too. Samples in the future or over MAX_QUEUE_SECONDS
+are dropped and the rest capped at SAMPLE_CAP times the target, so no
+single request (or a proxy clock that is off) can push the average far.
+
+Pressure is the larger of in-flight / LOAD_SHEDDING_MAX_IN_FLIGHT and queue
+latency / LOAD_SHEDDING_QUEUE_TARGET_MS. A class is shed once pressure reaches
+its LOAD_SHEDDING_SHED_AT level; checkout has none and is never shed, so when
+the workers saturate, browsing gives way first and paying customers last.
+Health, metrics and long-lived stream routes are not tracked at all.
+
+A sync gunicorn worker never has more than one request in flight, so the
+counts live in shared memory created when this module is imported. With
+preload_app (see gunicorn.conf.py) that happens in the master, and every
+forked worker adds to the same counts; each process also keeps its own
+counts in a slot, which the master's child_exit hook subtracts when a
+worker dies mid-request. gunicorn.conf.py sets LOAD_SHEDDING_MAX_IN_FLIGHT
+to the number of workers unless it is configured, so pressure is the share
+of busy workers. Without a forking master each process counts on its own.
+"""
+import multiprocessing
+import os
+import time
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+
+CLASSES = ('checkout', 'auth', 'admin', 'browse')
+
+# (URL name pattern, class) - the first match wins; None means untracked.
+ROUTE_CLASSES = (
+    ('core:ready', None),
+    ('core:metrics', None),
+    ('orders:order_events', None),
+    ('orders:kitchen_feed', None),
+    ('orders:admin_*', 'admin'),
+    ('orders:*_order_status', 'admin'),
+    ('orders:export_orders', 'admin'),
+    ('orders:kitchen_queue', 'admin'),
+    ('orders:sales_dashboard', 'admin'),
+    ('orders:*', 'checkout'),
+    ('accounts:*', 'auth'),
+    ('admin:*', 'admin'),
+    ('core:memory_report', 'admin'),
+    ('core:profile_*', 'admin'),
+    ('products:product_create', 'admin'),
+    ('products:product_update', 'admin'),
+    ('products:product_delete', 'admin'),
+    ('*', 'browse'),
+)
+
+# Weight of the newest sample in the queue latency average.
+EWMA_ALPHA = 0.2
+# Queue times above this are clock trouble or forged, not queueing.
+MAX_QUEUE_SECONDS = 30
+# A sample counts for at most this many times LOAD_SHEDDING_QUEUE_TARGET_MS.
+SAMPLE_CAP = 2
+# Worker processes with their own slot; any more are counted but not
+# corrected when they die.
+PROCESS_SLOTS = 64
+
+_classes = {}
+
+
+def route_class(url_name):
+    """The class of a URL name such as 'orders:checkout' (None for untracked routes)."""
+    try:
+        return _classes[url_name]
+    except KeyError:
+        pass
+    result = next(cls for pattern, cls in ROUTE_CLASSES if fnmatchcase(url_name, pattern))
+    _classes[url_name] = result
+    return result
+
+
+def queue_seconds(header, now=None):
+    """
+    Seconds since the proxy's X-Request-Start value ("t=<epoch>" or a bare
+    epoch, in seconds, milliseconds or microseconds); None when absent,
+    invalid, in the future or over MAX_QUEUE_SECONDS ago.
+    """
+    if not header:
+        return None
+    try:
+        started = float(header.removeprefix('t='))
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    queued = (now or time.time()) - started
+    return queued if 0 <= queued <= MAX_QUEUE_SECONDS else None
+
+
+class Tracker:
+    """
+    In-flight counts per class across the processes forked after it was
+    created, and this process's queue latency per class.
+    """
+
+    def __init__(self, slots=PROCESS_SLOTS):
+        # Shared with forked workers; serialises threads and processes alike.
+        self._lock = multiprocessing.Lock()
+        self._totals = multiprocessing.RawArray('q', len(CLASSES))
+        # Per slot: the owner's pid, then its count per class.
+        self._slots = multiprocessing.RawArray('q', slots * (len(CLASSES) + 1))
+        self._slot = None
+        self._slot_pid = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._totals[:] = [0] * len(self._totals)
+            self._slots[:] = [0] * len(self._slots)
+            self._slot_pid = None
+            self.queue_ms = dict.fromkeys(CLASSES, 0.0)
+            self.overall_queue_ms = 0.0
+
+    @property
+    def in_flight(self):
+        return dict(zip(CLASSES, self._totals))
+
+    def pressure(self):
+        max_in_flight = getattr(settings, 'LOAD_SHEDDING_MAX_IN_FLIGHT', 64)
+        queue_target_ms = getattr(settings, 'LOAD_SHEDDING_QUEUE_TARGET_MS', 250)
+        return max(sum(self._totals) / max_in_flight, self.overall_queue_ms / queue_target_ms)
+
+    def _own_slot(self):
+        """This process's slot offset, claimed on first use (None if all are taken); call with _lock held."""
+        pid = os.getpid()
+        if self._slot_pid != pid:
+            # A forked child must not count in its parent's slot.
+            self._slot_pid = pid
+            self._slot = None
+            for offset in range(0, len(self._slots), len(CLASSES) + 1):
+                if self._slots[offset] == 0:
+                    self._slots[offset] = pid
+                    self._slot = offset
+                    break
+        return self._slot
+
+    def _count(self, cls, amount):
+        index = CLASSES.index(cls)
+        self._totals[index] += amount
+        slot = self._own_slot()
+        if slot is not None:
+            self._slots[slot + 1 + index] += amount
+
+    def admit(self, cls, queue_ms=None):
+        """
+        Record a request's queue latency, if known, and decide on it. Returns
+        (admitted, pressure); admitted requests must be passed to release().
+        """
+        shed_at = getattr(settings, 'LOAD_SHEDDING_SHED_AT', {}).get(cls)
+        with self._lock:
+            if queue_ms is not None:
+                queue_ms = min(queue_ms, SAMPLE_CAP * getattr(settings, 'LOAD_SHEDDING_QUEUE_TARGET_MS', 250))
+                self.queue_ms[cls] += EWMA_ALPHA * (queue_ms - self.queue_ms[cls])
+                self.overall_queue_ms += EWMA_ALPHA * (queue_ms - self.overall_queue_ms)
+            pressure = self.pressure()
+            admitted = shed_at is None or pressure < shed_at
+            if admitted:
+                self._count(cls, 1)
+        return admitted, pressure
+
+    def release(self, cls):
+        with self._lock:
+            self._count(cls, -1)
+
+    def forget(self, pid):
+        """Drop the requests of a process that exited (gunicorn's child_exit hook)."""
+        with self._lock:
+            for offset in range(0, len(self._slots), len(CLASSES) + 1):
+                if self._slots[offset] == pid:
+                    for index in range(len(CLASSES)):
+                        self._totals[index] -= self._slots[offset + 1 + index]
+                    self._slots[offset:offset + len(CLASSES) + 1] = [0] * (len(CLASSES) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pressure': round(self.pressure(), 3),
+                'in_flight': self.in_flight,
+                'queue_ms': {cls: round(value, 1) for cls, value in self.queue_ms.items()},
+            }
+
+
+tracker = Tracker()
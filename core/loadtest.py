@@ -0,0 +1,253 @@
+"""
+Load generator for the browse-to-checkout funnel.
+
+Virtual customers walk the real URLs: home, menu, a category filter, a few
+add_to_cart calls, update_cart, the cart, checkout and the new order's
+detail page. They run either in-process through the Django test client or
+against a running server over HTTP, and per-step latency, throughput and
+error rates are collected. Used by the ``loadtest`` management command.
+"""
+import http.cookiejar
+import random
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from django.urls import resolve, reverse
+
+STEPS = [
+    'home', 'product_list', 'category_filter', 'add_to_cart',
+    'update_cart', 'cart', 'checkout', 'order_detail',
+]
+
+PRODUCT_LINK = re.compile(r'/products/(\d+)/"')
+CATEGORY_LINK = re.compile(r'\?category=([-\w]+)"')
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class Response:
+    """The parts of a response the load generator needs."""
+    __slots__ = ('status', 'location', 'body')
+
+    def __init__(self, status, location='', body=''):
+        self.status = status
+        self.location = location
+        self.body = body
+
+
+def local_client(user=None):
+    """
+    Return a test client that passes ALLOWED_HOSTS and SSL redirects.
+
+    Outside the test runner "testserver" is not an allowed host.
+    """
+    from django.conf import settings
+    from django.test import Client
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+    client = Client(HTTP_HOST=hosts[0] if hosts else 'localhost',
+                    secure=getattr(settings, 'SECURE_SSL_REDIRECT', False))
+    if user is not None:
+        client.force_login(user)
+    return client
+
+
+class ClientTransport:
+    """Run requests in-process through the Django test client."""
+
+    def __init__(self, user):
+        self.client = local_client(user)
+
+    def request(self, method, path, data=None):
+        response = getattr(self.client, method)(path, data or {})
+        body = response.content.decode() if response.status_code == 200 else ''
+        return Response(response.status_code, response.get('Location', ''), body)
+
+    def close(self):
+        from django.db import connection
+        connection.close()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """Run requests against a live server, logging in like a browser."""
+
+    def __init__(self, base_url, username, password, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect,
+        )
+        login = reverse('accounts:login')
+        page = self.request('get', login)
+        match = CSRF_INPUT.search(page.body)
+        response = self.request('post', login, {
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': match.group(1) if match else '',
+        })
+        if response.status != 302:
+            raise RuntimeError(f'Login failed for {username} (status {response.status}).')
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, method, path, data=None):
+        url = self.base_url + path
+        body = None
+        headers = {'Referer': url}
+        if method == 'post':
+            body = urllib.parse.urlencode(data or {}).encode()
+            headers['X-CSRFToken'] = self._csrf_token()
+        elif data:
+            url += '?' + urllib.parse.urlencode(data)
+        request = urllib.request.Request(url, data=body, headers=headers, method=method.upper())
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return Response(response.status, response.headers.get('Location', ''),
+                                response.read().decode(errors='replace'))
+        except urllib.error.HTTPError as e:
+            return Response(e.code, e.headers.get('Location', ''))
+
+    def close(self):
+        pass
+
+
+class Stats:
+    """Thread-safe per-step latency and error counters."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.sessions = 0
+
+    def record(self, step, elapsed, ok):
+        with self.lock:
+            self.latencies[step].append(elapsed * 1000)
+            if not ok:
+                self.errors[step] += 1
+
+    def report(self, duration):
+        steps = {}
+        for step in STEPS:
+            values = sorted(self.latencies.get(step, []))
+            if not values:
+                continue
+            steps[step] = {
+                'requests': len(values),
+                'errors': self.errors.get(step, 0),
+                'error_rate': round(self.errors.get(step, 0) / len(values), 4),
+                'rps': round(len(values) / duration, 2),
+                'mean_ms': round(statistics.fmean(values), 2),
+                'p50_ms': round(_percentile(values, 50), 2),
+                'p95_ms': round(_percentile(values, 95), 2),
+                'p99_ms': round(_percentile(values, 99), 2),
+            }
+        total = sum(s['requests'] for s in steps.values())
+        errors = sum(s['errors'] for s in steps.values())
+        return {
+            'duration_s': round(duration, 2),
+            'sessions': self.sessions,
+            'requests': total,
+            'rps': round(total / duration, 2) if duration else 0.0,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'steps': steps,
+        }
+
+
+def _percentile(ordered, pct):
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class VirtualCustomer:
+    """One simulated shopper repeating the funnel with think time between steps."""
+
+    def __init__(self, transport, stats, rng, think_time, items):
+        self.transport = transport
+        self.stats = stats
+        self.rng = rng
+        self.think_time = think_time
+        self.items = items
+
+    def step(self, name, method, path, data=None, expect=(200,)):
+        started = time.perf_counter()
+        try:
+            response = self.transport.request(method, path, data)
+            ok = response.status in expect
+        except Exception:
+            response, ok = None, False
+        self.stats.record(name, time.perf_counter() - started, ok)
+        if self.think_time:
+            time.sleep(self.rng.expovariate(1 / self.think_time))
+        return response if ok else None
+
+    def run_session(self):
+        self.step('home', 'get', reverse('core:home'))
+        menu = self.step('product_list', 'get', reverse('products:product_list'))
+        if menu is None:
+            return
+        categories = CATEGORY_LINK.findall(menu.body)
+        if categories:
+            self.step('category_filter', 'get', reverse('products:product_list'),
+                      {'category': self.rng.choice(categories)})
+        product_ids = list(dict.fromkeys(PRODUCT_LINK.findall(menu.body)))
+        if not product_ids:
+            return
+        picked = self.rng.sample(product_ids, min(self.items, len(product_ids)))
+        for product_id in picked:
+            self.step('add_to_cart', 'get', reverse('orders:add_to_cart', args=[product_id]), expect=(302,))
+        self.step('update_cart', 'post', reverse('orders:update_cart', args=[picked[0]]),
+                  {'quantity': self.rng.randint(1, 3)}, expect=(302,))
+        self.step('cart', 'get', reverse('orders:cart'))
+        placed = self.step('checkout', 'post', reverse('orders:checkout'), expect=(302,))
+        if placed is not None:
+            match = resolve(urllib.parse.urlparse(placed.location).path)
+            if match.view_name == 'orders:order_detail':
+                self.step('order_detail', 'get', placed.location)
+        with self.stats.lock:
+            self.stats.sessions += 1
+
+
+def run_load(transport_factories, duration=None, sessions=None, think_time=0.0, items=3, seed=None):
+    """
+    Run one virtual customer per transport factory concurrently.
+
+    Stops after ``duration`` seconds or once each customer completed
+    ``sessions`` funnels, whichever comes first. Returns the report dict.
+    """
+    stats = Stats()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker(index, factory):
+        transport = factory()
+        rng = random.Random(None if seed is None else seed + index)
+        customer = VirtualCustomer(transport, stats, rng, think_time, items)
+        completed = 0
+        try:
+            while (sessions is None or completed < sessions) and (deadline is None or time.perf_counter() < deadline):
+                customer.run_session()
+                completed += 1
+        finally:
+            transport.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i, f)) for i, f in enumerate(transport_factories)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.report(time.perf_counter() - started)
@@ -0,0 +1,79 @@
+"""
+Simulate concurrent customers walking the browse-to-checkout funnel.
+
+In-process (Django test client, current database):
+    python manage.py loadtest --concurrency 20 --duration 60
+
+Against a running server:
+    python manage.py loadtest --url http://127.0.0.1:8000 --concurrency 50 --think-time 1
+
+Customers are the users created by ``seed_pizzashop``.
+"""
+import json
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.loadtest import STEPS, ClientTransport, HttpTransport, run_load
+from core.management.commands.seed_pizzashop import USERNAME_PREFIX
+
+
+class Command(BaseCommand):
+    help = 'Run simulated customer sessions and report per-step throughput, latency and errors.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server (default: in-process test client).')
+        parser.add_argument('--concurrency', type=int, default=10, help='Concurrent customers (default: 10).')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Seconds to run (default: 30, 0 to rely on --sessions).')
+        parser.add_argument('--sessions', type=int, help='Funnels per customer before stopping.')
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help='Mean think time between steps in seconds (default: 0).')
+        parser.add_argument('--items', type=int, default=3, help='Products added to the cart per session.')
+        parser.add_argument('--password', default='seedpass123', help='Password of the seeded customers.')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible sessions.')
+        parser.add_argument('--json', dest='json_path', help='Also write the report to this file.')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        if not options['duration'] and not options['sessions']:
+            raise CommandError('Give --duration or --sessions.')
+
+        if options['url']:
+            factories = [
+                partial(HttpTransport, options['url'], f'{USERNAME_PREFIX}{i:07d}', options['password'])
+                for i in range(concurrency)
+            ]
+        else:
+            users = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id')[:concurrency])
+            if len(users) < concurrency:
+                raise CommandError(
+                    f'Need {concurrency} customers but found {len(users)}; run seed_pizzashop first.'
+                )
+            factories = [partial(ClientTransport, user) for user in users]
+
+        report = run_load(
+            factories,
+            duration=options['duration'] or None,
+            sessions=options['sessions'],
+            think_time=options['think_time'],
+            items=options['items'],
+            seed=options['seed'],
+        )
+
+        self.stdout.write(
+            f'{report["sessions"]} sessions, {report["requests"]} requests in {report["duration_s"]}s: '
+            f'{report["rps"]} req/s, {report["error_rate"]:.2%} errors'
+        )
+        self.stdout.write(f'{"step":16} {"requests":>9} {"req/s":>8} {"errors":>7} {"p50_ms":>8} {"p95_ms":>8} {"p99_ms":>8}')
+        for step in STEPS:
+            s = report['steps'].get(step)
+            if s:
+                self.stdout.write(
+                    f'{step:16} {s["requests"]:9d} {s["rps"]:8.1f} {s["error_rate"]:7.2%} '
+                    f'{s["p50_ms"]:8.1f} {s["p95_ms"]:8.1f} {s["p99_ms"]:8.1f}'
+                )
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,163 @@
+"""
+Replay a request mix in-process and report memory high-water marks.
+
+    python manage.py memory_replay --requests 500
+    python manage.py memory_replay --mix mix.json --json memory.json
+
+A mix file is a JSON list of ``{"path": "/orders/admin/orders/", "as":
+"admin", "weight": 2}`` entries, ``as`` being anonymous, customer or admin.
+Without one, the customer pages (with a cart of --cart-items products) and
+the admin order list are replayed. Each URL is requested once before the
+baseline snapshot so caches and lazy imports do not show up as growth.
+"""
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import resolve, reverse
+
+from core import memory
+from core.loadtest import local_client
+from core.management.commands.seed_pizzashop import USERNAME_PREFIX
+from orders.models import Order
+from products.models import Category, Product
+
+ROLES = ('anonymous', 'customer', 'admin')
+
+
+class Command(BaseCommand):
+    help = 'Replay a request mix under tracemalloc and report peak memory per URL and retained growth.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mix', help='JSON file with the request mix (default: built-in mix).')
+        parser.add_argument('--requests', type=int, default=300, help='Requests to replay (default: 300).')
+        parser.add_argument('--cart-items', type=int, default=20,
+                            help="Products in the customer's session cart (default: 20).")
+        parser.add_argument('--frames', type=int, default=1,
+                            help='Traceback depth per allocation (default: 1).')
+        parser.add_argument('--top', type=int, default=10, help='Allocation sites to show (default: 10).')
+        parser.add_argument('--seed', type=int, help='Random seed for a reproducible order.')
+        parser.add_argument('--json', dest='json_path', help='Also write the report to this file.')
+
+    def handle(self, *args, **options):
+        customer = User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id').first()
+        if customer is None:
+            customer = User.objects.filter(profile__role='customer').order_by('id').first()
+        admin = User.objects.filter(profile__role='admin').order_by('id').first()
+        clients = {
+            'anonymous': local_client(),
+            'customer': customer and local_client(customer),
+            'admin': admin and local_client(admin),
+        }
+
+        mix = self.load_mix(options['mix']) if options['mix'] else self.default_mix(customer)
+        mix = [entry for entry in mix if clients[entry['as']] is not None]
+        if not mix:
+            raise CommandError('Nothing to replay; run seed_pizzashop or create a customer first.')
+        if clients['customer'] is not None:
+            for product_id in Product.objects.filter(is_available=True).values_list('pk', flat=True)[:options['cart_items']]:
+                clients['customer'].get(reverse('orders:add_to_cart', args=[product_id]))
+
+        started_tracing = memory.start(options['frames'])
+        try:
+            report = self.replay(mix, clients, options)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        self.write_report(report)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+    def load_mix(self, path):
+        with open(path) as f:
+            mix = json.load(f)
+        for entry in mix:
+            if entry.get('as', 'anonymous') not in ROLES or 'path' not in entry:
+                raise CommandError(f'Invalid mix entry: {entry!r}')
+            entry.setdefault('as', 'anonymous')
+            entry.setdefault('weight', 1)
+        return mix
+
+    def default_mix(self, customer):
+        mix = [
+            {'path': reverse('core:home'), 'as': 'customer', 'weight': 3},
+            {'path': reverse('products:product_list'), 'as': 'customer', 'weight': 5},
+            {'path': reverse('orders:cart'), 'as': 'customer', 'weight': 2},
+            {'path': reverse('orders:order_list'), 'as': 'customer', 'weight': 1},
+            {'path': reverse('orders:admin_order_list'), 'as': 'admin', 'weight': 1},
+        ]
+        product = Product.objects.filter(is_available=True).order_by('id').first()
+        if product:
+            mix.append({'path': reverse('products:product_detail', args=[product.pk]), 'as': 'customer', 'weight': 3})
+        category = Category.objects.order_by('id').first()
+        if category:
+            mix.append({'path': reverse('products:category_detail', args=[category.slug]), 'as': 'customer', 'weight': 2})
+        order = Order.objects.filter(customer=customer).order_by('-id').first() if customer else None
+        if order:
+            mix.append({'path': reverse('orders:order_detail', args=[order.pk]), 'as': 'customer', 'weight': 1})
+        return mix
+
+    def replay(self, mix, clients, options):
+        rng = random.Random(options['seed'])
+        names = {entry['path']: resolve(entry['path'].split('?')[0]).view_name for entry in mix}
+        for entry in mix:
+            clients[entry['as']].get(entry['path'])
+        gc.collect()
+        baseline = tracemalloc.take_snapshot().filter_traces(memory.SNAPSHOT_FILTERS)
+        baseline_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+        routes = {}
+        errors = 0
+        started = time.perf_counter()
+        for entry in rng.choices(mix, weights=[entry['weight'] for entry in mix], k=options['requests']):
+            with memory.Measurement() as measurement:
+                response = clients[entry['as']].get(entry['path'])
+            errors += response.status_code >= 400
+            del response
+            stats = routes.setdefault(names[entry['path']], {'requests': 0, 'total': 0, 'max_bytes': 0})
+            stats['requests'] += 1
+            stats['total'] += measurement.peak
+            stats['max_bytes'] = max(stats['max_bytes'], measurement.peak)
+        duration = time.perf_counter() - started
+
+        gc.collect()
+        final = tracemalloc.take_snapshot().filter_traces(memory.SNAPSHOT_FILTERS)
+        return {
+            'requests': options['requests'],
+            'errors': errors,
+            'duration_s': round(duration, 2),
+            'baseline_bytes': baseline_bytes,
+            'retained_bytes': tracemalloc.get_traced_memory()[0] - baseline_bytes,
+            'peak_rss_bytes': memory.peak_rss_bytes(),
+            'routes': {
+                name: {
+                    'requests': s['requests'],
+                    'mean_bytes': s['total'] // s['requests'],
+                    'max_bytes': s['max_bytes'],
+                }
+                for name, s in sorted(routes.items(), key=lambda item: item[1]['max_bytes'], reverse=True)
+            },
+            'growth': memory.growth(baseline, final, options['top']),
+        }
+
+    def write_report(self, report):
+        self.stdout.write(
+            f'{report["requests"]} requests ({report["errors"]} errors) in {report["duration_s"]}s, '
+            f'retained {report["retained_bytes"] / 1024:.1f} KiB'
+            + (f', peak RSS {report["peak_rss_bytes"] / 2 ** 20:.1f} MiB' if report['peak_rss_bytes'] else '')
+        )
+        self.stdout.write(f'{"url name":32} {"requests":>9} {"mean_kib":>10} {"max_kib":>10}')
+        for name, s in report['routes'].items():
+            self.stdout.write(
+                f'{name:32} {s["requests"]:9d} {s["mean_bytes"] / 1024:10.1f} {s["max_bytes"] / 1024:10.1f}'
+            )
+        if report['growth']:
+            self.stdout.write('Retained growth by allocation site:')
+            for row in report['growth']:
+                self.stdout.write(f'  {row["size_diff"] / 1024:+10.1f} KiB {row["count_diff"]:+7d} blocks  {row["site"]}')
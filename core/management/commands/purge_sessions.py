@@ -0,0 +1,51 @@
+"""
+Delete expired sessions in small batches.
+
+Unlike ``clearsessions``, which removes the whole backlog in a single DELETE,
+this command works through it in short transactions with a pause in between
+so checkout traffic is never blocked behind a long table lock.
+"""
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions in small batches with pauses between them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of sessions deleted per statement (default: 1000).')
+        parser.add_argument('--sleep', type=float, default=0.1,
+                            help='Seconds to pause between batches (default: 0.1).')
+        parser.add_argument('--max-batches', type=int, default=0,
+                            help='Stop after this many batches (default: 0, no limit).')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pause = options['sleep']
+        max_batches = options['max_batches']
+        cutoff = timezone.now()
+        deleted = 0
+        batches = 0
+
+        while not max_batches or batches < max_batches:
+            keys = list(
+                Session.objects.filter(expire_date__lt=cutoff)
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+            count, _ = Session.objects.filter(session_key__in=keys).delete()
+            deleted += count
+            batches += 1
+            if len(keys) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired sessions in {batches} batches.'
+        ))
@@ -0,0 +1,251 @@
+"""
+Generate a realistic, production-sized dataset for scale testing.
+
+Product popularity follows a Zipf-like distribution, orders cluster around
+lunch and dinner, customers range from one-off visitors to regulars, and
+order status depends on order age. The same --seed always produces the same
+data. Rows are inserted in bulk, in chunked transactions, so memory use
+stays flat regardless of the number of orders.
+"""
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from functools import partial
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from accounts.models import UserProfile
+from orders.models import (ArchivedOrder, ArchivedOrderItem, DailyProductSales,
+                           HourlyStatusSales, Order, OrderItem)
+from products.models import Category, Product
+
+USERNAME_PREFIX = 'seed_'
+
+CATEGORY_NAMES = [
+    'Classic', 'Vegetarian', 'Meat Lovers', 'Seafood', 'Spicy', 'Gourmet',
+    'White Pizzas', 'Calzones', 'Vegan', 'Kids', 'Specials', 'Sides',
+]
+TOPPINGS = [
+    'Margherita', 'Pepperoni', 'Hawaiian', 'Funghi', 'Quattro Formaggi', 'Diavola',
+    'Capricciosa', 'Prosciutto', 'Marinara', 'BBQ Chicken', 'Truffle', 'Pesto',
+    'Tonno', 'Calabrese', 'Napoli', 'Ortolana', 'Salsiccia', 'Bianca',
+]
+STYLES = ['', 'Deluxe', 'Supreme', 'Rustica', 'Al Forno', 'Piccante', 'Della Casa']
+
+# Relative order volume per hour of day: lunch and dinner peaks.
+HOUR_WEIGHTS = [
+    1, 0.5, 0.2, 0.1, 0.1, 0.1, 0.2, 0.5, 1, 2, 3, 8,
+    14, 12, 5, 3, 4, 8, 16, 20, 15, 9, 5, 2,
+]
+
+QUANTITIES = [1, 2, 3, 4]
+
+
+def cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+QUANTITY_CUM = cumulative([70, 20, 7, 3])
+
+
+class Command(BaseCommand):
+    help = 'Generate categories, products, customers and order history for scale testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--products', type=int, default=120)
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--orders', type=int, default=50000)
+        parser.add_argument('--items-per-order', type=float, default=3.0,
+                            help='Average number of line items per order (default: 3.0).')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread orders over this many days of history (default: 365).')
+        parser.add_argument('--popularity-skew', type=float, default=1.1,
+                            help='Zipf exponent of product popularity (default: 1.1).')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Orders per insert transaction (default: 5000).')
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete all orders (archived too), sales rollups, products, categories and seeded users first.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.verbosity = options['verbosity']
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        if options['clear']:
+            self.clear()
+        categories = self.create_categories(options['categories'])
+        products = self.create_products(options['products'], categories)
+        customers = self.create_users(options['users'])
+        items = self.create_orders(
+            options['orders'], options['items_per_order'], options['days'], options['popularity_skew'], products, customers,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(categories)} categories, {len(products)} products, {len(customers)} users, '
+            f'{options["orders"]} orders and {items} order items in {time.perf_counter() - started:.1f}s.'
+        ))
+
+    def clear(self):
+        DailyProductSales.objects.all().delete()
+        HourlyStatusSales.objects.all().delete()
+        ArchivedOrderItem.objects.all().delete()
+        ArchivedOrder.objects.all().delete()
+        OrderItem.objects.all().delete()
+        Order.objects.all().delete()
+        Product.objects.all().delete()
+        Category.objects.all().delete()
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def create_categories(self, count):
+        names = CATEGORY_NAMES + [f'Category {i}' for i in range(len(CATEGORY_NAMES), count)]
+        return Category.objects.bulk_create([
+            Category(name=name, slug=slugify(name), description=f'Our {name.lower()} selection.')
+            for name in names[:count]
+        ])
+
+    def create_products(self, count, categories):
+        names = (
+            ' '.join(filter(None, [topping, style]))
+            for style, topping in itertools.product(STYLES, TOPPINGS)
+        )
+        products = []
+        for i in range(count):
+            name = next(names, None) or f'Pizza {i}'
+            products.append(Product(
+                name=name,
+                description=f'{name} baked in our stone oven.',
+                price=Decimal(self.rng.randrange(799, 2199)) / 100,
+                category=categories[i % len(categories)],
+                is_available=self.rng.random() > 0.05,
+            ))
+        return Product.objects.bulk_create(products, batch_size=self.batch_size)
+
+    def create_users(self, count):
+        # Hash once: every seeded user shares the password "seedpass123".
+        password = make_password('seedpass123')
+        now = timezone.now()
+        users = []
+        for start in range(0, count, self.batch_size):
+            with transaction.atomic():
+                batch = User.objects.bulk_create([
+                    User(username=f'{USERNAME_PREFIX}{i:07d}', password=password, date_joined=now)
+                    for i in range(start, min(count, start + self.batch_size))
+                ])
+                # bulk_create skips the post_save signal that creates profiles.
+                UserProfile.objects.bulk_create([
+                    UserProfile(
+                        user=user,
+                        phone_number=f'555-{self.rng.randrange(10000):04d}',
+                        address=f'{self.rng.randrange(1, 999)} Main Street',
+                    )
+                    for user in batch
+                ])
+            users.extend(user.pk for user in batch)
+        return users
+
+    def order_time(self, now, days, hour_cum):
+        day = now - timedelta(days=int(self.rng.random() ** 0.7 * days))
+        hour = self.rng.choices(range(24), cum_weights=hour_cum)[0]
+        created_at = day.replace(hour=hour, minute=self.rng.randrange(60), second=self.rng.randrange(60))
+        return created_at - timedelta(days=1) if created_at > now else created_at
+
+    def order_status(self, created_at, now):
+        age = now - created_at
+        if age < timedelta(hours=2):
+            return self.rng.choices(['pending', 'paid', 'delivered', 'cancelled'], [45, 40, 10, 5])[0]
+        if age < timedelta(days=1):
+            return self.rng.choices(['paid', 'delivered', 'cancelled'], [10, 85, 5])[0]
+        return self.rng.choices(['delivered', 'cancelled', 'paid'], [92, 7, 1])[0]
+
+    def create_orders(self, count, items_per_order, days, skew, products, customers):
+        if not products or not customers:
+            return 0
+        now = datetime.now(dt_timezone.utc)
+        hour_cum = cumulative(HOUR_WEIGHTS)
+        product_cum = cumulative(1 / (rank + 1) ** skew for rank in range(len(products)))
+        # A few regulars place many orders, most customers order rarely.
+        customer_cum = cumulative(1 / (rank + 1) ** 0.8 for rank in range(len(customers)))
+        # Geometric line-item count with the requested mean.
+        extra_item = 1 - 1 / max(items_per_order, 1)
+        max_items = min(len(products), 25)
+
+        db = connections[DEFAULT_DB_ALIAS]
+        prep_created = partial(Order._meta.get_field('created_at').get_db_prep_save, connection=db)
+        prep_updated = partial(Order._meta.get_field('updated_at').get_db_prep_save, connection=db)
+        prep_total = partial(Order._meta.get_field('total_price').get_db_prep_save, connection=db)
+        prep_price = partial(OrderItem._meta.get_field('price').get_db_prep_save, connection=db)
+        # (pk, price, price as stored) per product, converted once.
+        catalog = [(product.pk, product.price, prep_price(product.price)) for product in products]
+        # Archived orders keep their ids, so new ones must start above them too.
+        next_id = max(
+            Order.objects.aggregate(Max('id'))['id__max'] or 0,
+            ArchivedOrder.objects.aggregate(Max('id'))['id__max'] or 0,
+        ) + 1
+        total_items = 0
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            order_rows = []
+            item_rows = []
+            for order_id, customer_id in enumerate(
+                self.rng.choices(customers, cum_weights=customer_cum, k=size), start=next_id + start,
+            ):
+                created_at = self.order_time(now, days, hour_cum)
+                n_items = 1
+                while n_items < max_items and self.rng.random() < extra_item:
+                    n_items += 1
+                total = Decimal('0.00')
+                for pk, price, db_price in dict.fromkeys(self.rng.choices(catalog, cum_weights=product_cum, k=n_items)):
+                    quantity = self.rng.choices(QUANTITIES, cum_weights=QUANTITY_CUM)[0]
+                    total += price * quantity
+                    item_rows.append((order_id, pk, quantity, db_price))
+                order_rows.append((
+                    order_id,
+                    customer_id,
+                    prep_created(created_at),
+                    prep_updated(created_at + timedelta(minutes=self.rng.randrange(5, 90))),
+                    self.order_status(created_at, now),
+                    prep_total(total),
+                ))
+
+            with transaction.atomic():
+                self.insert_rows(db, Order, ['id', 'customer', 'created_at', 'updated_at', 'status', 'total_price'], order_rows)
+                self.insert_rows(db, OrderItem, ['order', 'product', 'quantity', 'price'], item_rows)
+            total_items += len(item_rows)
+            if self.verbosity >= 2:
+                self.stdout.write(f'  {start + size}/{count} orders, {total_items} items')
+
+        # Explicit ids bypass the sequences on backends that have them.
+        with db.cursor() as cursor:
+            for sql in db.ops.sequence_reset_sql(no_style(), [Order, OrderItem]):
+                cursor.execute(sql)
+        return total_items
+
+    def insert_rows(self, db, model, field_names, rows):
+        """
+        Insert pre-converted rows with executemany.
+
+        Skips bulk_create's per-value SQL compilation, which dominates the
+        cost of loading millions of order items.
+        """
+        if not rows:
+            return
+        columns = ', '.join(db.ops.quote_name(model._meta.get_field(name).column) for name in field_names)
+        placeholders = ', '.join(['%s'] * len(field_names))
+        with db.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {db.ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})',
+                rows,
+            )
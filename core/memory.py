@@ -0,0 +1,177 @@
+"""
+tracemalloc-based memory instrumentation.
+
+With MEMORY_PROFILING on, MemoryProfilingMiddleware starts tracemalloc in each
+worker, records the peak traced memory of every request by URL name and takes
+a snapshot every MEMORY_SNAPSHOT_SECONDS. The first snapshot is kept as the
+worker's baseline plus the newest MEMORY_SNAPSHOT_KEEP; diffing them by
+allocation site shows what a long-lived worker keeps growing. The admin page
+at /memory/ shows the report and takes snapshots on demand, and the
+``memory_replay`` command measures a request mix offline.
+
+Peaks are per process: allocations of concurrent requests in other threads
+of the same worker count towards a request's peak, so treat them as upper
+bounds under threaded servers.
+"""
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Allocations made by tracemalloc itself or the import machinery are noise.
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+_lock = threading.Lock()
+_snapshot_lock = threading.Lock()
+_peaks = {}
+_baseline = None
+_snapshots = deque()
+_last_snapshot = 0.0
+
+
+def _reset_after_fork():
+    """Forked workers start their own baseline and peaks."""
+    global _baseline, _last_snapshot
+    _peaks.clear()
+    _snapshots.clear()
+    _baseline = None
+    _last_snapshot = 0.0
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def start(frames=None):
+    """Start tracing allocations if not already tracing; return True if started here."""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames or getattr(settings, 'MEMORY_TRACE_FRAMES', 1))
+    return True
+
+
+class Measurement:
+    """Peak traced memory above the starting point while the block ran."""
+    __slots__ = ('start', 'peak', 'retained')
+
+    def __init__(self):
+        self.start = self.peak = self.retained = 0
+
+    def __enter__(self):
+        self.start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, *exc_info):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(peak - self.start, 0)
+        self.retained = current - self.start
+
+
+def record_peak(url_name, peak):
+    """Add one request's peak to the per-URL statistics."""
+    with _lock:
+        stats = _peaks.get(url_name)
+        if stats is None:
+            stats = _peaks[url_name] = [0, 0, 0]
+        stats[0] += 1
+        stats[1] += peak
+        stats[2] = max(stats[2], peak)
+
+
+def peaks():
+    """Per-URL peak statistics, largest maximum first."""
+    with _lock:
+        rows = [
+            {'url_name': name, 'requests': count, 'mean_bytes': total // count, 'max_bytes': largest}
+            for name, (count, total, largest) in _peaks.items()
+        ]
+    return sorted(rows, key=lambda row: row['max_bytes'], reverse=True)
+
+
+def take_snapshot(label='manual'):
+    """Snapshot the traced allocations of this worker and keep it for diffing."""
+    global _baseline, _last_snapshot
+    if not tracemalloc.is_tracing():
+        return None
+    entry = {
+        'label': label,
+        'taken_at': timezone.now(),
+        'traced_bytes': tracemalloc.get_traced_memory()[0],
+        'snapshot': tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS),
+    }
+    _last_snapshot = time.monotonic()
+    if _baseline is None:
+        _baseline = entry
+    else:
+        _snapshots.append(entry)
+        while len(_snapshots) > getattr(settings, 'MEMORY_SNAPSHOT_KEEP', 4):
+            _snapshots.popleft()
+    return entry
+
+
+def maybe_snapshot():
+    """Take the periodic snapshot if it is due; never blocks if one is being taken."""
+    interval = getattr(settings, 'MEMORY_SNAPSHOT_SECONDS', 300)
+    if not interval or time.monotonic() - _last_snapshot < interval:
+        return
+    if _snapshot_lock.acquire(blocking=False):
+        try:
+            take_snapshot('periodic')
+        finally:
+            _snapshot_lock.release()
+
+
+def growth(old, new, limit=20, key_type='lineno'):
+    """Allocation sites whose retained size grew the most from ``old`` to ``new``."""
+    rows = []
+    for stat in new.compare_to(old, key_type)[:limit]:
+        if stat.size_diff <= 0:
+            break
+        frame = stat.traceback[0]
+        rows.append({
+            'site': f'{frame.filename}:{frame.lineno}',
+            'size_diff': stat.size_diff,
+            'size': stat.size,
+            'count_diff': stat.count_diff,
+        })
+    return rows
+
+
+def peak_rss_bytes():
+    """High-water mark of the process's resident set size, if the platform reports it."""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024
+
+
+def report(limit=20):
+    """Everything the admin page shows for this worker."""
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    snapshots = ([_baseline] if _baseline else []) + list(_snapshots)
+    return {
+        'pid': os.getpid(),
+        'tracing': tracing,
+        'traced_bytes': current,
+        'traced_peak_bytes': peak,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'snapshots': [{key: s[key] for key in ('label', 'taken_at', 'traced_bytes')} for s in snapshots],
+        'growth': growth(_baseline['snapshot'], _snapshots[-1]['snapshot'], limit) if _snapshots else [],
+        'peaks': peaks(),
+    }
@@ -0,0 +1,295 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Every thread records into its own shard, so counters and histograms are
+updated without locks on the request path; shards are only merged when a
+snapshot is taken. Shards of threads that have exited (ASGI runs sync code
+in short-lived threads) are folded into one retired shard whenever a new
+thread creates its shard, so their number stays bounded by the live
+threads. With METRICS_DIR set, each worker process periodically
+writes its snapshot to ``<METRICS_DIR>/metrics-<pid>.json`` and the scrape
+endpoint sums the files of all workers, which makes the numbers correct
+under multi-process gunicorn/uvicorn deployments.
+"""
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+REGISTRY = []
+
+
+class _Shard:
+    __slots__ = ('counters', 'histograms', 'thread')
+
+    def __init__(self, thread=None):
+        self.counters = {}
+        self.histograms = {}
+        self.thread = thread
+
+    def absorb(self, other):
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, data in other.histograms.items():
+            merged = self.histograms.get(key)
+            self.histograms[key] = list(data) if merged is None else [a + b for a, b in zip(merged, data)]
+
+
+_retired = _Shard()
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = _Shard(threading.current_thread())
+        # Runs once per thread, never on the steady-state request path.
+        with _shards_lock:
+            _retire_dead_shards()
+            _shards.append(shard)
+        return shard
+
+
+def _retire_dead_shards():
+    """Fold the shards of exited threads into _retired; call with _shards_lock held."""
+    live = []
+    for shard in _shards:
+        if shard.thread.is_alive():
+            live.append(shard)
+        else:
+            _retired.absorb(shard)
+    _shards[:] = live
+
+
+def _reset_after_fork():
+    """Forked workers must not re-report what the parent recorded."""
+    global _local, _retired, _last_flush
+    _local = threading.local()
+    _shards.clear()
+    _retired = _Shard()
+    _last_flush = 0.0
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class Counter:
+    """Monotonically increasing counter."""
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        counters = _shard().counters
+        key = (self.name, labelvalues)
+        counters[key] = counters.get(key, 0) + amount
+
+
+class Histogram:
+    """Distribution of observed values in fixed buckets."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        REGISTRY.append(self)
+
+    def observe(self, value, *labelvalues):
+        histograms = _shard().histograms
+        key = (self.name, labelvalues)
+        # Layout: one slot per bucket plus +Inf, then sum and count.
+        data = histograms.get(key)
+        if data is None:
+            data = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        data[bisect.bisect_left(self.buckets, value)] += 1
+        data[-2] += value
+        data[-1] += 1
+
+
+REQUEST_DURATION = Histogram(
+    'pizzashop_http_request_duration_seconds', 'Request latency by URL name.', ['url_name', 'method'],
+)
+REQUESTS = Counter(
+    'pizzashop_http_requests_total', 'Requests by URL name and status code.', ['url_name', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'pizzashop_db_queries_per_request', 'Database queries per request by URL name.', ['url_name'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+CHECKOUT_DURATION = Histogram(
+    'pizzashop_checkout_duration_seconds', 'Time spent creating an order at checkout.',
+)
+CART_SIZE = Histogram(
+    'pizzashop_cart_items', 'Units in the cart at checkout.', buckets=(1, 2, 3, 5, 8, 13, 20, 40),
+)
+REQUEST_PEAK_MEMORY = Histogram(
+    'pizzashop_request_peak_memory_bytes', 'Peak traced memory per request by URL name (MEMORY_PROFILING).',
+    ['url_name'], buckets=tuple(2 ** n for n in range(16, 28, 2)),
+)
+ORDER_TRANSITIONS = Counter(
+    'pizzashop_order_status_transitions_total', 'Order status changes (from "new" at checkout).',
+    ['from_status', 'to_status'],
+)
+STOCK_RESERVATIONS = Counter(
+    'pizzashop_stock_reservations_total', 'Checkout stock reservations by result (reserved or rejected).',
+    ['result'],
+)
+SSE_CONNECTIONS = Counter(
+    'pizzashop_sse_connections_total', 'Server-sent event streams opened and closed (open = opened - closed).',
+    ['event'],
+)
+LOAD_SHED_DECISIONS = Counter(
+    'pizzashop_load_shed_decisions_total', 'Load shedding decisions (admitted, cached or shed) by route class.',
+    ['route_class', 'decision'],
+)
+QUEUE_LATENCY = Histogram(
+    'pizzashop_request_queue_seconds', 'Time from the proxy (X-Request-Start) to Django by route class.',
+    ['route_class'],
+)
+
+
+def _encode_key(key):
+    name, labelvalues = key
+    return json.dumps([name, list(labelvalues)])
+
+
+def local_snapshot():
+    """Merge this process's thread shards into one JSON-serialisable snapshot."""
+    # Copied under the lock so a shard cannot be retired (counted twice) meanwhile.
+    with _shards_lock:
+        copies = [(shard.counters.copy(), shard.histograms.copy()) for shard in (_retired, *_shards)]
+    counters = {}
+    histograms = {}
+    for shard_counters, shard_histograms in copies:
+        for key, value in shard_counters.items():
+            key = _encode_key(key)
+            counters[key] = counters.get(key, 0) + value
+        for key, data in shard_histograms.items():
+            key = _encode_key(key)
+            merged = histograms.get(key)
+            histograms[key] = list(data) if merged is None else [a + b for a, b in zip(merged, data)]
+    return {'counters': counters, 'histograms': histograms}
+
+
+def _merge(total, snapshot):
+    for key, value in snapshot['counters'].items():
+        total['counters'][key] = total['counters'].get(key, 0) + value
+    for key, data in snapshot['histograms'].items():
+        merged = total['histograms'].get(key)
+        total['histograms'][key] = list(data) if merged is None else [a + b for a, b in zip(merged, data)]
+
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', '')
+
+
+def flush():
+    """Write this worker's snapshot to METRICS_DIR (atomic replace)."""
+    global _last_flush
+    directory = _metrics_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(local_snapshot(), f)
+    os.replace(tmp_path, path)
+    _last_flush = time.monotonic()
+
+
+def maybe_flush():
+    """Flush if the interval elapsed; never blocks if another thread is flushing."""
+    if not _metrics_dir() or time.monotonic() - _last_flush < getattr(settings, 'METRICS_FLUSH_SECONDS', 5):
+        return
+    if _flush_lock.acquire(blocking=False):
+        try:
+            flush()
+        finally:
+            _flush_lock.release()
+
+
+def collect():
+    """Return the snapshot of all workers (or just this process without METRICS_DIR)."""
+    directory = _metrics_dir()
+    if not directory:
+        return local_snapshot()
+    flush()
+    total = {'counters': {}, 'histograms': {}}
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            with open(path) as f:
+                _merge(total, json.load(f))
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition(snapshot=None):
+    """Render a snapshot in the Prometheus text format (version 0.0.4)."""
+    snapshot = collect() if snapshot is None else snapshot
+    series = {}
+    for kind in ('counters', 'histograms'):
+        for key, value in snapshot[kind].items():
+            name, labelvalues = json.loads(key)
+            series.setdefault(name, []).append((tuple(labelvalues), value))
+
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for labelvalues, value in sorted(series.get(metric.name, [])):
+            if metric.type == 'counter':
+                lines.append(f'{metric.name}{_format_labels(metric.labelnames, labelvalues)} {_format_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ('+Inf',), value[:-2]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_number(float(bound))
+                labels = _format_labels(metric.labelnames, labelvalues, [('le', le)])
+                lines.append(f'{metric.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(metric.labelnames, labelvalues)
+            lines.append(f'{metric.name}_sum{labels} {_format_number(value[-2])}')
+            lines.append(f'{metric.name}_count{labels} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        pass
@@ -0,0 +1,497 @@
+"""
+Middleware for the core app.
+"""
+import cProfile
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.middleware.gzip import GZipMiddleware
+from django.urls import Resolver404, resolve
+
+from products.stock import catalog_version
+
+from . import (instrumentation, loadshed, memory, metrics, profiling,
+               staticfiles)
+from .routers import has_written, reset_pinning
+
+performance_logger = logging.getLogger('pizzashop.performance')
+
+
+def url_name(request):
+    """Return the namespaced URL name of the resolved view, e.g. 'orders:checkout'."""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unresolved>'
+
+
+class RequestTimingMiddleware:
+    """
+    Record query count, SQL time, template and view time per request.
+
+    Adds a Server-Timing header and logs a JSON record for requests slower
+    than PERF_SLOW_REQUEST_MS or issuing more than PERF_SLOW_QUERY_COUNT
+    queries. Should be the first middleware so ``total`` covers the stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        instrumentation.install()
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PERF_SERVER_TIMING', True)
+        self.slow_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 500)
+        self.slow_queries = getattr(settings, 'PERF_SLOW_QUERY_COUNT', 50)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token = instrumentation.start_request()
+        try:
+            response = self.get_response(request)
+            self._finish(request, response, metrics)
+        finally:
+            instrumentation.finish_request(token)
+        return response
+
+    async def __acall__(self, request):
+        metrics, token = instrumentation.start_request()
+        try:
+            response = await self.get_response(request)
+            self._finish(request, response, metrics)
+        finally:
+            instrumentation.finish_request(token)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = instrumentation.current_metrics()
+        if metrics is not None:
+            metrics.view_started = metrics.elapsed()
+
+    def _finish(self, request, response, metrics):
+        total_ms = metrics.elapsed() * 1000
+        if metrics.view_started is not None:
+            metrics.view_time = metrics.elapsed() - metrics.view_started
+        record = {
+            'url_name': url_name(request),
+            'method': request.method,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.sql_time * 1000, 2),
+            'template_ms': round(metrics.template_time * 1000, 2),
+            'view_ms': round(metrics.view_time * 1000, 2),
+            'total_ms': round(total_ms, 2),
+        }
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={record["db_ms"]};desc="{metrics.queries} queries", '
+                f'tpl;dur={record["template_ms"]}, '
+                f'view;dur={record["view_ms"]}, '
+                f'total;dur={record["total_ms"]}'
+            )
+        if total_ms >= self.slow_ms or metrics.queries >= self.slow_queries:
+            if metrics.template_timings:
+                record['templates'] = metrics.slowest_templates()
+            performance_logger.warning(json.dumps(record), extra={'performance': record})
+
+
+class MetricsMiddleware:
+    """
+    Record request latency, status and query count per URL name.
+
+    Reuses RequestTimingMiddleware's query counter when it runs outside this
+    middleware, otherwise collects its own.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        instrumentation.install()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        collector, token = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                instrumentation.finish_request(token)
+        self._record(request, response, collector, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        collector, token = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                instrumentation.finish_request(token)
+        self._record(request, response, collector, started)
+        return response
+
+    def _start(self):
+        current = instrumentation.current_metrics()
+        if current is not None:
+            return current, None
+        return instrumentation.start_request()
+
+    def _record(self, request, response, collector, started):
+        name = url_name(request)
+        metrics.REQUEST_DURATION.observe(time.perf_counter() - started, name, request.method)
+        metrics.REQUESTS.inc(name, request.method, str(response.status_code))
+        metrics.REQUEST_QUERIES.observe(collector.queries, name)
+        metrics.maybe_flush()
+
+
+class MemoryProfilingMiddleware:
+    """
+    Record the peak traced memory of each request by URL name.
+
+    Starts tracemalloc in the worker and takes the periodic snapshots of
+    core.memory. Tracing slows allocations down noticeably, so this is only
+    active with MEMORY_PROFILING on. Under ASGI concurrent requests share
+    (and reset) the one traced peak, so the per-request figures are rough.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'MEMORY_PROFILING', False):
+            raise MiddlewareNotUsed
+        memory.start()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with memory.Measurement() as measurement:
+            response = self.get_response(request)
+        return self._record(request, response, measurement)
+
+    async def __acall__(self, request):
+        with memory.Measurement() as measurement:
+            response = await self.get_response(request)
+        return self._record(request, response, measurement)
+
+    def _record(self, request, response, measurement):
+        name = url_name(request)
+        memory.record_peak(name, measurement.peak)
+        metrics.REQUEST_PEAK_MEMORY.observe(measurement.peak, name)
+        memory.maybe_snapshot()
+        return response
+
+
+class StaticFilesMiddleware:
+    """
+    Serve the collectstatic output from STATIC_ROOT, precompressed and cached.
+
+    The file index is built once at startup (run collectstatic before
+    starting the server), so a request costs one dictionary lookup. Place it
+    right after SecurityMiddleware to skip sessions and authentication.
+    Under ASGI other requests go straight on to the awaited handler.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'STATIC_SERVE', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.files = staticfiles.build_index(settings.STATIC_ROOT, settings.STATIC_URL)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self._find(request)
+        if static_file is not None:
+            return staticfiles.serve(request, static_file)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        static_file = self._find(request)
+        if static_file is not None:
+            return staticfiles.serve(request, static_file)
+        return await self.get_response(request)
+
+    def _find(self, request):
+        if request.method in ('GET', 'HEAD'):
+            return self.files.get(request.path_info)
+        return None
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    gzip HTML, JSON and CSV responses of at least COMPRESSION_MIN_SIZE bytes.
+
+    Below the threshold the gzip overhead outweighs the savings; other
+    content types (images, already compressed static files) are left alone.
+    Keeps GZipMiddleware's BREACH mitigation and its Vary/ETag handling.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'COMPRESSION_ENABLED', False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.content_types = frozenset(getattr(settings, 'COMPRESSION_CONTENT_TYPES', ('text/html', 'application/json')))
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';', 1)[0].strip()
+        if content_type not in self.content_types:
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+        return super().process_response(request, response)
+
+
+class LoadSheddingMiddleware:
+    """
+    Turn low-priority requests away first when the workers are saturated.
+
+    Classifies each request with core.loadshed and asks its tracker whether
+    the class is admitted at the current pressure. A shed request gets a 503
+    with Retry-After, except an anonymous catalog GET that has a cached copy
+    of its page (kept for LOAD_SHEDDING_PAGE_SECONDS from normal anonymous
+    responses, keyed on the catalog version), which gets that copy instead.
+    Place it after CompressionMiddleware and before SessionMiddleware so
+    shed requests never touch the session or the database.
+    """
+    sync_capable = True
+    async_capable = True
+    PAGE_KEY = 'loadshed:page:{version}:{path}'
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'LOAD_SHEDDING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.retry_after = getattr(settings, 'LOAD_SHEDDING_RETRY_AFTER', 5)
+        self.page_seconds = getattr(settings, 'LOAD_SHEDDING_PAGE_SECONDS', 60)
+        self.trust_request_start = getattr(settings, 'LOAD_SHEDDING_TRUST_REQUEST_START', False)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        cls, admitted = self._admit(request)
+        if cls is None:
+            return self.get_response(request)
+        if not admitted:
+            return self._shed(request, cls, self._cached_page(request, cls))
+        try:
+            response = self.get_response(request)
+        finally:
+            loadshed.tracker.release(cls)
+        if self._cacheable(request, cls, response):
+            self._store_page(request, response)
+        return response
+
+    async def __acall__(self, request):
+        cls, admitted = self._admit(request)
+        if cls is None:
+            return await self.get_response(request)
+        if not admitted:
+            return self._shed(request, cls, await sync_to_async(self._cached_page)(request, cls))
+        try:
+            response = await self.get_response(request)
+        finally:
+            loadshed.tracker.release(cls)
+        if self._cacheable(request, cls, response):
+            await sync_to_async(self._store_page)(request, response)
+        return response
+
+    def _admit(self, request):
+        try:
+            # Django resolves again later; setting it here labels shed requests in the metrics.
+            request.resolver_match = resolve(request.path_info)
+        except Resolver404:
+            pass
+        cls = loadshed.route_class(url_name(request))
+        if cls is None:
+            return None, True
+        queued = None
+        if self.trust_request_start:
+            queued = loadshed.queue_seconds(request.headers.get('X-Request-Start'))
+        if queued is not None:
+            metrics.QUEUE_LATENCY.observe(queued, cls)
+        admitted, _ = loadshed.tracker.admit(cls, None if queued is None else queued * 1000)
+        if admitted:
+            metrics.LOAD_SHED_DECISIONS.inc(cls, 'admitted')
+        return cls, admitted
+
+    def _shed(self, request, cls, page):
+        if page is not None:
+            content, content_type = page
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Load-Shed'] = 'cached'
+        else:
+            response = HttpResponse('The shop is very busy right now, please try again in a moment.',
+                                    status=503, content_type='text/plain; charset=utf-8')
+            response['Retry-After'] = str(self.retry_after)
+            response['X-Load-Shed'] = 'shed'
+            # Counted in the metrics; an error log line per shed request would add to the load.
+            response._has_been_logged = True
+        response['Cache-Control'] = 'no-store'
+        metrics.LOAD_SHED_DECISIONS.inc(cls, response['X-Load-Shed'])
+        return response
+
+    def _anonymous_browse(self, request, cls):
+        return cls == 'browse' and request.method == 'GET' and settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+    def _cacheable(self, request, cls, response):
+        return (self._anonymous_browse(request, cls) and response.status_code == 200
+                and not response.streaming and not response.cookies)
+
+    def _page_key(self, request):
+        return self.PAGE_KEY.format(version=catalog_version(), path=request.get_full_path())
+
+    def _cached_page(self, request, cls):
+        if not self._anonymous_browse(request, cls):
+            return None
+        return cache.get(self._page_key(request))
+
+    def _store_page(self, request, response):
+        page = (response.content, response['Content-Type'])
+        cache.add(self._page_key(request), page, timeout=self.page_seconds)
+
+
+class ReplicaPinningMiddleware:
+    """
+    Give clients read-your-writes consistency when reads use replicas.
+
+    A request that writes orders or products (checkout, status updates, ...)
+    sets a short-lived cookie; while it is present the client's reads go to
+    the primary database so replication lag cannot hide the change.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cookie_name = getattr(settings, 'REPLICA_PIN_COOKIE', 'pin_primary')
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        reset_pinning(pinned=self.cookie_name in request.COOKIES)
+        response = self.get_response(request)
+        self._pin(response)
+        return response
+
+    async def __acall__(self, request):
+        reset_pinning(pinned=self.cookie_name in request.COOKIES)
+        response = await self.get_response(request)
+        self._pin(response)
+        return response
+
+    def _pin(self, response):
+        if has_written():
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=self.pin_seconds,
+                httponly=True,
+                samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+
+
+class ProfilingMiddleware:
+    """
+    Capture a cProfile of a single request on demand.
+
+    Admins trigger it with the ``X-Profile: 1`` header or ``?__profile=1``.
+    The profile covers everything below this middleware (view, ORM and
+    template rendering) and is saved via core.profiling; its file name is
+    returned in the X-Profile-File header. Requests without the trigger only
+    pay for a header and a query-string lookup, and stay async under ASGI;
+    there the profile covers the event loop thread, with sync code showing
+    up as the wait for its thread. Must come after AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+    HEADER = 'X-Profile'
+    QUERY_PARAM = '__profile'
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # cProfile allows one active profiler per process.
+        self.lock = threading.Lock()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._requested(request):
+            return self.get_response(request)
+        if not self._is_admin(request.user) or not self.lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profiler, started = self._start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            self._save(request, response, profiler, time.perf_counter() - started)
+        finally:
+            self.lock.release()
+        return response
+
+    async def __acall__(self, request):
+        if not self._requested(request):
+            return await self.get_response(request)
+        user = await request.auser()
+        if not await sync_to_async(self._is_admin)(user) or not self.lock.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            profiler, started = self._start()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+            await sync_to_async(self._save)(request, response, profiler, time.perf_counter() - started)
+        finally:
+            self.lock.release()
+        return response
+
+    def _requested(self, request):
+        return request.headers.get(self.HEADER) or request.GET.get(self.QUERY_PARAM)
+
+    def _start(self):
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        return profiler, started
+
+    def _save(self, request, response, profiler, elapsed):
+        response['X-Profile-File'] = profiling.save_profile(profiler, url_name(request), elapsed)
+
+    def _is_admin(self, user):
+        return user.is_authenticated and hasattr(user, 'profile') and user.profile.is_admin()
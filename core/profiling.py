@@ -0,0 +1,63 @@
+"""
+Storage for on-demand request profiles.
+
+Profiles are cProfile/pstats dumps named
+``<unix-ms>-<url name>-<duration ms>ms.prof`` inside PROFILING_DIR, so the
+listing needs nothing but the directory itself.
+"""
+import os
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+
+PROFILE_NAME = re.compile(r'^(?P<ts>\d+)-(?P<url_name>[\w.\-]+)-(?P<ms>\d+)ms\.prof$')
+
+
+def profiles_dir():
+    return Path(getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def save_profile(profiler, url_name, elapsed):
+    """Dump profiler stats to disk, prune old profiles and return the file name."""
+    directory = profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    safe_name = re.sub(r'[^\w.\-]', '.', url_name.replace(':', '.')) or 'unresolved'
+    name = f'{int(time.time() * 1000)}-{safe_name}-{int(elapsed * 1000)}ms.prof'
+    profiler.dump_stats(directory / name)
+    for old in list_profiles()[getattr(settings, 'PROFILING_KEEP', 50):]:
+        try:
+            os.remove(directory / old['name'])
+        except OSError:
+            pass
+    return name
+
+
+def list_profiles():
+    """Return saved profiles, newest first."""
+    directory = profiles_dir()
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for entry in os.scandir(directory):
+        match = PROFILE_NAME.match(entry.name)
+        if match:
+            profiles.append({
+                'name': entry.name,
+                'url_name': match['url_name'].replace('.', ':', 1),
+                'duration_ms': int(match['ms']),
+                'captured_at': datetime.fromtimestamp(int(match['ts']) / 1000, tz=timezone.utc),
+                'size': entry.stat().st_size,
+            })
+    profiles.sort(key=lambda p: p['captured_at'], reverse=True)
+    return profiles
+
+
+def profile_path(name):
+    """Return the path of a saved profile, or None for unknown/invalid names."""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = profiles_dir() / name
+    return path if path.is_file() else None
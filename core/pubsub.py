@@ -0,0 +1,182 @@
+"""
+Publish/subscribe fan-out for server-sent events.
+
+``publish(channel, message)`` may be called from any thread (sync views run
+in a thread pool under ASGI); ``subscribe(channel)`` is used from async code
+and returns a Subscription whose ``get()`` waits on an asyncio.Queue. An idle
+subscriber is one queue and one suspended coroutine: nothing polls.
+
+PUBSUB_BACKEND picks the transport:
+
+* ``core.pubsub.LocalBackend`` (default) delivers within this process, which
+  is enough for a single ASGI worker.
+* ``core.pubsub.PostgresBackend`` sends messages with ``pg_notify`` and keeps
+  one LISTEN connection per process that feeds the local fan-out, so an
+  update handled by one worker reaches subscribers in every worker.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Messages are state updates, so a slow subscriber only needs the latest few.
+QUEUE_SIZE = 8
+
+
+class Subscription:
+    """One subscriber's queue, bound to the event loop it was created on."""
+    __slots__ = ('channel', '_backend', '_loop', '_queue')
+
+    def __init__(self, backend, channel):
+        self.channel = channel
+        self._backend = backend
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(QUEUE_SIZE)
+
+    def put(self, message):
+        """Queue a message from any thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The subscriber's loop has closed; close() will drop us.
+            pass
+
+    def _put(self, message):
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Wait for the next message; raises TimeoutError after ``timeout`` seconds."""
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    def close(self):
+        self._backend.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LocalBackend:
+    """Fan-out to the subscribers of this process."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        """Hand ``message`` to every local subscriber of ``channel``."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+
+
+class PostgresBackend(LocalBackend):
+    """
+    Cross-process delivery through PostgreSQL LISTEN/NOTIFY.
+
+    Notifications are sent on the request's database connection, so they are
+    delivered when its transaction commits. Each process listens on one
+    connection (psycopg 3, opened on first subscribe) and fans out locally.
+    Payloads must stay under PostgreSQL's 8000-byte NOTIFY limit.
+    """
+    pg_channel = 'pizzashop_events'
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, channel, message):
+        from django.db import connection
+
+        payload = json.dumps({'channel': channel, 'message': message}, default=str)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.pg_channel, payload])
+
+    def subscribe(self, channel):
+        subscription = super().subscribe(channel)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return subscription
+
+    def _conninfo(self):
+        from django.db import connections
+        from psycopg.conninfo import make_conninfo
+
+        db = connections['default'].settings_dict
+        return make_conninfo(
+            dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'],
+            host=db['HOST'], port=db['PORT'],
+        )
+
+    async def _listen(self):
+        import psycopg
+
+        delay = 1
+        while self.subscriber_count():
+            try:
+                async with await psycopg.AsyncConnection.connect(self._conninfo(), autocommit=True) as conn:
+                    await conn.execute(f'LISTEN {self.pg_channel}')
+                    delay = 1
+                    async for notify in conn.notifies():
+                        data = json.loads(notify.payload)
+                        self.deliver(data['channel'], data['message'])
+            except (OSError, psycopg.Error):
+                logger.warning('Pub/sub LISTEN connection lost; retrying in %ss', delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(getattr(settings, 'PUBSUB_BACKEND', 'core.pubsub.LocalBackend'))()
+    return _backend
+
+
+def publish(channel, message):
+    get_backend().publish(channel, message)
+
+
+def subscribe(channel):
+    """Subscribe from async code; use as a context manager so it is always closed."""
+    return get_backend().subscribe(channel)
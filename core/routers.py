@@ -0,0 +1,67 @@
+"""
+Database router sending catalog and order-history reads to read replicas.
+
+Writes always go to the primary (``default``). Once a request writes to a
+routed app, the rest of that request and the same client's next requests
+(see ReplicaPinningMiddleware) read from the primary, so a customer sees
+their new order right after checkout.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY_DB = 'default'
+
+# True when reads in the current request must use the primary.
+_pinned = ContextVar('replica_pinned', default=False)
+# True once the current request has written to a routed app.
+_wrote = ContextVar('replica_wrote', default=False)
+
+
+def pin_to_primary():
+    """Send all further reads in this request/task to the primary."""
+    _pinned.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+def has_written():
+    return _wrote.get()
+
+
+def reset_pinning(pinned=False):
+    """Start a new request with the given pinning state."""
+    _pinned.set(pinned)
+    _wrote.set(False)
+
+
+class ReplicaRouter:
+    """Route reads of REPLICA_ROUTED_APPS to DATABASE_REPLICAS."""
+
+    def _is_routed(self, model):
+        return model._meta.app_label in getattr(settings, 'REPLICA_ROUTED_APPS', [])
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or not self._is_routed(model) or _pinned.get():
+            return PRIMARY_DB
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if self._is_routed(model):
+            _wrote.set(True)
+            _pinned.set(True)
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY_DB, *getattr(settings, 'DATABASE_REPLICAS', [])}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive schema changes through replication.
+        return db == PRIMARY_DB
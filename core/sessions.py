@@ -0,0 +1,73 @@
+"""
+Low-write session engine.
+
+Cached, database-backed sessions that only hit the database when the session
+content actually changed. Enable with ``SESSION_ENGINE = 'core.sessions'``.
+"""
+import hashlib
+import time
+
+from django.contrib.sessions.backends.cached_db import \
+    SessionStore as CachedDBStore
+
+
+class SessionStore(CachedDBStore):
+    """
+    Cached DB session store that skips writes for unchanged session data.
+
+    Views such as ``update_cart`` mark the session as modified even when the
+    cart ends up identical, which would otherwise rewrite the
+    ``django_session`` row on every request.
+
+    Skipped writes would also stop the expiry from sliding, so the time of
+    each write is kept in the session and an unchanged session is written
+    again once half of its expiry age has passed since then.
+    """
+    WRITTEN_AT_KEY = '_session_written_at'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._loaded_digest = None
+
+    def _digest(self, data):
+        """Return a stable fingerprint of the session data."""
+        return hashlib.sha1(self.serializer().dumps(data), usedforsecurity=False).hexdigest()
+
+    def load(self):
+        data = super().load()
+        self._loaded_digest = self._digest(data)
+        return data
+
+    async def aload(self):
+        data = await super().aload()
+        self._loaded_digest = self._digest(data)
+        return data
+
+    def _is_unchanged(self, must_create):
+        if must_create or self.session_key is None or self._loaded_digest is None:
+            return False
+        if self._digest(self._session) != self._loaded_digest:
+            return False
+        written_at = self._session.get(self.WRITTEN_AT_KEY)
+        return written_at is not None and time.time() - written_at < self.get_expiry_age() / 2
+
+    def _stamp(self):
+        self._session[self.WRITTEN_AT_KEY] = int(time.time())
+
+    def save(self, must_create=False):
+        if self._is_unchanged(must_create):
+            return
+        self._stamp()
+        super().save(must_create)
+        self._loaded_digest = self._digest(self._session)
+
+    async def asave(self, must_create=False):
+        if self._is_unchanged(must_create):
+            return
+        self._stamp()
+        await super().asave(must_create)
+        self._loaded_digest = self._digest(self._session)
+
+    def clear(self):
+        super().clear()
+        self._loaded_digest = None
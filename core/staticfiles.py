@@ -0,0 +1,127 @@
+"""
+Hashed, precompressed static files served with far-future caching.
+
+``CompressedManifestStaticFilesStorage`` extends Django's manifest storage:
+``collectstatic`` writes content-hashed copies (``bootstrap.min.3a1b….css``)
+and then a ``.gz`` next to every compressible file. StaticFilesMiddleware
+serves STATIC_ROOT from an index built at startup, picks the ``.gz`` when the
+client accepts gzip and marks hashed names ``immutable`` for a year; their
+URL changes whenever their content does.
+"""
+import gzip
+import json
+import mimetypes
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.xml', '.html', '.map', '.ico', '.ttf', '.eot')
+# Below this size the gzip framing eats most of the savings.
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes a gzip copy of every compressible file."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                compressed = self._compress(name)
+                if compressed:
+                    yield name, compressed, True
+
+    def _compress(self, name):
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return None
+        # mtime=0 keeps the output, and so deploy diffs, reproducible.
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) >= len(data) * 0.95:
+            return None
+        gz_name = f'{name}.gz'
+        if self.exists(gz_name):
+            self.delete(gz_name)
+        self._save(gz_name, ContentFile(compressed))
+        return gz_name
+
+
+class StaticFile:
+    """One servable file and the headers that describe it."""
+    __slots__ = ('path', 'content_type', 'size', 'etag', 'last_modified', 'immutable', 'gzip_path', 'gzip_size')
+
+    def __init__(self, path, content_type, size, etag, last_modified, immutable, gzip_path=None, gzip_size=0):
+        self.path = path
+        self.content_type = content_type
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.immutable = immutable
+        self.gzip_path = gzip_path
+        self.gzip_size = gzip_size
+
+
+def build_index(root, url_prefix):
+    """Map request paths to the files under ``root`` (the collectstatic output)."""
+    if not root or not os.path.isdir(root):
+        return {}
+    hashed = set()
+    manifest_path = os.path.join(root, ManifestStaticFilesStorage.manifest_name)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            hashed = set(json.load(f).get('paths', {}).values())
+
+    index = {}
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            if filename.endswith('.gz'):
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            stat = os.stat(path)
+            gzip_path = f'{path}.gz'
+            has_gzip = os.path.exists(gzip_path)
+            index[url_prefix + name] = StaticFile(
+                path=path,
+                content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                size=stat.st_size,
+                etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+                last_modified=http_date(stat.st_mtime),
+                immutable=name in hashed,
+                gzip_path=gzip_path if has_gzip else None,
+                gzip_size=os.path.getsize(gzip_path) if has_gzip else 0,
+            )
+    return index
+
+
+def serve(request, static_file):
+    """Respond with the file, or its gzip copy, and the caching headers."""
+    use_gzip = static_file.gzip_path is not None and 'gzip' in request.headers.get('Accept-Encoding', '')
+    # Each encoding is a different representation and needs its own ETag.
+    etag = f'{static_file.etag[:-1]}-gz"' if use_gzip else static_file.etag
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        path = static_file.gzip_path if use_gzip else static_file.path
+        response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+        del response['Content-Disposition']
+        response['Content-Length'] = static_file.gzip_size if use_gzip else static_file.size
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    response['Last-Modified'] = static_file.last_modified
+    if static_file.gzip_path:
+        response['Vary'] = 'Accept-Encoding'
+    if static_file.immutable:
+        response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = 'public, no-cache'
+    return response
@@ -8,5 +8,11 @@ app_name = 'core'
 
 urlpatterns = [
     path('', views.home_view, name='home'),
+    path('async/', views.home_view_async, name='home_async'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('ready/', views.ready_view, name='ready'),
+    path('memory/', views.memory_report, name='memory_report'),
+    path('profiles/', views.profile_list, name='profile_list'),
+    path('profiles/<str:name>/', views.profile_download, name='profile_download'),
 ]
 
@@ -1,8 +1,15 @@
 """
 Views for core app - homepage and common views.
 """
-from django.shortcuts import render
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.shortcuts import redirect, render
+from django.utils.crypto import constant_time_compare
+from accounts.models import ais_admin
 from products.models import Product, Category
+from . import memory, metrics, profiling, warmup
 
 
 def is_admin(user):
@@ -25,3 +32,66 @@ def home_view(request):
         'is_admin': is_admin(request.user),
     })
 
+
+
+async def home_view_async(request):
+    """Homepage view using the async ORM (for ASGI deployments)."""
+    user = await request.auser()
+    admin = await ais_admin(user)
+    if admin:
+        products = Product.objects.all()
+    else:
+        products = Product.objects.filter(is_available=True)
+    featured_products = [product async for product in products[:6]]
+    categories = [category async for category in Category.objects.all()[:4]]
+    
+    return await sync_to_async(render)(request, 'core/home.html', {
+        'featured_products': featured_products,
+        'categories': categories,
+        'is_admin': admin,
+    })
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, aggregated across worker processes."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def ready_view(request):
+    """Readiness probe: 503 until this worker finished warming up."""
+    status = warmup.status()
+    return JsonResponse(status, status=200 if status['ready'] else 503)
+
+
+@login_required
+@user_passes_test(is_admin)
+def profile_list(request):
+    """Recent on-demand request profiles (admin only)."""
+    return render(request, 'core/profile_list.html', {
+        'profiles': profiling.list_profiles(),
+        'profiling_enabled': getattr(settings, 'PROFILING_ENABLED', False),
+    })
+
+
+@login_required
+@user_passes_test(is_admin)
+def profile_download(request, name):
+    """Download a saved profile (admin only)."""
+    path = profiling.profile_path(name)
+    if path is None:
+        raise Http404('Profile not found.')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name,
+                        content_type='application/octet-stream')
+
+
+@login_required
+@user_passes_test(is_admin)
+def memory_report(request):
+    """This worker's memory peaks per URL and growth by allocation site (admin only)."""
+    if request.method == 'POST':
+        memory.take_snapshot('on-demand')
+        return redirect('core:memory_report')
+    return render(request, 'core/memory_report.html', {'report': memory.report()})
@@ -0,0 +1,126 @@
+"""
+Warm a process up before it serves traffic.
+
+The first request of a fresh worker otherwise pays for populating the URL
+resolvers and compiling their regexes, compiling templates and the first
+database queries. ``warm_up()`` does all of that ahead of time. It runs when
+pizzashop.wsgi is imported, which with gunicorn's preload_app (see
+gunicorn.conf.py) happens once in the master before it forks, so the workers
+share the warmed memory copy-on-write. No cache is filled: the views read
+the database directly. The readiness endpoint reports 503 until warm-up has
+finished, and names the steps that failed but not why (that goes to the log).
+"""
+import gc
+import logging
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.template import TemplateSyntaxError, engines
+from django.urls import URLResolver, get_resolver
+
+logger = logging.getLogger('pizzashop.warmup')
+
+_state = {'ready': False, 'pid': None, 'duration_ms': None, 'steps': {}, 'errors': [], 'failing': []}
+
+
+def _walk(resolver):
+    """Compile every pattern's regex and populate every resolver's reverse maps."""
+    count = 0
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        count += 1
+        if isinstance(pattern, URLResolver):
+            count += _walk(pattern)
+    return count
+
+
+def warm_urls():
+    return _walk(get_resolver())
+
+
+def warm_templates():
+    """Load (and, with the cached loader, keep) every template in the engines' DIRS."""
+    count = 0
+    for engine in engines.all():
+        for directory in getattr(engine, 'dirs', []):
+            root = Path(directory)
+            for path in sorted(root.rglob('*.html')):
+                name = path.relative_to(root).as_posix()
+                try:
+                    engine.get_template(name)
+                except TemplateSyntaxError as e:
+                    _state['errors'].append(f'{name}: {e}')
+                    if 'templates' not in _state['failing']:
+                        _state['failing'].append('templates')
+                    logger.warning('Template %s failed to compile during warm-up: %s', name, e)
+                count += 1
+    return count
+
+
+def warm_queries():
+    """
+    Run the first catalog queries so the ORM, the database backend and the
+    query compiler are imported and initialised. The rows are discarded.
+    """
+    from products.models import Category, Product
+    categories = list(Category.objects.all()[:4])
+    products = list(Product.objects.filter(is_available=True).select_related('category')[:6])
+    return len(categories) + len(products)
+
+
+STEPS = (('urls', warm_urls), ('templates', warm_templates), ('queries', warm_queries))
+
+
+def warm_up(force=False):
+    """
+    Run the warm-up steps once per process and mark it ready.
+
+    Database connections are closed afterwards so a forking master never
+    hands its socket to the workers.
+    """
+    if _state['ready'] and not force:
+        return _state
+    if not getattr(settings, 'WARMUP_ENABLED', True):
+        _state['ready'] = True
+        return _state
+    started = time.perf_counter()
+    _state['errors'] = []
+    _state['failing'] = []
+    for name, step in STEPS:
+        step_started = time.perf_counter()
+        try:
+            count = step()
+        except DatabaseError as e:
+            # An unmigrated database must not keep the process from starting.
+            _state['errors'].append(f'{name}: {e}')
+            _state['failing'].append(name)
+            logger.warning('Warm-up step %s failed: %s', name, e)
+            count = 0
+        _state['steps'][name] = {
+            'count': count,
+            'duration_ms': round((time.perf_counter() - step_started) * 1000, 2),
+        }
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
+    if getattr(settings, 'WARMUP_GC_FREEZE', True):
+        # Keep the warmed objects out of the collector so the workers' GC
+        # passes do not write to (and un-share) the pages they live on.
+        gc.collect()
+        gc.freeze()
+    _state.update(ready=True, pid=os.getpid(), duration_ms=round((time.perf_counter() - started) * 1000, 2))
+    logger.info('Warm-up finished in %sms: %s', _state['duration_ms'], _state['steps'])
+    return _state
+
+
+def status():
+    """
+    Readiness for the unauthenticated probe: ``ready`` is True once warm-up
+    ran (or is disabled), ``failing`` names the steps that failed.
+    """
+    ready = _state['ready'] or not getattr(settings, 'WARMUP_ENABLED', True)
+    return {'ready': ready, 'failing': list(_state['failing'])}
@@ -0,0 +1,31 @@
+"""
+Gunicorn settings:
+
+    gunicorn -c gunicorn.conf.py pizzashop.wsgi
+
+preload_app imports pizzashop.wsgi, and with it core.warmup, once in the
+master; the workers are forked from the warmed process. It also creates
+core.loadshed's shared in-flight counts, so every worker sees how many of
+them are busy; a sync worker serves one request at a time, so load shedding
+measures pressure against the number of workers.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+# Read by pizzashop.settings, which is imported after this file.
+os.environ.setdefault('LOAD_SHEDDING_MAX_IN_FLIGHT', str(workers))
+
+
+def post_fork(server, worker):
+    # Warm-up closes its connections, but never share a socket across fork.
+    from django.db import connections
+    connections.close_all()
+
+
+def child_exit(server, worker):
+    # A worker killed mid-request (e.g. on timeout) never releases its requests.
+    from core import loadshed
+    loadshed.tracker.forget(worker.pid)
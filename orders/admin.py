@@ -1,8 +1,11 @@
 """
 Admin configuration for orders app.
 """
-from django.contrib import admin
-from .models import Order, OrderItem
+from django import forms
+from django.contrib import admin, messages
+from core.admin import LargeTableAdmin
+from . import kitchen, rollups, transitions
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
 
 
 class OrderItemInline(admin.TabularInline):
@@ -19,13 +22,47 @@ class OrderItemInline(admin.TabularInline):
     get_total.short_description = 'Total'
 
 
+class OrderAdminForm(forms.ModelForm):
+    """Order form that only allows status changes the state machine permits."""
+    
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        old_status = self.initial.get('status')
+        if self.instance.pk and old_status != status and not transitions.can_transition(old_status, status):
+            raise forms.ValidationError(f'An order cannot go from {old_status} to {status}.')
+        return status
+
+
+def _transition_action(status):
+    def action(modeladmin, request, queryset):
+        results = transitions.apply(dict.fromkeys(queryset.values_list('pk', flat=True), status))
+        outcomes = [outcome for outcome, _ in results.values()]
+        updated = outcomes.count(transitions.UPDATED)
+        modeladmin.message_user(request, f'{updated} order(s) marked {status}.', messages.SUCCESS)
+        invalid = sorted(order_id for order_id, (outcome, _) in results.items() if outcome == transitions.INVALID)
+        if invalid:
+            modeladmin.message_user(
+                request,
+                f"Skipped {len(invalid)} order(s) that cannot become {status}: "
+                + ', '.join(f'#{order_id}' for order_id in invalid),
+                messages.WARNING,
+            )
+    action.__name__ = f'mark_{status}'
+    action.short_description = f'Mark selected orders as {status}'
+    return action
+
+
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     """Admin interface for Order model."""
     list_display = ['id', 'customer', 'status', 'total_price', 'created_at']
     list_filter = ['status', 'created_at']
-    search_fields = ['customer__username', 'id']
+    list_select_related = ['customer']
+    # Order number exactly, or the start of the customer's username.
+    search_fields = ['=id', '^customer__username']
     list_editable = ['status']
+    form = OrderAdminForm
+    actions = [_transition_action(status) for status in ('paid', 'delivered', 'cancelled')]
     inlines = [OrderItemInline]
     readonly_fields = ['created_at', 'updated_at']
     
@@ -38,17 +75,68 @@ class OrderAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('form', OrderAdminForm)
+        return super().get_changelist_form(request, **kwargs)
+    
+    def save_model(self, request, obj, form, change):
+        """Keep the sales rollups and stock in step with status edits made here."""
+        if change and 'status' in form.changed_data:
+            rollups.record_transition(obj, form.initial['status'], obj.status)
+            if obj.status == 'cancelled':
+                transitions.release_stock([obj.pk])
+            transitions.announce(obj.pk, obj.status)
+        elif not change:
+            kitchen.changed()
+        super().save_model(request, obj, form, change)
+    
+    def save_related(self, request, form, formsets, change):
+        """Count an order added here once its inline items are saved, as checkout does."""
+        super().save_related(request, form, formsets, change)
+        if not change:
+            rollups.record_order(form.instance)
 
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(LargeTableAdmin):
     """Admin interface for OrderItem model."""
     list_display = ['id', 'order', 'product', 'quantity', 'price', 'get_total']
     list_filter = ['order__status', 'order__created_at']
-    search_fields = ['order__id', 'product__name']
+    # str(order) shows the customer's username.
+    list_select_related = ['order__customer', 'product']
+    search_fields = ['=order', '^product__name']
     
     def get_total(self, obj):
         """Display total for order item."""
         return obj.get_total()
     get_total.short_description = 'Total'
 
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    """Read-only inline for ArchivedOrderItem."""
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ['product', 'quantity', 'price']
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(LargeTableAdmin):
+    """Read-only admin for archived orders."""
+    list_display = ['id', 'customer', 'status', 'total_price', 'created_at', 'archived_at']
+    list_filter = ['status']
+    search_fields = ['=id', '^customer__username']
+    list_select_related = ['customer']
+    inlines = [ArchivedOrderItemInline]
+    readonly_fields = ['id', 'customer', 'status', 'total_price', 'created_at', 'updated_at', 'archived_at']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
@@ -0,0 +1,118 @@
+"""
+Archival of finished orders.
+
+Delivered and cancelled orders that have not changed for ORDER_ARCHIVE_DAYS
+are moved, a batch per transaction, from Order/OrderItem into
+ArchivedOrder/ArchivedOrderItem under their original ids. The hot tables that
+checkout, the kitchen and the admin list work on then only hold recent and
+open orders, while order pages fall back to the archive when an id is not
+found in the hot table.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, ExpressionWrapper,
+                              Prefetch, Q)
+from django.utils import timezone
+
+from accounts.models import UserProfile
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+ARCHIVE_STATUSES = ('delivered', 'cancelled')
+
+
+def cutoff(days=None):
+    """Orders last updated before this moment are eligible."""
+    if days is None:
+        days = getattr(settings, 'ORDER_ARCHIVE_DAYS', 180)
+    return timezone.now() - timedelta(days=days)
+
+
+def eligible(before):
+    """Finished orders last updated before ``before``."""
+    orders = Order.objects.filter(status__in=ARCHIVE_STATUSES, updated_at__lt=before)
+    # Sequence resets (loaddata, sqlsequencereset, seed_pizzashop) restart
+    # at max(id) + 1 of the Order table alone; keeping its newest row there
+    # keeps that above every archived id, so no new order reuses one.
+    newest = Order.objects.order_by('-pk').values_list('pk', flat=True).first()
+    return orders.exclude(pk=newest) if newest else orders
+
+
+def archive_batch(before, batch_size=500):
+    """Move up to ``batch_size`` eligible orders in one transaction; return how many moved."""
+    with transaction.atomic():
+        orders = list(
+            eligible(before).select_for_update().order_by('pk')
+            .values('id', 'customer_id', 'created_at', 'updated_at', 'status', 'total_price')[:batch_size]
+        )
+        if not orders:
+            return 0
+        ids = [order['id'] for order in orders]
+        ArchivedOrder.objects.bulk_create(ArchivedOrder(**order) for order in orders)
+        ArchivedOrderItem.objects.bulk_create(
+            ArchivedOrderItem(**item)
+            for item in OrderItem.objects.filter(order_id__in=ids).values('order_id', 'product_id', 'quantity', 'price')
+        )
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def archive_orders(before, batch_size=500, pause=0, max_batches=0):
+    """Archive in batches until nothing is eligible; return (orders moved, batches)."""
+    moved = batches = 0
+    while not max_batches or batches < max_batches:
+        count = archive_batch(before, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+        if count < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return moved, batches
+
+
+def _detail(model, item_model, order_id, viewer):
+    """
+    The order page's query: the order with its customer, then its items with
+    their products, i.e. two queries however many lines it has. With a
+    ``viewer`` each order carries ``viewer_allowed``, whether they own it or
+    are an admin, computed in the same query.
+    """
+    items = item_model.objects.select_related('product')
+    orders = model.objects.select_related('customer').prefetch_related(Prefetch('items', queryset=items))
+    if viewer is not None:
+        is_admin = Exists(UserProfile.objects.filter(user_id=viewer.pk, role='admin'))
+        orders = orders.annotate(viewer_allowed=ExpressionWrapper(
+            Q(customer_id=viewer.pk) | Q(is_admin), output_field=BooleanField(),
+        ))
+    return orders.filter(pk=order_id)
+
+
+def get_order(order_id, viewer=None):
+    """
+    The order with this id from the hot table or, failing that, the archive;
+    None if neither. See _detail() for ``viewer``.
+    """
+    order = _detail(Order, OrderItem, order_id, viewer).first()
+    if order is None:
+        order = _detail(ArchivedOrder, ArchivedOrderItem, order_id, viewer).first()
+    return order
+
+
+async def aget_order(order_id, viewer=None):
+    """Async variant of get_order() for the ASGI views."""
+    order = await _detail(Order, OrderItem, order_id, viewer).afirst()
+    if order is None:
+        order = await _detail(ArchivedOrder, ArchivedOrderItem, order_id, viewer).afirst()
+    return order
+
+
+def archived_orders(customer_id):
+    """A customer's archived orders, newest first, with their items."""
+    return ArchivedOrder.objects.filter(customer_id=customer_id).prefetch_related('items')
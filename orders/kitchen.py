@@ -0,0 +1,147 @@
+"""
+The kitchen queue: orders still to be made, fetched incrementally.
+
+The kitchen screen loads the queue once and from then on asks only for
+orders created or changed after a cursor, the (updated_at, id) of the last
+change it has seen. ``changes`` is one query over the (status, updated_at)
+index on Order, so a screen that polls every second with nothing new costs
+one index probe per status. Under ASGI the feed long-polls: it waits on the
+CHANNEL pub/sub message sent when an order is placed or changes status.
+
+updated_at is stamped before the writing transaction commits, so a slow
+transaction can land behind a cursor already handed out. A cursor's position
+is therefore never later than KITCHEN_LOOKBACK_SECONDS ago, and the cursor
+also lists the versions (id and updated_at) of the changes after that
+position it has already delivered. Those are re-read but not returned, so a
+late commit in the window still comes back while a poll with nothing unseen
+is empty and, under ASGI, keeps waiting.
+"""
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from core import pubsub
+
+from .models import Order, OrderItem
+
+# Orders the kitchen still has to make; the rest leave the screen.
+QUEUE_STATUSES = ('pending', 'paid')
+# Every status, so the feed's filter can use the (status, updated_at) index.
+ALL_STATUSES = tuple(value for value, _ in Order.STATUS_CHOICES)
+CHANNEL = 'kitchen'
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class CursorError(ValueError):
+    """A ``since`` cursor that was not issued by this module."""
+
+
+def _microseconds(stamp):
+    return (stamp - EPOCH) // timedelta(microseconds=1)
+
+
+def encode_cursor(updated_at, order_id, seen=()):
+    """
+    ``<microseconds>-<id>``, then ``_<id>.<offset>`` per delivered version,
+    its updated_at as microseconds after the position.
+    """
+    microseconds = _microseconds(updated_at)
+    parts = [f'{microseconds}-{order_id}']
+    parts.extend(f'{pk}.{version - microseconds}' for pk, version in sorted(seen))
+    return '_'.join(parts)
+
+
+def parse_cursor(value):
+    """(updated_at, id, seen versions) from ``encode_cursor`` output; raises CursorError."""
+    position, *versions = value.split('_')
+    try:
+        microseconds, order_id = (int(part) for part in position.split('-'))
+        seen = frozenset(
+            (pk, microseconds + offset)
+            for pk, offset in ((int(part) for part in version.split('.')) for version in versions)
+        )
+    except ValueError:
+        raise CursorError(f'Invalid cursor: {value!r}.') from None
+    return EPOCH + timedelta(microseconds=microseconds), order_id, seen
+
+
+def _orders():
+    items = OrderItem.objects.select_related('product').only('order_id', 'quantity', 'product__name')
+    return (
+        Order.objects.select_related('customer')
+        .only('id', 'status', 'created_at', 'updated_at', 'customer__username')
+        .prefetch_related(Prefetch('items', queryset=items))
+    )
+
+
+def latest_cursor(limit=100):
+    """
+    Cursor of the most recent change, or None when there are no orders; read
+    it before the queue, so changes after it cannot be counted as delivered.
+    """
+    newest = list(
+        Order.objects.filter(status__in=ALL_STATUSES)
+        .order_by('-updated_at', '-pk').values_list('updated_at', 'pk')[:limit]
+    )
+    if not newest:
+        return None
+    position = _held_back(newest[0])
+    recent = [row for row in newest if row > position]
+    if len(recent) == limit:
+        # A burst fills the window: start from the oldest of it, as changes() would.
+        position = recent.pop()
+    return encode_cursor(*position, [(pk, _microseconds(updated_at)) for updated_at, pk in recent])
+
+
+def queue():
+    """Orders waiting for the kitchen, oldest first."""
+    return list(_orders().filter(status__in=QUEUE_STATUSES).order_by('created_at', 'pk'))
+
+
+def changes(cursor, limit=100):
+    """
+    Orders created or changed after ``cursor`` that it has not delivered yet,
+    oldest change first, and the cursor to ask with next time. Reads at most
+    ``limit`` orders, delivered ones included.
+    """
+    updated_at, order_id, seen = cursor
+    orders = list(
+        _orders().filter(status__in=ALL_STATUSES)
+        .filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=order_id))
+        .order_by('updated_at', 'pk')[:limit]
+    )
+    fresh = [order for order in orders if (order.pk, _microseconds(order.updated_at)) not in seen]
+    position = (updated_at, order_id)
+    if orders:
+        last = (orders[-1].updated_at, orders[-1].pk)
+        # A full page moves on regardless, so a burst cannot stall the feed.
+        position = last if len(orders) == limit else max(position, _held_back(last))
+    seen = [(order.pk, _microseconds(order.updated_at)) for order in orders if (order.updated_at, order.pk) > position]
+    return fresh, encode_cursor(*position, seen)
+
+
+def _held_back(position):
+    """``position``, but no later than KITCHEN_LOOKBACK_SECONDS ago."""
+    lookback = timedelta(seconds=getattr(settings, 'KITCHEN_LOOKBACK_SECONDS', 5))
+    return min(position, (timezone.now() - lookback, 0))
+
+
+def as_dict(order):
+    return {
+        'id': order.pk,
+        'status': order.status,
+        'status_display': order.get_status_display(),
+        'queued': order.status in QUEUE_STATUSES,
+        'customer': order.customer.username,
+        'created_at': order.created_at.isoformat(),
+        'items': [{'name': item.product.name, 'quantity': item.quantity} for item in order.items.all()],
+    }
+
+
+def changed():
+    """Wake long-polling kitchen screens once the current transaction commits."""
+    transaction.on_commit(lambda: pubsub.publish(CHANNEL, {}))
@@ -0,0 +1,39 @@
+"""
+Move finished orders older than the cutoff into the archive tables.
+
+Each batch is copied and deleted in its own short transaction, with a pause
+in between, so checkout never waits behind a long lock. Run it from cron.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import archive
+
+
+class Command(BaseCommand):
+    help = 'Archive delivered and cancelled orders in small batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive orders unchanged for this many days (default: ORDER_ARCHIVE_DAYS).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Orders moved per transaction (default: 500).')
+        parser.add_argument('--sleep', type=float, default=0.1,
+                            help='Seconds to pause between batches (default: 0.1).')
+        parser.add_argument('--max-batches', type=int, default=0,
+                            help='Stop after this many batches (default: 0, no limit).')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days cannot be negative.')
+
+        moved, batches = archive.archive_orders(
+            archive.cutoff(options['days']),
+            batch_size=options['batch_size'],
+            pause=options['sleep'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} orders in {batches} batches.'
+        ))
@@ -0,0 +1,38 @@
+"""
+Write orders and their line items as CSV, streamed from a server-side cursor.
+
+    python manage.py export_orders --start 2026-09-01 --end 2026-09-30 -o september.csv
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import export
+
+
+class Command(BaseCommand):
+    help = 'Export orders and line items as CSV without loading them into memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', metavar='YYYY-MM-DD', help='First day to include (local time).')
+        parser.add_argument('--end', metavar='YYYY-MM-DD', help='Last day to include (local time).')
+        parser.add_argument('--status', help='Comma-separated statuses to include (default: all).')
+        parser.add_argument('-o', '--output', help='File to write (default: standard output).')
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE,
+                            help=f'Rows fetched per cursor round trip (default: {export.DEFAULT_CHUNK_SIZE}).')
+
+    def handle(self, *args, **options):
+        try:
+            filters = export.parse_filters(options['start'], options['end'], options['status'])
+        except export.ExportFilterError as exc:
+            raise CommandError(str(exc))
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        output = options['output']
+        if not output:
+            for chunk in export.csv_chunks(chunk_size=options['chunk_size'], **filters):
+                self.stdout.write(chunk, ending='')
+            return
+        with open(output, 'w', newline='', encoding='utf-8') as out:
+            for chunk in export.csv_chunks(chunk_size=options['chunk_size'], **filters):
+                out.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'Exported orders to {output}.'))
@@ -22,8 +22,14 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     
+    is_archived = False
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # The kitchen feed: orders changed since a cursor (orders.kitchen).
+            models.Index(fields=['status', 'updated_at'], name='order_status_updated_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.customer.username} - {self.status}"
@@ -53,3 +59,82 @@ class OrderItem(models.Model):
         """Calculate total price for this item."""
         return self.quantity * self.price
 
+
+class DailyProductSales(models.Model):
+    """
+    Units and revenue per day and product, excluding cancelled orders.
+
+    Maintained by orders.rollups as orders are placed and change status;
+    rebuilt from scratch with ``manage.py rebuild_sales_rollups``.
+    """
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    # The product's category when sold, so recategorising keeps history intact.
+    category = models.ForeignKey('products.Category', on_delete=models.SET_NULL, null=True, related_name='daily_sales')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name_plural = 'Daily product sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='daily_product_sales_day_product'),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} - {self.product_id}: {self.units} units"
+
+
+class HourlyStatusSales(models.Model):
+    """Order count and order value per hour placed and current status."""
+    hour = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name_plural = 'Hourly status sales'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'status'], name='hourly_status_sales_hour_status'),
+        ]
+    
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} - {self.status}: {self.orders} orders"
+
+
+class ArchivedOrder(models.Model):
+    """
+    A delivered or cancelled order moved out of the hot Order table.
+
+    Keeps the original id so order URLs stay valid; see orders.archive.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    is_archived = True
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['customer', '-created_at'], name='archived_order_customer')]
+    
+    def __str__(self):
+        return f"Archived order #{self.id} - {self.customer.username} - {self.status}"
+
+
+class ArchivedOrderItem(models.Model):
+    """A line item of an ArchivedOrder."""
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    def __str__(self):
+        return f"{self.quantity}x {self.product.name} - Archived order #{self.order_id}"
+    
+    def get_total(self):
+        """Calculate total price for this item."""
+        return self.quantity * self.price
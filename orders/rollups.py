@@ -0,0 +1,209 @@
+"""
+Incremental maintenance of the sales rollup tables.
+
+DailyProductSales holds units and revenue per local day and product for
+orders that are not cancelled; HourlyStatusSales holds order count and value
+per hour placed and current status. Checkout calls ``record_order`` and
+status changes call ``record_transition``, so the dashboard never aggregates
+Order/OrderItem. Updates are ``UPDATE ... SET n = n + delta`` statements, so
+concurrent checkouts never lose increments.
+"""
+from collections import defaultdict
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import (ArchivedOrder, ArchivedOrderItem, DailyProductSales,
+                     HourlyStatusSales, Order, OrderItem)
+
+# Orders in these statuses do not count as sales.
+EXCLUDED_STATUSES = frozenset({'cancelled'})
+
+
+def order_day(created_at):
+    return timezone.localdate(created_at)
+
+
+def day_start(day):
+    """The aware datetime at which the local ``day`` begins."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def order_hour(created_at):
+    return timezone.localtime(created_at).replace(minute=0, second=0, microsecond=0)
+
+
+def _add(model, fixed, key, deltas, defaults=None):
+    """
+    Add ``deltas[k]`` (field -> amount) to the row ``model(**fixed, key=k)`` for every ``k``.
+
+    Missing rows are inserted at zero first (conflicts ignored, so concurrent
+    requests can race safely), then a single UPDATE adds every delta with a
+    CASE on ``key``: two statements however many buckets an order touches.
+    """
+    defaults = defaults or {}
+    model.objects.bulk_create(
+        [model(**fixed, **{key: k}, **defaults.get(k, {})) for k in deltas],
+        ignore_conflicts=True,
+    )
+    fields = {name for amounts in deltas.values() for name in amounts}
+    model.objects.filter(**fixed, **{f'{key}__in': list(deltas)}).update(**{
+        name: F(name) + Case(
+            *[When(**{key: k}, then=Value(amounts.get(name, 0))) for k, amounts in deltas.items()],
+            default=Value(0),
+            output_field=model._meta.get_field(name),
+        )
+        for name in fields
+    })
+
+
+def _apply_items(day, items, sign):
+    """Add (or with ``sign=-1`` remove) (product id, category id, quantity, price) rows."""
+    deltas = {}
+    categories = {}
+    for product_id, category_id, quantity, price in items:
+        amounts = deltas.setdefault(product_id, {'units': 0, 'revenue': Decimal('0.00')})
+        amounts['units'] += sign * quantity
+        amounts['revenue'] += sign * quantity * price
+        categories[product_id] = {'category_id': category_id}
+    if deltas:
+        _add(DailyProductSales, {'day': day}, 'product_id', deltas, categories)
+
+
+def _order_items(order):
+    return OrderItem.objects.filter(order=order).values_list(
+        'product_id', 'product__category_id', 'quantity', 'price',
+    )
+
+
+def record_order(order, items=None):
+    """
+    Count a newly placed order.
+
+    ``items`` are (product id, category id, quantity, price) tuples; they are
+    read from the database when omitted.
+    """
+    with transaction.atomic(savepoint=False):
+        _add(HourlyStatusSales, {'hour': order_hour(order.created_at)}, 'status', {
+            order.status: {'orders': 1, 'revenue': order.total_price},
+        })
+        if order.status not in EXCLUDED_STATUSES:
+            _apply_items(order_day(order.created_at), _order_items(order) if items is None else items, 1)
+
+
+def record_transition(order, old_status, new_status):
+    """Move an order between status buckets and (un)count its items on (un)cancellation."""
+    record_transitions([(order.pk, order.created_at, old_status, order.total_price)], new_status)
+
+
+def record_transitions(orders, new_status):
+    """
+    record_transition() for many orders moving to ``new_status`` at once.
+
+    ``orders`` are (pk, created_at, old status, total price) tuples; the
+    statements issued grow with the hours and days involved, not the orders.
+    """
+    hourly = defaultdict(dict)
+    recount = {-1: [], 1: []}
+    for pk, created_at, old_status, total_price in orders:
+        if old_status == new_status:
+            continue
+        buckets = hourly[order_hour(created_at)]
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            amounts = buckets.setdefault(status, {'orders': 0, 'revenue': Decimal('0.00')})
+            amounts['orders'] += sign
+            amounts['revenue'] += sign * total_price
+        was_counted = old_status not in EXCLUDED_STATUSES
+        if was_counted != (new_status not in EXCLUDED_STATUSES):
+            recount[-1 if was_counted else 1].append((pk, order_day(created_at)))
+
+    with transaction.atomic(savepoint=False):
+        for hour, deltas in hourly.items():
+            _add(HourlyStatusSales, {'hour': hour}, 'status', deltas)
+        for sign, changed in recount.items():
+            if not changed:
+                continue
+            days = dict(changed)
+            by_day = defaultdict(list)
+            items = OrderItem.objects.filter(order_id__in=list(days)).values_list(
+                'order_id', 'product_id', 'product__category_id', 'quantity', 'price',
+            )
+            for order_id, *item in items:
+                by_day[days[order_id]].append(item)
+            for day, day_items in by_day.items():
+                _apply_items(day, day_items, sign)
+
+
+def _order_chunks(orders, batch_size):
+    """Yield lists of (pk, created_at, status, total_price), walking the primary key."""
+    last_pk = 0
+    while True:
+        chunk = list(
+            orders.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'created_at', 'status', 'total_price')[:batch_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1][0]
+
+
+def rebuild(since=None, batch_size=1000):
+    """
+    Recompute the rollups from hot and archived orders, from ``since`` (a date) onwards.
+
+    Orders are read ``batch_size`` at a time so memory is bounded by the
+    number of buckets, not orders; the old rows are replaced in a single
+    transaction. Returns (daily rows, hourly rows) written.
+    """
+    start = day_start(since) if since is not None else None
+    daily = defaultdict(lambda: [None, 0, Decimal('0.00')])
+    hourly = defaultdict(lambda: [0, Decimal('0.00')])
+    # Archived orders keep counting towards the history they belong to.
+    for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        orders = order_model.objects.all()
+        if start is not None:
+            orders = orders.filter(created_at__gte=start)
+        for chunk in _order_chunks(orders, batch_size):
+            days = {}
+            for pk, created_at, status, total_price in chunk:
+                bucket = hourly[order_hour(created_at), status]
+                bucket[0] += 1
+                bucket[1] += total_price
+                if status not in EXCLUDED_STATUSES:
+                    days[pk] = order_day(created_at)
+            items = item_model.objects.filter(order_id__in=list(days)).values_list(
+                'order_id', 'product_id', 'product__category_id', 'quantity', 'price',
+            )
+            for order_id, product_id, category_id, quantity, price in items:
+                bucket = daily[days[order_id], product_id]
+                bucket[0] = category_id
+                bucket[1] += quantity
+                bucket[2] += quantity * price
+
+    with transaction.atomic():
+        daily_rows = DailyProductSales.objects.all()
+        hourly_rows = HourlyStatusSales.objects.all()
+        if since is not None:
+            daily_rows = daily_rows.filter(day__gte=since)
+            hourly_rows = hourly_rows.filter(hour__gte=start)
+        daily_rows.delete()
+        hourly_rows.delete()
+        DailyProductSales.objects.bulk_create(
+            (
+                DailyProductSales(day=day, product_id=product_id, category_id=category_id, units=units, revenue=revenue)
+                for (day, product_id), (category_id, units, revenue) in daily.items()
+            ),
+            batch_size=batch_size,
+        )
+        HourlyStatusSales.objects.bulk_create(
+            (
+                HourlyStatusSales(hour=hour, status=status, orders=count, revenue=revenue)
+                for (hour, status), (count, revenue) in hourly.items()
+            ),
+            batch_size=batch_size,
+        )
+    return len(daily), len(hourly)
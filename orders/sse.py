@@ -0,0 +1,101 @@
+"""
+Server-sent events with live order status.
+
+A stream sends the order's current status, then every change published by
+orders.transitions (through core.pubsub) until the order is delivered or
+cancelled, with a keep-alive comment every SSE_HEARTBEAT_SECONDS.
+
+Streams are served by the async order_events view behind the full
+middleware stack, which is async throughout, so an idle stream waits on the
+event loop. Django still runs each request's sync work (Django's own
+middleware hooks, sessions, the ORM) on a thread of its own, kept until the
+request ends. Once the first event is out a stream closes that thread's
+database connections and lets the thread go, so an idle stream holds no
+thread and no connection; a sync call later in the request starts a new one.
+Under WSGI the view sends the current status and asks the browser to
+reconnect later.
+"""
+import json
+import time
+
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from core import metrics, pubsub
+
+from . import transitions
+from .models import ArchivedOrder, Order
+
+ORDER_FIELDS = ('id', 'customer_id', 'status', 'created_at')
+
+
+def frame(event, data, retry=None):
+    """One server-sent event."""
+    retry_line = f'retry: {retry * 1000}\n' if retry else ''
+    return f'{retry_line}event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def retry_seconds():
+    return getattr(settings, 'SSE_RETRY_SECONDS', 10)
+
+
+def close_request_connections():
+    """Close this thread's database connections unless a transaction is open."""
+    for conn in connections.all(initialized_only=True):
+        if not conn.in_atomic_block:
+            conn.close()
+
+
+async def release_request_thread():
+    """
+    Close the database connections of the current request's sync thread and
+    let the thread exit.
+
+    asgiref keeps one single-thread executor per ThreadSensitiveContext (per
+    request under Django's ASGI handler) until the context ends; dropping it
+    from the map makes the next sync call of the request start a new one.
+    """
+    await sync_to_async(close_request_connections)()
+    context = SyncToAsync.thread_sensitive_context.get(None)
+    # None when sync work runs on an outer async_to_sync thread (the test client).
+    executor = SyncToAsync.context_to_thread_executor.pop(context, None) if context else None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def find_order(order_id):
+    """The order, hot or archived, with just the fields a stream needs."""
+    order = Order.objects.only(*ORDER_FIELDS).filter(pk=order_id).first()
+    if order is None:
+        order = ArchivedOrder.objects.only(*ORDER_FIELDS).filter(pk=order_id).first()
+    return order
+
+
+async def status_stream(order, release_connections=False):
+    """
+    Current status, then each change until the order is final or SSE_MAX_SECONDS pass.
+
+    With ``release_connections`` the request's thread and its database
+    connections are released after the first event; see release_request_thread.
+    """
+    heartbeat = getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15)
+    deadline = time.monotonic() + getattr(settings, 'SSE_MAX_SECONDS', 600)
+    metrics.SSE_CONNECTIONS.inc('opened')
+    try:
+        # Subscribe before reading the status so no change falls in between.
+        with pubsub.subscribe(transitions.channel(order.pk)) as subscription:
+            status = await Order.objects.filter(pk=order.pk).values_list('status', flat=True).afirst()
+            message = transitions.event(order.pk, status or order.status)
+            yield frame('status', message, retry=retry_seconds())
+            if release_connections:
+                await release_request_thread()
+            while not message['final'] and time.monotonic() < deadline:
+                try:
+                    message = await subscription.get(timeout=heartbeat)
+                except TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield frame('status', message)
+    finally:
+        metrics.SSE_CONNECTIONS.inc('closed')
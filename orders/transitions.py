@@ -0,0 +1,122 @@
+"""
+The order status state machine and bulk status changes.
+
+An order moves pending -> paid -> delivered, may be delivered straight from
+pending (paid at the door), and may be cancelled until it is delivered.
+Delivered and cancelled are final. ``apply`` changes many orders at once:
+one ``UPDATE ... WHERE id IN (...) AND status IN (<allowed sources>)`` per
+target status, so a concurrent change that makes an order ineligible is
+never overwritten, plus the rollup, stock and metric bookkeeping and a
+pub/sub message per order for the live order page.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from core import metrics, pubsub
+from products import stock
+
+from . import kitchen, rollups
+from .models import Order, OrderItem
+
+TRANSITIONS = {
+    'pending': frozenset({'paid', 'delivered', 'cancelled'}),
+    'paid': frozenset({'delivered', 'cancelled'}),
+    'delivered': frozenset(),
+    'cancelled': frozenset(),
+}
+
+# Per-order outcomes reported by apply().
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+INVALID = 'invalid'
+NOT_FOUND = 'not_found'
+
+
+def can_transition(old_status, new_status):
+    return new_status in TRANSITIONS.get(old_status, ())
+
+
+def sources(new_status):
+    """Statuses an order may move to ``new_status`` from."""
+    return [status for status, targets in TRANSITIONS.items() if new_status in targets]
+
+
+def apply(changes):
+    """
+    Move orders to new statuses; ``changes`` maps order id -> target status.
+
+    Returns {order id: (outcome, status)} where status is the order's status
+    afterwards (None when not found). Targets outside STATUS_CHOICES are
+    reported as INVALID.
+    """
+    by_target = defaultdict(list)
+    for order_id, status in changes.items():
+        by_target[status].append(order_id)
+    results = {}
+    with transaction.atomic():
+        current = {
+            pk: (created_at, status, total_price)
+            for pk, created_at, status, total_price in Order.objects.select_for_update()
+            .filter(pk__in=list(changes)).values_list('pk', 'created_at', 'status', 'total_price')
+        }
+        for target, order_ids in by_target.items():
+            allowed = sources(target)
+            moving = []
+            for order_id in order_ids:
+                if order_id not in current:
+                    results[order_id] = (NOT_FOUND, None)
+                    continue
+                created_at, status, total_price = current[order_id]
+                if status == target:
+                    results[order_id] = (UNCHANGED, status)
+                elif status in allowed:
+                    moving.append((order_id, created_at, status, total_price))
+                else:
+                    results[order_id] = (INVALID, status)
+            if not moving:
+                continue
+            Order.objects.filter(pk__in=[order[0] for order in moving], status__in=allowed).update(
+                status=target, updated_at=timezone.now(),
+            )
+            rollups.record_transitions(moving, target)
+            if target == 'cancelled':
+                release_stock([order[0] for order in moving])
+            for order_id, _, status, _ in moving:
+                metrics.ORDER_TRANSITIONS.inc(status, target)
+                results[order_id] = (UPDATED, target)
+                announce(order_id, target)
+    return results
+
+
+def release_stock(order_ids):
+    """Put the units of cancelled orders back into stock."""
+    returned = defaultdict(int)
+    for product_id, quantity in OrderItem.objects.filter(
+        order_id__in=order_ids, product__stock__isnull=False,
+    ).values_list('product_id', 'quantity'):
+        returned[product_id] += quantity
+    for product_id, quantity in returned.items():
+        stock.release(product_id, quantity)
+
+
+def channel(order_id):
+    """The pub/sub channel carrying one order's status changes."""
+    return f'order:{order_id}'
+
+
+def event(order_id, status):
+    """The message published (and sent as SSE data) when an order's status changes."""
+    return {
+        'id': order_id,
+        'status': status,
+        'status_display': dict(Order.STATUS_CHOICES).get(status, status),
+        'final': not TRANSITIONS.get(status),
+    }
+
+
+def announce(order_id, status):
+    """Publish the new status to live subscribers once the transaction commits."""
+    transaction.on_commit(lambda: pubsub.publish(channel(order_id), event(order_id, status)))
+    kitchen.changed()
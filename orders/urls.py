@@ -14,7 +14,15 @@ urlpatterns = [
     path('checkout/', views.checkout, name='checkout'),
     path('orders/', views.order_list, name='order_list'),
     path('orders/<int:order_id>/', views.order_detail, name='order_detail'),
+    path('async/orders/', views.order_list_async, name='order_list_async'),
+    path('async/orders/<int:order_id>/', views.order_detail_async, name='order_detail_async'),
+    path('orders/<int:order_id>/events/', views.order_events, name='order_events'),
     path('admin/orders/', views.admin_order_list, name='admin_order_list'),
     path('admin/orders/<int:order_id>/update-status/', views.update_order_status, name='update_order_status'),
+    path('admin/orders/bulk-status/', views.bulk_update_order_status, name='bulk_update_order_status'),
+    path('admin/orders/export/', views.export_orders, name='export_orders'),
+    path('admin/kitchen/', views.kitchen_queue, name='kitchen_queue'),
+    path('admin/kitchen/feed/', views.kitchen_feed, name='kitchen_feed'),
+    path('admin/sales/', views.sales_dashboard, name='sales_dashboard'),
 ]
 
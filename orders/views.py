@@ -1,14 +1,27 @@
 """
 Views for orders app - cart and order management.
 """
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.views.decorators.http import require_POST
 from django.views.generic import ListView, DetailView
 from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+import time
+from datetime import timedelta
 from decimal import Decimal
+from accounts.models import ais_admin
+from core import metrics, pubsub
+from products import stock
 from products.models import Product
-from .models import Order, OrderItem
+from . import archive, export, kitchen, rollups, sse, transitions
+from .models import DailyProductSales, HourlyStatusSales, Order, OrderItem
 
 
 def is_admin(user):
@@ -142,31 +155,59 @@ def checkout(request):
         messages.error(request, 'Your cart is empty!')
         return redirect('orders:cart')
     
-    # Create order
-    order = Order.objects.create(customer=request.user)
-    total = Decimal('0.00')
+    started = time.perf_counter()
+    lines = []
+    stocked = []
     
-    # Create order items
+    # Reserve stock first: an order is only created when some line can be filled
     for product_id, item_data in cart.items():
         try:
             product = Product.objects.get(id=product_id, is_available=True)
             quantity = item_data['quantity']
             price = Decimal(item_data['price'])
             
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price=price,
-            )
+            if product.stock is not None:
+                if not stock.reserve(product.id, quantity):
+                    messages.warning(request, f'Not enough {product.name} left; it was removed from your order.')
+                    continue
+                stocked.append(product.id)
             
-            total += quantity * price
+            lines.append((product, quantity, price))
         except Product.DoesNotExist:
             messages.warning(request, f'Product {product_id} is no longer available.')
     
+    if not lines:
+        # Nothing was reserved; keep the cart so the customer can adjust it.
+        return redirect('orders:cart')
+    
+    # Create order
+    order = Order.objects.create(customer=request.user)
+    total = Decimal('0.00')
+    sold = []
+    
+    # Create order items
+    for product, quantity, price in lines:
+        OrderItem.objects.create(
+            order=order,
+            product=product,
+            quantity=quantity,
+            price=price,
+        )
+        
+        total += quantity * price
+        sold.append((product.id, product.category_id, quantity, price))
+    
     # Update order total
     order.total_price = total
     order.save()
+    rollups.record_order(order, sold)
+    kitchen.changed()
+    if stocked and stock.sold_out(stocked):
+        stock.invalidate_catalog()
+    
+    metrics.CHECKOUT_DURATION.observe(time.perf_counter() - started)
+    metrics.CART_SIZE.observe(sum(item['quantity'] for item in cart.values()))
+    metrics.ORDER_TRANSITIONS.inc('new', order.status)
     
     # Clear cart
     request.session['cart'] = {}
@@ -178,24 +219,77 @@ def checkout(request):
 
 @login_required
 def order_list(request):
-    """List user's orders."""
-    orders = Order.objects.filter(customer=request.user).prefetch_related('items')
+    """List user's orders, followed by any archived ones."""
+    orders = list(Order.objects.filter(customer=request.user).prefetch_related('items'))
+    orders += archive.archived_orders(request.user.pk)
     return render(request, 'orders/order_list.html', {'orders': orders})
 
 
 @login_required
 def order_detail(request, order_id):
-    """Order detail view."""
-    order = get_object_or_404(Order, id=order_id)
+    """Order detail view; archived orders are looked up when the id is not in Order."""
+    order = archive.get_order(order_id, viewer=request.user)
+    if order is None:
+        raise Http404('No order matches the given query.')
     
-    # Check if user owns the order or is admin
-    if order.customer != request.user and not (hasattr(request.user, 'profile') and request.user.profile.is_admin()):
+    # Check if user owns the order or is admin (worked out by the query)
+    if not order.viewer_allowed:
         messages.error(request, 'You do not have permission to view this order.')
         return redirect('orders:order_list')
     
     return render(request, 'orders/order_detail.html', {'order': order})
 
 
+@login_required
+async def order_list_async(request):
+    """Async variant of order_list (for ASGI deployments)."""
+    user = await request.auser()
+    orders = [
+        order async for order in
+        Order.objects.filter(customer_id=user.pk).prefetch_related('items')
+    ]
+    orders += [order async for order in archive.archived_orders(user.pk)]
+    return await sync_to_async(render)(request, 'orders/order_list.html', {'orders': orders})
+
+
+@login_required
+async def order_detail_async(request, order_id):
+    """Async variant of order_detail (for ASGI deployments)."""
+    user = await request.auser()
+    order = await archive.aget_order(order_id, viewer=user)
+    if order is None:
+        raise Http404('No order matches the given query.')
+    
+    # Check if user owns the order or is admin (worked out by the query)
+    if not order.viewer_allowed:
+        messages.error(request, 'You do not have permission to view this order.')
+        return redirect('orders:order_list')
+    
+    return await sync_to_async(render)(request, 'orders/order_detail.html', {'order': order})
+
+
+@login_required
+async def order_events(request, order_id):
+    """Server-sent events with the order's status changes; see orders.sse."""
+    order = await sync_to_async(sse.find_order)(order_id)
+    if order is None:
+        raise Http404('No order matches the given query.')
+    user = await request.auser()
+    if order.customer_id != user.pk and not await ais_admin(user):
+        return HttpResponseForbidden()
+    
+    if isinstance(request, ASGIRequest) and not order.is_archived:
+        stream = sse.status_stream(order, release_connections=True)
+    else:
+        # A WSGI worker cannot hold the stream open: send the current status
+        # and let the browser reconnect after SSE_RETRY_SECONDS.
+        stream = iter([sse.frame('status', transitions.event(order.pk, order.status), retry=sse.retry_seconds())])
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 @user_passes_test(is_admin)
 def admin_order_list(request):
@@ -209,9 +303,62 @@ def admin_order_list(request):
     return render(request, 'orders/admin_order_list.html', {
         'orders': orders,
         'status_filter': status_filter,
+        'status_choices': Order.STATUS_CHOICES,
     })
 
 
+@login_required
+@user_passes_test(is_admin)
+def kitchen_queue(request):
+    """Kitchen screen: the orders still to make, kept current by kitchen_feed."""
+    cursor = kitchen.latest_cursor()
+    return render(request, 'orders/kitchen_queue.html', {
+        'orders': kitchen.queue(),
+        'cursor': cursor or '',
+        'poll_seconds': settings.KITCHEN_POLL_SECONDS,
+        'resync_seconds': settings.KITCHEN_RESYNC_SECONDS,
+    })
+
+
+@login_required
+async def kitchen_feed(request):
+    """
+    JSON feed for the kitchen screen.
+
+    Without ``since`` it returns the whole queue and a cursor. With it, the
+    orders changed after the cursor that it has not delivered; under ASGI it
+    waits up to ``wait`` seconds (at most KITCHEN_POLL_SECONDS) for one
+    before answering.
+    """
+    if not await ais_admin(await request.auser()):
+        return HttpResponseForbidden()
+    since = request.GET.get('since')
+    if not since:
+        cursor = await sync_to_async(kitchen.latest_cursor)()
+        orders = await sync_to_async(kitchen.queue)()
+        return JsonResponse({'reset': True, 'orders': [kitchen.as_dict(order) for order in orders], 'cursor': cursor})
+    try:
+        cursor = kitchen.parse_cursor(since)
+        wait = min(float(request.GET.get('wait', 0)), settings.KITCHEN_POLL_SECONDS)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    if not isinstance(request, ASGIRequest):
+        # Do not hold a WSGI worker; the screen polls again shortly.
+        wait = 0
+    
+    # Subscribe before the first read so no change falls in between.
+    with pubsub.subscribe(kitchen.CHANNEL) as subscription:
+        deadline = time.monotonic() + wait
+        orders, next_cursor = await sync_to_async(kitchen.changes)(cursor)
+        while not orders and time.monotonic() < deadline:
+            try:
+                await subscription.get(timeout=deadline - time.monotonic())
+            except TimeoutError:
+                break
+            orders, next_cursor = await sync_to_async(kitchen.changes)(kitchen.parse_cursor(next_cursor))
+    return JsonResponse({'reset': False, 'orders': [kitchen.as_dict(order) for order in orders], 'cursor': next_cursor})
+
+
 @login_required
 @user_passes_test(is_admin)
 def update_order_status(request, order_id):
@@ -221,11 +368,90 @@ def update_order_status(request, order_id):
     if request.method == 'POST':
         new_status = request.POST.get('status')
         if new_status in dict(Order.STATUS_CHOICES):
-            order.status = new_status
-            order.save()
-            messages.success(request, f'Order #{order.id} status updated to {new_status}.')
+            outcome, status = transitions.apply({order.pk: new_status})[order.pk]
+            if outcome == transitions.UPDATED:
+                messages.success(request, f'Order #{order.id} status updated to {new_status}.')
+            elif outcome == transitions.UNCHANGED:
+                messages.info(request, f'Order #{order.id} is already {new_status}.')
+            else:
+                messages.error(request, f'Order #{order.id} cannot go from {status} to {new_status}.')
         else:
             messages.error(request, 'Invalid status.')
     
     return redirect('orders:admin_order_list')
 
+
+@login_required
+@user_passes_test(is_admin)
+@require_POST
+def bulk_update_order_status(request):
+    """Move the posted order_ids to one status (admin only); JSON result per order."""
+    new_status = request.POST.get('status')
+    if new_status not in dict(Order.STATUS_CHOICES):
+        return JsonResponse({'error': 'Invalid status.'}, status=400)
+    try:
+        order_ids = [int(order_id) for order_id in request.POST.getlist('order_ids')]
+    except ValueError:
+        return JsonResponse({'error': 'order_ids must be integers.'}, status=400)
+    if not order_ids:
+        return JsonResponse({'error': 'No orders selected.'}, status=400)
+    
+    results = transitions.apply(dict.fromkeys(order_ids, new_status))
+    return JsonResponse({
+        'status': new_status,
+        'updated': sum(outcome == transitions.UPDATED for outcome, _ in results.values()),
+        'results': {
+            str(order_id): {'result': outcome, 'status': status}
+            for order_id, (outcome, status) in results.items()
+        },
+    })
+
+
+@login_required
+@user_passes_test(is_admin)
+def export_orders(request):
+    """Stream orders and line items as CSV (admin only); ?start=&end=&status= filter."""
+    try:
+        filters = export.parse_filters(
+            request.GET.get('start'), request.GET.get('end'), request.GET.get('status'),
+        )
+    except export.ExportFilterError as exc:
+        return HttpResponseBadRequest(str(exc))
+    
+    # An async iterator under ASGI, or Django buffers the whole export first.
+    chunks = export.acsv_chunks(**filters) if isinstance(request, ASGIRequest) else export.csv_chunks(**filters)
+    response = StreamingHttpResponse(chunks, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{export.filename(**filters)}"'
+    return response
+
+
+@login_required
+@user_passes_test(is_admin)
+def sales_dashboard(request):
+    """Revenue by day, product, category and status (admin only), read from the rollups."""
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 365)
+    except ValueError:
+        days = 30
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    daily = DailyProductSales.objects.filter(day__gte=start)
+    hourly = HourlyStatusSales.objects.filter(hour__gte=rollups.day_start(start))
+    labels = dict(Order.STATUS_CHOICES)
+    
+    return render(request, 'orders/sales_dashboard.html', {
+        'days': days,
+        'day_options': [7, 30, 90, 365],
+        'start': start,
+        'by_day': daily.values('day').annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-day'),
+        'top_products': daily.values('product_id', 'product__name').annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue')[:10],
+        'by_category': daily.values('category__name').annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue'),
+        'by_status': [
+            {**row, 'label': labels[row['status']]}
+            for row in hourly.values('status').annotate(orders=Sum('orders'), revenue=Sum('revenue')).order_by('status')
+        ],
+        'last_hours': HourlyStatusSales.objects.filter(
+            hour__gte=rollups.order_hour(timezone.now()) - timedelta(hours=23), orders__gt=0,
+        ).order_by('-hour', 'status'),
+        'summary': daily.aggregate(units=Sum('units'), revenue=Sum('revenue')),
+    })
@@ -33,12 +33,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestTimingMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.MemoryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.StaticFilesMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.LoadSheddingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -47,12 +54,23 @@ APPEND_SLASH = True
 
 ROOT_URLCONF = 'pizzashop.urls'
 
+# Compiled templates are cached per process in DEBUG and production alike;
+# the development server's autoreloader clears the cache when a template
+# changes. Set TEMPLATE_CACHE=False to recompile on every render.
+TEMPLATE_CACHE = config('TEMPLATE_CACHE', default=True, cast=bool)
+template_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if TEMPLATE_CACHE:
+    template_loaders = [('django.template.loaders.cached.Loader', template_loaders)]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': template_loaders,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -71,6 +89,13 @@ WSGI_APPLICATION = 'pizzashop.wsgi.application'
 # To use PostgreSQL, uncomment the PostgreSQL config and comment SQLite
 USE_POSTGRESQL = config('USE_POSTGRESQL', default=False, cast=bool)
 
+# Connection management
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds (0 closes them
+# after every request) and health-checked before reuse. DATABASE_POOL switches
+# PostgreSQL to a psycopg 3 connection pool instead of persistent connections.
+DATABASE_CONN_MAX_AGE = config('DATABASE_CONN_MAX_AGE', default=60, cast=int)
+DATABASE_POOL = config('DATABASE_POOL', default=False, cast=bool)
+
 if USE_POSTGRESQL:
     DATABASES = {
         'default': {
@@ -80,17 +105,70 @@ if USE_POSTGRESQL:
             'PASSWORD': config('DATABASE_PASSWORD', default='postgres'),
             'HOST': config('DATABASE_HOST', default='localhost'),
             'PORT': config('DATABASE_PORT', default='5432'),
+            # Pooled connections are returned to the pool after each request.
+            'CONN_MAX_AGE': 0 if DATABASE_POOL else DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': config('DATABASE_POOL_MIN_SIZE', default=2, cast=int),
+                    'max_size': config('DATABASE_POOL_MAX_SIZE', default=10, cast=int),
+                    'timeout': config('DATABASE_POOL_TIMEOUT', default=10, cast=int),
+                },
+            } if DATABASE_POOL else {},
         }
     }
 else:
     # SQLite for development
+    # SQLITE_TUNING applies WAL mode and relaxed fsync at connect time so
+    # readers no longer block checkout writes, and starts write transactions
+    # immediately so concurrent checkouts wait on the busy timeout instead of
+    # failing with "database is locked".
+    SQLITE_TUNING = config('SQLITE_TUNING', default=True, cast=bool)
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+            } if SQLITE_TUNING else {},
         }
     }
 
+# Read replicas
+# Catalog (products) and order-history (orders) reads go to the replicas listed
+# here; writes and everything else stay on the primary. A client that just
+# wrote reads from the primary for REPLICA_PIN_SECONDS (read-your-writes).
+# For local testing SQLITE_REPLICA_NAME points at a second SQLite file, e.g. a
+# copy of db.sqlite3; on PostgreSQL DATABASE_REPLICA_HOSTS lists replica hosts.
+REPLICA_ROUTED_APPS = ['products', 'orders']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+REPLICA_PIN_COOKIE = 'pin_primary'
+
+if USE_POSTGRESQL:
+    _replica_hosts = config('DATABASE_REPLICA_HOSTS', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
+    for _index, _host in enumerate(_replica_hosts, start=1):
+        DATABASES[f'replica_{_index}'] = {**DATABASES['default'], 'HOST': _host, 'TEST': {'MIRROR': 'default'}}
+else:
+    _replica_name = config('SQLITE_REPLICA_NAME', default='')
+    if _replica_name:
+        DATABASES['replica_1'] = {**DATABASES['default'], 'NAME': _replica_name, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware'),
+                      'core.middleware.ReplicaPinningMiddleware')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -117,6 +195,20 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# Vendored assets (static/vendor/) are collected under content-hashed names
+# with .gz copies; StaticFilesMiddleware serves STATIC_ROOT with immutable
+# caching. The development server serves the unhashed source files instead.
+STATIC_HASHED = config('STATIC_HASHED', default=not DEBUG, cast=bool)
+STATIC_SERVE = config('STATIC_SERVE', default=True, cast=bool)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': (
+            'core.staticfiles.CompressedManifestStaticFilesStorage' if STATIC_HASHED
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
 
 # Media files
 MEDIA_URL = '/media/'
@@ -133,11 +225,138 @@ LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'core:home'
 LOGOUT_REDIRECT_URL = 'core:home'
 
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='pizzashop'),
+    }
+}
+
 # Session settings
+# The low-write engine (core.sessions) caches sessions and only writes the
+# django_session row when the session content changed.
+USE_LOW_WRITE_SESSIONS = config('USE_LOW_WRITE_SESSIONS', default=False, cast=bool)
+if USE_LOW_WRITE_SESSIONS:
+    SESSION_ENGINE = 'core.sessions'
 SESSION_COOKIE_SECURE = not DEBUG
 SESSION_COOKIE_HTTPONLY = True
 CSRF_COOKIE_SECURE = not DEBUG
 
+# Performance instrumentation
+# RequestTimingMiddleware adds a Server-Timing header (query count, SQL,
+# template, view and total time) and logs requests over the thresholds to
+# the 'pizzashop.performance' logger, keyed by URL name.
+PERF_INSTRUMENTATION = config('PERF_INSTRUMENTATION', default=True, cast=bool)
+PERF_SERVER_TIMING = config('PERF_SERVER_TIMING', default=True, cast=bool)
+PERF_SLOW_REQUEST_MS = config('PERF_SLOW_REQUEST_MS', default=500, cast=int)
+PERF_SLOW_QUERY_COUNT = config('PERF_SLOW_QUERY_COUNT', default=50, cast=int)
+# Also time each template, {% extends %} parent, {% include %} and {% block %}
+# separately; the slowest appear in the slow-request log records.
+PERF_TEMPLATE_DETAIL = config('PERF_TEMPLATE_DETAIL', default=True, cast=bool)
+
+# Metrics
+# Prometheus text format at /metrics/. With several worker processes set
+# METRICS_DIR to a directory shared by the workers (cleared on deploy); each
+# worker writes its counters there every METRICS_FLUSH_SECONDS and the scrape
+# sums them. METRICS_TOKEN, if set, is required as a Bearer token.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_SECONDS = config('METRICS_FLUSH_SECONDS', default=5, cast=int)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# On-demand profiling
+# Admins add "X-Profile: 1" or "?__profile=1" to a request to save a cProfile
+# dump to PROFILING_DIR (newest PROFILING_KEEP are kept). Browse and download
+# them at /profiles/; open with pstats or snakeviz.
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=True, cast=bool)
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_KEEP = config('PROFILING_KEEP', default=50, cast=int)
+
+# Response compression
+# CompressionMiddleware gzips responses of these types from
+# COMPRESSION_MIN_SIZE bytes on (smaller ones do not pay off).
+COMPRESSION_ENABLED = config('COMPRESSION_ENABLED', default=True, cast=bool)
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_CONTENT_TYPES = config(
+    'COMPRESSION_CONTENT_TYPES', default='text/html,application/json,text/plain,text/csv',
+    cast=lambda v: [s.strip() for s in v.split(',')],
+)
+
+# Warm-up
+# pizzashop.wsgi/asgi populate URL resolvers, compile templates and run the
+# first catalog queries at import time (in the gunicorn master with
+# preload_app, see gunicorn.conf.py); /ready/ answers 503 until then.
+# WARMUP_GC_FREEZE moves the warmed objects out of the GC so forked workers
+# keep sharing their pages.
+WARMUP_ENABLED = config('WARMUP_ENABLED', default=True, cast=bool)
+WARMUP_GC_FREEZE = config('WARMUP_GC_FREEZE', default=True, cast=bool)
+
+# Memory profiling
+# Traces allocations with tracemalloc (costly, off by default): peak memory
+# per URL name, plus a snapshot every MEMORY_SNAPSHOT_SECONDS diffed against
+# the worker's first one by allocation site. See /memory/ and the
+# memory_replay command.
+MEMORY_PROFILING = config('MEMORY_PROFILING', default=False, cast=bool)
+MEMORY_TRACE_FRAMES = config('MEMORY_TRACE_FRAMES', default=1, cast=int)
+MEMORY_SNAPSHOT_SECONDS = config('MEMORY_SNAPSHOT_SECONDS', default=300, cast=int)
+MEMORY_SNAPSHOT_KEEP = config('MEMORY_SNAPSHOT_KEEP', default=4, cast=int)
+
+# Live order updates
+# order_events streams status changes as server-sent events under ASGI,
+# fed by core.pubsub. LocalBackend fans out within one process; use
+# core.pubsub.PostgresBackend (LISTEN/NOTIFY) with several ASGI workers.
+# Streams send a keep-alive comment every SSE_HEARTBEAT_SECONDS and end after
+# SSE_MAX_SECONDS; under WSGI a stream sends the current status and asks the
+# browser to reconnect after SSE_RETRY_SECONDS instead.
+PUBSUB_BACKEND = config('PUBSUB_BACKEND', default='core.pubsub.LocalBackend')
+SSE_HEARTBEAT_SECONDS = config('SSE_HEARTBEAT_SECONDS', default=15, cast=int)
+SSE_MAX_SECONDS = config('SSE_MAX_SECONDS', default=600, cast=int)
+SSE_RETRY_SECONDS = config('SSE_RETRY_SECONDS', default=10, cast=int)
+
+# Admin changelists
+# Order, order item and archived order changelists show the planner's row
+# estimate instead of running COUNT(*) once a table has ADMIN_ESTIMATED_COUNT_MIN
+# rows (PostgreSQL statistics, or SQLite's after ANALYZE); see core.admin.
+ADMIN_ESTIMATED_COUNT_MIN = config('ADMIN_ESTIMATED_COUNT_MIN', default=10000, cast=int)
+
+# Kitchen screen
+# The kitchen feed long-polls for at most KITCHEN_POLL_SECONDS under ASGI (under
+# WSGI it answers at once and the screen polls every second); the screen
+# reloads the whole queue every KITCHEN_RESYNC_SECONDS. Feed cursors stay
+# KITCHEN_LOOKBACK_SECONDS behind the clock, so orders whose transaction
+# committed late still reach the screen.
+KITCHEN_POLL_SECONDS = config('KITCHEN_POLL_SECONDS', default=25, cast=int)
+KITCHEN_RESYNC_SECONDS = config('KITCHEN_RESYNC_SECONDS', default=300, cast=int)
+KITCHEN_LOOKBACK_SECONDS = config('KITCHEN_LOOKBACK_SECONDS', default=5, cast=int)
+
+# Load shedding
+# Pressure is the larger of the requests in flight across the server's worker
+# processes over LOAD_SHEDDING_MAX_IN_FLIGHT (gunicorn.conf.py sets it to the
+# number of sync workers) and the average queue latency over
+# LOAD_SHEDDING_QUEUE_TARGET_MS. Queue latency comes from the X-Request-Start
+# header and is only read with LOAD_SHEDDING_TRUST_REQUEST_START, for a proxy
+# that always sets (and overwrites) it; otherwise clients could forge it and
+# pressure is the in-flight count alone. Each route class
+# in LOAD_SHEDDING_SHED_AT gets a 503 with Retry-After once pressure reaches
+# its level; checkout is never shed. Anonymous catalog pages are served from a
+# LOAD_SHEDDING_PAGE_SECONDS cache instead of a 503 when there is a copy.
+LOAD_SHEDDING_ENABLED = config('LOAD_SHEDDING_ENABLED', default=True, cast=bool)
+LOAD_SHEDDING_MAX_IN_FLIGHT = config('LOAD_SHEDDING_MAX_IN_FLIGHT', default=32, cast=int)
+LOAD_SHEDDING_QUEUE_TARGET_MS = config('LOAD_SHEDDING_QUEUE_TARGET_MS', default=250, cast=int)
+LOAD_SHEDDING_TRUST_REQUEST_START = config('LOAD_SHEDDING_TRUST_REQUEST_START', default=False, cast=bool)
+LOAD_SHEDDING_SHED_AT = config(
+    'LOAD_SHEDDING_SHED_AT', default='browse=0.6,admin=0.8,auth=0.9',
+    cast=lambda v: {cls.strip(): float(level) for cls, level in (s.split('=') for s in v.split(',') if s.strip())},
+)
+LOAD_SHEDDING_RETRY_AFTER = config('LOAD_SHEDDING_RETRY_AFTER', default=5, cast=int)
+LOAD_SHEDDING_PAGE_SECONDS = config('LOAD_SHEDDING_PAGE_SECONDS', default=60, cast=int)
+
+# Order archival
+# manage.py archive_orders moves delivered and cancelled orders unchanged for
+# ORDER_ARCHIVE_DAYS into the ArchivedOrder tables; order pages still find them.
+ORDER_ARCHIVE_DAYS = config('ORDER_ARCHIVE_DAYS', default=180, cast=int)
+
 # Security settings
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
@@ -10,3 +10,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pizzashop.settings')
 
 application = get_wsgi_application()
 
+# Runs in the gunicorn master before fork with preload_app, otherwise in each
+# worker before it accepts connections.
+from core.warmup import warm_up  # noqa: E402
+
+warm_up()
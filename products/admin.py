@@ -16,9 +16,10 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     """Admin interface for Product model."""
-    list_display = ['name', 'category', 'price', 'is_available', 'created_at']
+    list_display = ['name', 'category', 'price', 'stock', 'is_available', 'created_at']
     list_filter = ['category', 'is_available', 'created_at']
+    list_select_related = ['category']
     search_fields = ['name', 'description']
-    list_editable = ['is_available', 'price']
+    list_editable = ['is_available', 'price', 'stock']
     prepopulated_fields = {}
 
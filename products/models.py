@@ -2,6 +2,8 @@
 Products models for pizza management.
 """
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse
 
 
@@ -32,6 +34,9 @@ class Product(models.Model):
     image = models.ImageField(upload_to='products/', blank=True, null=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     is_available = models.BooleanField(default=True)
+    # Units left for limited products; empty for products made to order.
+    # Checkout changes it through products.stock only.
+    stock = models.PositiveIntegerField(null=True, blank=True, help_text='Units left; leave empty for unlimited.')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -44,3 +49,11 @@ class Product(models.Model):
     def get_absolute_url(self):
         return reverse('products:product_detail', kwargs={'pk': self.pk})
 
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_catalog(sender, **kwargs):
+    """Retire cached catalog pages when a product or category changes."""
+    from .stock import invalidate_catalog
+    invalidate_catalog()
@@ -0,0 +1,66 @@
+"""
+Stock counts for limited products.
+
+Product.stock is None for products made to order (never run out) and a count
+of units left otherwise. Stock only moves through conditional F() updates:
+``UPDATE ... SET stock = stock - n WHERE id = ? AND stock >= n`` either takes
+all n units or changes nothing, so concurrent checkouts cannot oversell and
+nothing is read first. The same statement switches is_available off when it
+takes the last units.
+
+Catalog pages may cache on ``catalog_version()``; it changes whenever a
+product is saved or deleted and whenever stock makes one sell out or return.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from core import metrics
+
+from .models import Product
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def reserve(product_id, quantity):
+    """Take ``quantity`` units of a stocked product; False when not enough are left."""
+    taken = Product.objects.filter(pk=product_id, is_available=True, stock__gte=quantity).update(
+        stock=F('stock') - quantity,
+        # Compared with the stock before this update.
+        is_available=Case(When(stock=quantity, then=Value(False)), default=Value(True)),
+        updated_at=timezone.now(),
+    )
+    metrics.STOCK_RESERVATIONS.inc('reserved' if taken else 'rejected')
+    return bool(taken)
+
+
+def release(product_id, quantity):
+    """Return units (of a cancelled order); a product that had sold out is available again."""
+    returned = Product.objects.filter(pk=product_id, stock__isnull=False).update(
+        stock=F('stock') + quantity,
+        is_available=Case(When(stock=0, then=Value(True)), default=F('is_available')),
+        updated_at=timezone.now(),
+    )
+    if returned:
+        invalidate_catalog()
+
+
+def sold_out(product_ids):
+    """Whether any of these stocked products has just run out."""
+    return Product.objects.filter(pk__in=product_ids, stock=0).exists()
+
+
+def catalog_version():
+    return cache.get_or_set(CATALOG_VERSION_KEY, 1, timeout=None)
+
+
+def invalidate_catalog():
+    """Move catalog_version() on once the current transaction commits."""
+    def bump():
+        try:
+            cache.incr(CATALOG_VERSION_KEY)
+        except ValueError:
+            # Not set (or evicted): any new value retires the old cache keys.
+            cache.set(CATALOG_VERSION_KEY, int(timezone.now().timestamp() * 1000), timeout=None)
+    transaction.on_commit(bump)
@@ -13,5 +13,9 @@ urlpatterns = [
     path('<int:pk>/update/', views.ProductUpdateView.as_view(), name='product_update'),
     path('<int:pk>/delete/', views.ProductDeleteView.as_view(), name='product_delete'),
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
+    # Async read views for ASGI deployments
+    path('async/', views.ProductListAsyncView.as_view(), name='product_list_async'),
+    path('async/<int:pk>/', views.ProductDetailAsyncView.as_view(), name='product_detail_async'),
+    path('async/category/<slug:slug>/', views.category_detail_async, name='category_detail_async'),
 ]
 
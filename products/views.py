@@ -1,12 +1,16 @@
 """
 Views for products app - product listing and management.
 """
-from django.shortcuts import render, get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Paginator
+from django.http import Http404
+from django.shortcuts import render, get_object_or_404, redirect, aget_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic import View, ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
+from accounts.models import ais_admin
 from .models import Product, Category
 
 
@@ -52,6 +56,45 @@ class ProductListView(ListView):
         return context
 
 
+class ProductListAsyncView(View):
+    """Async variant of ProductListView using the async ORM (for ASGI deployments)."""
+    paginate_by = ProductListView.paginate_by
+    
+    async def get(self, request):
+        admin = await ais_admin(await request.auser())
+        if admin:
+            queryset = Product.objects.all().select_related('category')
+        else:
+            queryset = Product.objects.filter(is_available=True).select_related('category')
+        
+        category_slug = request.GET.get('category')
+        if category_slug:
+            queryset = queryset.filter(category__slug=category_slug)
+        
+        paginator = Paginator(queryset, self.paginate_by)
+        # Prime the cached count so the paginator never queries synchronously.
+        paginator.count = await queryset.acount()
+        page_number = request.GET.get('page') or 1
+        if page_number == 'last':
+            page_number = paginator.num_pages
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage as e:
+            raise Http404(f'Invalid page ({page_number}): {e}')
+        page.object_list = [product async for product in page.object_list]
+        
+        return await sync_to_async(render)(request, 'products/product_list.html', {
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            'object_list': page.object_list,
+            'products': page.object_list,
+            'categories': [category async for category in Category.objects.all()],
+            'selected_category': request.GET.get('category', ''),
+            'is_admin': admin,
+        })
+
+
 class ProductDetailView(DetailView):
     """Product detail view."""
     model = Product
@@ -59,11 +102,22 @@ class ProductDetailView(DetailView):
     context_object_name = 'product'
 
 
+class ProductDetailAsyncView(View):
+    """Async variant of ProductDetailView (for ASGI deployments)."""
+    
+    async def get(self, request, pk):
+        product = await aget_object_or_404(Product.objects.select_related('category'), pk=pk)
+        return await sync_to_async(render)(request, 'products/product_detail.html', {
+            'object': product,
+            'product': product,
+        })
+
+
 class ProductCreateView(LoginRequiredMixin, AdminRequiredMixin, CreateView):
     """Create new product (admin only)."""
     model = Product
     template_name = 'products/product_form.html'
-    fields = ['name', 'description', 'price', 'image', 'category', 'is_available']
+    fields = ['name', 'description', 'price', 'image', 'category', 'stock', 'is_available']
     success_url = reverse_lazy('products:product_list')
     
     def form_valid(self, form):
@@ -75,7 +129,7 @@ class ProductUpdateView(LoginRequiredMixin, AdminRequiredMixin, UpdateView):
     """Update product (admin only)."""
     model = Product
     template_name = 'products/product_form.html'
-    fields = ['name', 'description', 'price', 'image', 'category', 'is_available']
+    fields = ['name', 'description', 'price', 'image', 'category', 'stock', 'is_available']
     success_url = reverse_lazy('products:product_list')
     
     def form_valid(self, form):
@@ -108,3 +162,18 @@ def category_detail(request, slug):
         'is_admin': is_admin(request.user)
     })
 
+
+
+async def category_detail_async(request, slug):
+    """Async variant of category_detail (for ASGI deployments)."""
+    category = await aget_object_or_404(Category, slug=slug)
+    admin = await ais_admin(await request.auser())
+    if admin:
+        products = Product.objects.filter(category=category)
+    else:
+        products = Product.objects.filter(category=category, is_available=True)
+    return await sync_to_async(render)(request, 'products/category_detail.html', {
+        'category': category,
+        'products': [product async for product in products],
+        'is_admin': admin,
+    })
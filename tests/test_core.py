@@ -1,6 +1,36 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
 import pytest
+import runpy
+import signal
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
 from django.urls import reverse
-from django.test import Client
+from django.contrib import admin
+from django.test import AsyncClient, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from core import loadshed, memory, metrics, pubsub, warmup
+from core.admin import EstimatedCountPaginator, estimated_rows
+from core.middleware import ProfilingMiddleware, ReplicaPinningMiddleware
+from core.routers import ReplicaRouter, reset_pinning
+from core.sessions import SessionStore
+from orders.models import ArchivedOrder, HourlyStatusSales, Order
 from products.models import Category, Product
 from accounts.models import UserProfile
 from django.contrib.auth.models import User
@@ -54,3 +84,786 @@ class TestHomeView:
         assert 'categories' in response.context
 
 
+@pytest.mark.django_db
+class TestLowWriteSessionStore:
+    """Test the low-write session engine."""
+    
+    def _session_writes(self, queries):
+        return [
+            q for q in queries
+            if 'django_session' in q['sql'] and q['sql'].startswith(('INSERT', 'UPDATE'))
+        ]
+    
+    def test_unchanged_session_is_not_written(self):
+        """Test saving an unchanged session skips the database."""
+        session = SessionStore()
+        session['cart'] = {'1': {'quantity': 1}}
+        session.save()
+        
+        session = SessionStore(session.session_key)
+        session['cart'] = {'1': {'quantity': 1}}
+        with CaptureQueriesContext(connection) as ctx:
+            session.save()
+        assert self._session_writes(ctx.captured_queries) == []
+    
+    def test_changed_session_is_written(self):
+        """Test saving a changed session persists it."""
+        session = SessionStore()
+        session['cart'] = {'1': {'quantity': 1}}
+        session.save()
+        
+        session = SessionStore(session.session_key)
+        session['cart']['1']['quantity'] = 3
+        session.save()
+        
+        cache.clear()
+        assert SessionStore(session.session_key)['cart'] == {'1': {'quantity': 3}}
+    
+    def test_ageing_session_expiry_is_extended(self, monkeypatch):
+        """Test an unchanged session is written again once half its age has passed."""
+        session = SessionStore()
+        session['cart'] = {'1': {'quantity': 1}}
+        session.save()
+        expire_date = Session.objects.get(session_key=session.session_key).expire_date
+        
+        later = time.time() + session.get_expiry_age() / 2 + 60
+        monkeypatch.setattr('core.sessions.time.time', lambda: later)
+        monkeypatch.setattr('django.utils.timezone.now', lambda: datetime.fromtimestamp(later, tz=dt_timezone.utc))
+        session = SessionStore(session.session_key)
+        session['cart'] = {'1': {'quantity': 1}}
+        with CaptureQueriesContext(connection) as ctx:
+            session.save()
+        assert len(self._session_writes(ctx.captured_queries)) == 1
+        assert Session.objects.get(session_key=session.session_key).expire_date > expire_date
+
+
+@pytest.mark.django_db
+class TestPurgeSessionsCommand:
+    """Test purge_sessions management command."""
+    
+    def test_purge_deletes_only_expired_sessions(self):
+        """Test expired sessions are deleted in batches."""
+        past = timezone.now() - timedelta(days=1)
+        future = timezone.now() + timedelta(days=1)
+        for i in range(5):
+            Session.objects.create(session_key=f'expired{i}', session_data='', expire_date=past)
+        Session.objects.create(session_key='active', session_data='', expire_date=future)
+        
+        call_command('purge_sessions', batch_size=2, sleep=0)
+        
+        assert list(Session.objects.values_list('session_key', flat=True)) == ['active']
+
+
+@pytest.mark.django_db
+class TestHomeViewAsync:
+    """Test async home view."""
+    
+    def test_home_view_async(self):
+        """Test async home page shows available products only."""
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        available = Product.objects.create(
+            name='Available', description='Test', price=10.00, category=category, is_available=True
+        )
+        Product.objects.create(
+            name='Unavailable', description='Test', price=10.00, category=category, is_available=False
+        )
+        response = Client().get(reverse('core:home_async'))
+        assert response.status_code == 200
+        assert response.context['featured_products'] == [available]
+        assert response.context['is_admin'] is False
+
+
+class TestReplicaRouter:
+    """Test read-replica routing and read-your-writes pinning."""
+    
+    @pytest.fixture(autouse=True)
+    def replicas(self, settings):
+        settings.DATABASE_REPLICAS = ['replica_1']
+        reset_pinning()
+        yield
+        reset_pinning()
+    
+    def test_catalog_reads_use_replica(self):
+        """Test routed app reads go to a replica."""
+        router = ReplicaRouter()
+        assert router.db_for_read(Product) == 'replica_1'
+        assert router.db_for_read(Order) == 'replica_1'
+    
+    def test_other_reads_use_primary(self):
+        """Test auth and session reads stay on the primary."""
+        assert ReplicaRouter().db_for_read(User) == 'default'
+        assert ReplicaRouter().db_for_read(Session) == 'default'
+    
+    def test_write_pins_reads_to_primary(self):
+        """Test reads after a write in the same request use the primary."""
+        router = ReplicaRouter()
+        assert router.db_for_write(Order) == 'default'
+        assert router.db_for_read(Product) == 'default'
+    
+    def test_migrations_only_on_primary(self):
+        """Test replicas are never migrated directly."""
+        router = ReplicaRouter()
+        assert router.allow_migrate('default', 'orders') is True
+        assert router.allow_migrate('replica_1', 'orders') is False
+    
+    def test_middleware_sets_pin_cookie_after_write(self):
+        """Test a writing request pins the client's next requests."""
+        def view(request):
+            ReplicaRouter().db_for_write(Order)
+            return HttpResponse()
+        
+        response = ReplicaPinningMiddleware(view)(RequestFactory().post('/orders/checkout/'))
+        assert 'pin_primary' in response.cookies
+    
+    def test_middleware_honours_pin_cookie(self):
+        """Test a pinned client reads from the primary."""
+        seen = []
+        
+        def view(request):
+            seen.append(ReplicaRouter().db_for_read(Product))
+            return HttpResponse()
+        
+        factory = RequestFactory()
+        ReplicaPinningMiddleware(view)(factory.get('/products/'))
+        factory.cookies['pin_primary'] = '1'
+        response = ReplicaPinningMiddleware(view)(factory.get('/products/'))
+        assert seen == ['replica_1', 'default']
+        assert 'pin_primary' not in response.cookies
+
+
+@pytest.mark.django_db
+class TestRequestTimingMiddleware:
+    """Test per-request SQL and render instrumentation."""
+    
+    def test_server_timing_header(self):
+        """Test responses carry query count and timing breakdown."""
+        category = Category.objects.create(name='Test Category', slug='test-category')
+        Product.objects.create(name='Pizza', description='Test', price=10.00, category=category)
+        response = Client().get(reverse('core:home'))
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'view;dur=', 'total;dur='):
+            assert metric in header
+        assert '"2 queries"' in header
+    
+    def test_slow_request_logged_with_url_name(self, settings, caplog):
+        """Test requests over the thresholds are logged with their URL name."""
+        settings.PERF_SLOW_REQUEST_MS = 0
+        with caplog.at_level('WARNING', logger='pizzashop.performance'):
+            Client().get(reverse('products:product_list'))
+        record = caplog.records[-1].performance
+        assert record['url_name'] == 'products:product_list'
+        assert record['status'] == 200
+    
+    def test_template_detail_in_slow_request_log(self, settings, caplog):
+        """Test the log record breaks render time down by template, parent and block."""
+        settings.PERF_SLOW_REQUEST_MS = 0
+        with caplog.at_level('WARNING', logger='pizzashop.performance'):
+            Client().get(reverse('core:home'))
+        templates = caplog.records[-1].performance['templates']
+        assert {'template:core/home.html', 'extends:base.html', 'block:content'} <= set(templates)
+        assert templates['template:core/home.html'] >= templates['block:content']
+
+
+@pytest.mark.django_db
+class TestSeedPizzashopCommand:
+    """Test seed_pizzashop management command."""
+    
+    def _seed(self):
+        call_command(
+            'seed_pizzashop', categories=3, products=20, users=15, orders=60,
+            batch_size=25, seed=7, clear=True, stdout=StringIO(),
+        )
+        return list(Order.objects.order_by('id').values_list('customer__username', 'status', 'total_price'))
+    
+    def test_seed_creates_requested_volumes(self):
+        """Test seeded rows, profiles and consistent order totals."""
+        self._seed()
+        assert Category.objects.count() == 3
+        assert Product.objects.count() == 20
+        assert UserProfile.objects.filter(user__username__startswith='seed_').count() == 15
+        assert Order.objects.count() == 60
+        order = Order.objects.order_by('id').first()
+        assert order.items.exists()
+        assert order.total_price == sum(item.get_total() for item in order.items.all())
+        assert Order.objects.filter(created_at__lte=timezone.now()).count() == 60
+    
+    def test_seed_is_deterministic(self):
+        """Test the same seed produces the same data."""
+        assert self._seed() == self._seed()
+    
+    def test_seed_respects_archived_ids(self, customer_user):
+        """Test new orders start above archived ids and --clear empties the archive and rollups."""
+        now = timezone.now()
+        ArchivedOrder.objects.create(id=500, customer=customer_user, created_at=now, updated_at=now,
+                                     status='delivered', total_price=Decimal('9.99'))
+        call_command('seed_pizzashop', categories=1, products=2, users=1, orders=10, stdout=StringIO())
+        assert Order.objects.order_by('id').first().pk == 501
+        
+        HourlyStatusSales.objects.create(hour=now, status='paid', orders=1, revenue=Decimal('9.99'))
+        self._seed()
+        assert not ArchivedOrder.objects.exists()
+        assert not HourlyStatusSales.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestLoadtestCommand:
+    """Test the in-process load generator."""
+    
+    def test_loadtest_runs_full_funnel(self, tmp_path):
+        """Test every funnel step is exercised without errors."""
+        call_command('seed_pizzashop', categories=2, products=10, users=1, orders=0, stdout=StringIO())
+        report_path = tmp_path / 'report.json'
+        call_command(
+            'loadtest', concurrency=1, sessions=3, duration=0, seed=1,
+            json_path=str(report_path), stdout=StringIO(),
+        )
+        report = json.loads(report_path.read_text())
+        assert report['sessions'] == 3
+        assert report['error_rate'] == 0
+        assert set(report['steps']) == {
+            'home', 'product_list', 'category_filter', 'add_to_cart',
+            'update_cart', 'cart', 'checkout', 'order_detail',
+        }
+        assert Order.objects.count() == 3
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    """Test metrics recording and Prometheus exposition."""
+    
+    def test_metrics_endpoint_reports_requests(self):
+        """Test request latency and counts are exposed per URL name."""
+        client = Client()
+        client.get(reverse('core:home'))
+        response = client.get(reverse('core:metrics'))
+        body = response.content.decode()
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert '# TYPE pizzashop_http_request_duration_seconds histogram' in body
+        assert 'pizzashop_http_request_duration_seconds_bucket{url_name="core:home",method="GET",le="+Inf"}' in body
+        assert 'pizzashop_http_requests_total{url_name="core:home",method="GET",status="200"}' in body
+    
+    def test_metrics_token_required(self, settings):
+        """Test the endpoint can be protected with a bearer token."""
+        settings.METRICS_TOKEN = 'secret'
+        assert Client().get(reverse('core:metrics')).status_code == 403
+        response = Client().get(reverse('core:metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        assert response.status_code == 200
+    
+    def test_worker_snapshots_are_summed(self, settings, tmp_path):
+        """Test counters from other worker processes are aggregated."""
+        settings.METRICS_DIR = str(tmp_path)
+        key = json.dumps(['pizzashop_order_status_transitions_total', ['pending', 'paid']])
+        for pid in (101, 102):
+            (tmp_path / f'metrics-{pid}.json').write_text(json.dumps({'counters': {key: 2}, 'histograms': {}}))
+        metrics.ORDER_TRANSITIONS.inc('pending', 'paid')
+        
+        body = metrics.exposition()
+        
+        assert 'pizzashop_order_status_transitions_total{from_status="pending",to_status="paid"}' in body
+        line = next(l for l in body.splitlines() if l.startswith('pizzashop_order_status_transitions_total{'))
+        assert float(line.split()[-1]) >= 5
+    
+    def test_exited_threads_shards_are_retired(self):
+        """Test shards of finished threads are folded together without losing counts."""
+        counter = metrics.Counter('pizzashop_test_thread_total', 'Test counter.')
+        metrics.REGISTRY.remove(counter)
+        before = metrics.local_snapshot()['counters'].get(json.dumps(['pizzashop_test_thread_total', []]), 0)
+        for _ in range(50):
+            thread = threading.Thread(target=counter.inc)
+            thread.start()
+            thread.join()
+        
+        assert len(metrics._shards) <= threading.active_count() + 1
+        after = metrics.local_snapshot()['counters'][json.dumps(['pizzashop_test_thread_total', []])]
+        assert after - before == 50
+
+
+@pytest.mark.django_db
+class TestProfiling:
+    """Test on-demand request profiling."""
+    
+    @pytest.fixture(autouse=True)
+    def profiles_dir(self, settings, tmp_path):
+        settings.PROFILING_DIR = str(tmp_path)
+        return tmp_path
+    
+    def _client(self, role):
+        user = User.objects.create_user(username=role, password='testpass123')
+        user.profile.role = role
+        user.profile.save()
+        client = Client()
+        client.force_login(user)
+        return client
+    
+    def test_admin_request_is_profiled(self, profiles_dir):
+        """Test the query flag saves a profile named after the URL."""
+        client = self._client('admin')
+        response = client.get(reverse('core:home'), {'__profile': '1'})
+        name = response['X-Profile-File']
+        assert '-core.home-' in name
+        assert (profiles_dir / name).stat().st_size > 0
+        
+        listing = client.get(reverse('core:profile_list'))
+        assert listing.status_code == 200
+        assert name in listing.content.decode()
+        download = client.get(reverse('core:profile_download', args=[name]))
+        assert download.status_code == 200
+        assert b''.join(download.streaming_content) == (profiles_dir / name).read_bytes()
+    
+    def test_async_requests_are_profiled_without_sync_adaptation(self, profiles_dir, settings, caplog):
+        """Test the ASGI path stays async and still profiles flagged admin requests."""
+        # Django only logs middleware adaptation with DEBUG on.
+        settings.DEBUG = True
+        admin_user = User.objects.create_user(username='admin', password='testpass123')
+        admin_user.profile.role = 'admin'
+        admin_user.profile.save()
+        
+        async def view(request):
+            return HttpResponse()
+        
+        assert iscoroutinefunction(ProfilingMiddleware(view))
+        
+        async def request(params):
+            client = AsyncClient()
+            await client.aforce_login(admin_user)
+            return await client.get(reverse('core:home_async'), params)
+        
+        with caplog.at_level(logging.DEBUG, logger='django.request'):
+            assert 'X-Profile-File' not in async_to_sync(request)({})
+        assert 'adapted for middleware core.middleware.ProfilingMiddleware' not in caplog.text
+        name = async_to_sync(request)({'__profile': '1'})['X-Profile-File']
+        assert '-core.home_async-' in name
+        assert (profiles_dir / name).exists()
+    
+    def test_customer_and_unflagged_requests_are_not_profiled(self, profiles_dir):
+        """Test only flagged admin requests produce profiles."""
+        assert 'X-Profile-File' not in self._client('admin').get(reverse('core:home'))
+        response = self._client('customer').get(reverse('core:home'), HTTP_X_PROFILE='1')
+        assert 'X-Profile-File' not in response
+        assert list(profiles_dir.iterdir()) == []
+    
+    def test_old_profiles_are_pruned(self, settings, profiles_dir):
+        """Test only the newest PROFILING_KEEP profiles are kept."""
+        settings.PROFILING_KEEP = 2
+        for ts in (1000, 2000, 3000):
+            (profiles_dir / f'{ts}-core.home-5ms.prof').write_bytes(b'x')
+        self._client('admin').get(reverse('core:home'), HTTP_X_PROFILE='1')
+        names = sorted(p.name for p in profiles_dir.iterdir())
+        assert len(names) == 2
+        assert '3000-core.home-5ms.prof' in names
+
+
+@pytest.mark.django_db
+class TestMemoryProfiling:
+    """Test tracemalloc memory instrumentation."""
+    
+    @pytest.fixture(autouse=True)
+    def tracing(self, settings):
+        settings.MEMORY_PROFILING = True
+        settings.MEMORY_SNAPSHOT_SECONDS = 0
+        yield
+        tracemalloc.stop()
+        memory._reset_after_fork()
+    
+    def test_peaks_recorded_per_url_name(self):
+        """Test requests record their peak memory and snapshots diff by site."""
+        admin = User.objects.create_user(username='admin', password='testpass123')
+        admin.profile.role = 'admin'
+        admin.profile.save()
+        client = Client()
+        client.force_login(admin)
+        client.get(reverse('core:home'))
+        assert client.post(reverse('core:memory_report')).status_code == 302
+        client.post(reverse('core:memory_report'))
+        
+        report = memory.report()
+        assert report['tracing']
+        assert len(report['snapshots']) == 2
+        assert {row['url_name'] for row in report['peaks']} >= {'core:home', 'core:memory_report'}
+        assert next(row for row in report['peaks'] if row['url_name'] == 'core:home')['max_bytes'] > 0
+        response = client.get(reverse('core:memory_report'))
+        assert 'core:home' in response.content.decode()
+    
+    def test_async_requests_are_measured(self):
+        """Test the middleware measures async views without adapting the stack to sync."""
+        async def request():
+            return await AsyncClient().get(reverse('core:home_async'))
+        
+        assert async_to_sync(request)().status_code == 200
+        assert 'core:home_async' in {row['url_name'] for row in memory.report()['peaks']}
+    
+    def test_memory_replay_command(self, tmp_path):
+        """Test the replay command reports peaks for every URL in the mix."""
+        call_command('seed_pizzashop', categories=2, products=5, users=2, orders=10, stdout=StringIO())
+        mix_path = tmp_path / 'mix.json'
+        mix_path.write_text(json.dumps([
+            {'path': reverse('products:product_list'), 'as': 'customer', 'weight': 2},
+            {'path': reverse('orders:cart'), 'as': 'customer'},
+        ]))
+        report_path = tmp_path / 'memory.json'
+        
+        call_command('memory_replay', mix=str(mix_path), requests=20, seed=1,
+                     json_path=str(report_path), stdout=StringIO())
+        
+        report = json.loads(report_path.read_text())
+        assert report['errors'] == 0
+        assert set(report['routes']) == {'products:product_list', 'orders:cart'}
+        assert sum(route['requests'] for route in report['routes'].values()) == 20
+        assert report['routes']['orders:cart']['max_bytes'] > 0
+
+
+@pytest.mark.django_db
+class TestWarmup:
+    """Test worker warm-up and the readiness endpoint."""
+    
+    @pytest.fixture(autouse=True)
+    def cold_state(self, settings, monkeypatch):
+        settings.WARMUP_GC_FREEZE = False
+        monkeypatch.setattr(warmup, '_state', {
+            'ready': False, 'pid': None, 'duration_ms': None, 'steps': {}, 'errors': [], 'failing': [],
+        })
+    
+    def test_ready_after_warm_up(self):
+        """Test readiness is 503 until warm-up compiled templates and routes."""
+        Category.objects.create(name='Classic', slug='classic')
+        assert Client().get(reverse('core:ready')).status_code == 503
+        
+        warmup.warm_up()
+        
+        response = Client().get(reverse('core:ready'))
+        assert response.status_code == 200
+        assert response.json() == {'ready': True, 'failing': []}
+        steps = warmup._state['steps']
+        assert steps['templates']['count'] >= 10
+        assert steps['urls']['count'] >= 20
+        assert steps['queries']['count'] == 1
+    
+    def test_ready_names_failing_steps_only(self, monkeypatch):
+        """Test the public probe names a failed step without its error or the pid."""
+        def broken():
+            raise DatabaseError('no such table: products_category at /srv/pizzashop/db.sqlite3')
+        
+        monkeypatch.setattr(warmup, 'STEPS', (('urls', warmup.warm_urls), ('queries', broken)))
+        warmup.warm_up()
+        
+        response = Client().get(reverse('core:ready'))
+        assert response.json() == {'ready': True, 'failing': ['queries']}
+        assert b'products_category' not in response.content
+        assert warmup._state['errors'] == ['queries: no such table: products_category at /srv/pizzashop/db.sqlite3']
+    
+    def test_ready_when_disabled(self, settings):
+        """Test readiness does not wait for a disabled warm-up."""
+        settings.WARMUP_ENABLED = False
+        assert Client().get(reverse('core:ready')).status_code == 200
+
+
+class TestStaticFiles:
+    """Test hashed, precompressed static files and their caching headers."""
+    
+    @pytest.fixture
+    def collected(self, settings, tmp_path):
+        settings.STATIC_ROOT = tmp_path
+        settings.STORAGES = {
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage'},
+        }
+        call_command('collectstatic', interactive=False, verbosity=0)
+        return tmp_path
+    
+    def test_collectstatic_writes_hashed_and_gzip_files(self, collected):
+        """Test vendored assets get hashed names, rewritten references and .gz copies."""
+        manifest = json.loads((collected / 'staticfiles.json').read_text())['paths']
+        css = manifest['vendor/icons/icons.css']
+        assert css != 'vendor/icons/icons.css'
+        assert (collected / f'{manifest["vendor/bootstrap/css/bootstrap.min.css"]}.gz').exists()
+        assert manifest['vendor/icons/cart.svg'].rsplit('/', 1)[1] in (collected / css).read_text()
+    
+    def test_hashed_files_served_immutable_and_gzipped(self, collected):
+        """Test the middleware serves the .gz copy with far-future caching."""
+        name = json.loads((collected / 'staticfiles.json').read_text())['paths']['vendor/bootstrap/js/bootstrap.bundle.min.js']
+        url = f'/static/{name}'
+        response = Client().get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        assert response.status_code == 200
+        assert response['Content-Encoding'] == 'gzip'
+        assert response['Cache-Control'] == 'public, max-age=31536000, immutable'
+        assert response['Vary'] == 'Accept-Encoding'
+        assert int(response['Content-Length']) == (collected / f'{name}.gz').stat().st_size
+        
+        plain = Client().get(url)
+        assert 'Content-Encoding' not in plain
+        assert b''.join(plain.streaming_content) == (collected / name).read_bytes()
+        assert Client().get(url, HTTP_IF_NONE_MATCH=plain['ETag']).status_code == 304
+    
+    def test_unhashed_names_must_revalidate(self, collected):
+        """Test original names are not cached as immutable."""
+        response = Client().get('/static/vendor/icons/icons.css')
+        assert response.status_code == 200
+        assert response['Cache-Control'] == 'public, no-cache'
+    
+    @pytest.mark.django_db
+    def test_asgi_stack_is_not_adapted_to_sync(self, collected, settings, caplog):
+        """Test static files and async views are served without a sync middleware in the chain."""
+        # Django only logs middleware adaptation with DEBUG on.
+        settings.DEBUG = True
+        
+        async def requests():
+            client = AsyncClient()
+            return await client.get('/static/vendor/icons/icons.css'), await client.get(reverse('core:home_async'))
+        
+        with caplog.at_level(logging.DEBUG, logger='django.request'):
+            static, page = async_to_sync(requests)()
+        assert static.status_code == 200
+        assert static['Cache-Control'] == 'public, no-cache'
+        assert page.status_code == 200
+        # Django adapts before instantiating, so this covers disabled middleware too.
+        assert 'adapted for middleware' not in caplog.text
+
+
+@pytest.mark.django_db
+class TestCompressionMiddleware:
+    """Test gzip compression of HTML and JSON responses."""
+    
+    def test_large_html_is_compressed(self):
+        """Test pages above the threshold are gzipped for clients that accept it."""
+        response = Client().get(reverse('products:product_list'), HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response['Vary']
+        assert b'</html>' in gzip.decompress(response.content)
+    
+    def test_small_and_unaccepted_responses_are_not_compressed(self, settings):
+        """Test the size threshold and Accept-Encoding are honoured."""
+        assert 'Content-Encoding' not in Client().get(reverse('products:product_list'))
+        settings.COMPRESSION_MIN_SIZE = 10 ** 6
+        response = Client().get(reverse('products:product_list'), HTTP_ACCEPT_ENCODING='gzip')
+        assert 'Content-Encoding' not in response
+
+
+class TestPubSub:
+    """Test the in-process pub/sub fan-out."""
+    
+    def test_publish_from_another_thread(self):
+        """Test subscribers on an event loop receive messages published from worker threads."""
+        backend = pubsub.LocalBackend()
+        
+        async def scenario():
+            with backend.subscribe('order:1') as subscription, backend.subscribe('order:2') as other:
+                assert backend.subscriber_count() == 2
+                thread = threading.Thread(target=backend.publish, args=('order:1', {'status': 'paid'}))
+                thread.start()
+                thread.join()
+                assert await subscription.get(timeout=1) == {'status': 'paid'}
+                with pytest.raises(TimeoutError):
+                    await other.get(timeout=0.01)
+            return backend.subscriber_count()
+        
+        assert asyncio.run(scenario()) == 0
+    
+    def test_slow_subscriber_keeps_latest(self):
+        """Test a full queue drops the oldest message instead of growing."""
+        backend = pubsub.LocalBackend()
+        
+        async def scenario():
+            with backend.subscribe('order:1') as subscription:
+                for n in range(pubsub.QUEUE_SIZE + 3):
+                    backend.publish('order:1', n)
+                await asyncio.sleep(0)
+                return [await subscription.get(timeout=1) for _ in range(pubsub.QUEUE_SIZE)]
+        
+        assert asyncio.run(scenario()) == list(range(3, pubsub.QUEUE_SIZE + 3))
+
+
+@pytest.mark.django_db
+class TestAdminChangelistHelpers:
+    """Test the estimated-count paginator and indexed admin search."""
+    
+    @pytest.fixture
+    def orders(self, customer_user, admin_user):
+        return [Order.objects.create(customer=user) for user in (customer_user, admin_user, customer_user)]
+    
+    def test_estimated_count_skips_count_query(self, orders, settings):
+        """Test unfiltered changelists use the planner estimate once statistics exist."""
+        settings.ADMIN_ESTIMATED_COUNT_MIN = 2
+        assert estimated_rows(Order) is None
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        assert estimated_rows(Order) == 3
+        
+        with CaptureQueriesContext(connection) as queries:
+            assert EstimatedCountPaginator(Order.objects.all(), 10).count == 3
+        assert not any('COUNT(' in query['sql'] for query in queries)
+        # Filtered lists, and small tables, are counted exactly.
+        assert EstimatedCountPaginator(Order.objects.filter(status='paid'), 10).count == 0
+        settings.ADMIN_ESTIMATED_COUNT_MIN = 10
+        with CaptureQueriesContext(connection) as queries:
+            assert EstimatedCountPaginator(Order.objects.all(), 10).count == 3
+        assert any('COUNT(' in query['sql'] for query in queries)
+    
+    def test_search_is_exact_or_prefix(self, orders):
+        """Test order search matches ids exactly and usernames by prefix, never by substring."""
+        model_admin = admin.site._registry[Order]
+        
+        def search(term):
+            queryset, _ = model_admin.get_search_results(None, Order.objects.all(), term)
+            return sorted(order.pk for order in queryset)
+        
+        assert search(str(orders[1].pk)) == [orders[1].pk]
+        assert search(f'#{orders[2].pk}') == [orders[2].pk]
+        assert search('cust') == [orders[0].pk, orders[2].pk]
+        assert search('ustomer') == []
+        
+        with CaptureQueriesContext(connection) as queries:
+            search('cust')
+        assert 'CAST' not in queries[0]['sql']
+
+
+@pytest.mark.django_db
+class TestLoadShedding:
+    """Test route classes, pressure and shedding of low-priority requests."""
+    
+    @pytest.fixture(autouse=True)
+    def tracker(self, settings):
+        settings.LOAD_SHEDDING_MAX_IN_FLIGHT = 10
+        settings.LOAD_SHEDDING_QUEUE_TARGET_MS = 250
+        settings.LOAD_SHEDDING_SHED_AT = {'browse': 0.6, 'admin': 0.8, 'auth': 0.9}
+        loadshed.tracker.reset()
+        cache.clear()
+        yield loadshed.tracker
+        loadshed.tracker.reset()
+        cache.clear()
+    
+    def test_route_classes(self):
+        """Test URL names map to checkout, auth, admin and browse, with health and streams untracked."""
+        assert loadshed.route_class('orders:checkout') == 'checkout'
+        assert loadshed.route_class('orders:order_detail') == 'checkout'
+        assert loadshed.route_class('orders:kitchen_queue') == 'admin'
+        assert loadshed.route_class('orders:update_order_status') == 'admin'
+        assert loadshed.route_class('products:product_update') == 'admin'
+        assert loadshed.route_class('admin:index') == 'admin'
+        assert loadshed.route_class('accounts:login') == 'auth'
+        assert loadshed.route_class('products:product_list') == 'browse'
+        assert loadshed.route_class('<unresolved>') == 'browse'
+        assert loadshed.route_class('core:ready') is None
+        assert loadshed.route_class('orders:order_events') is None
+    
+    def test_queue_seconds_units(self):
+        """Test X-Request-Start is read in seconds, milliseconds or microseconds, and implausible values dropped."""
+        now = 1_700_000_000.0
+        assert loadshed.queue_seconds('t=1699999999.5', now=now) == pytest.approx(0.5)
+        assert loadshed.queue_seconds('1699999999750', now=now) == pytest.approx(0.25)
+        assert loadshed.queue_seconds('t=1699999999900000', now=now) == pytest.approx(0.1)
+        assert loadshed.queue_seconds('t=1700000001', now=now) is None
+        assert loadshed.queue_seconds('t=1', now=now) is None
+        assert loadshed.queue_seconds('soon', now=now) is None
+        assert loadshed.queue_seconds(None, now=now) is None
+    
+    def test_in_flight_pressure_sheds_browsing_not_checkout(self, tracker, customer_user, product):
+        """Test browsing gets a 503 with Retry-After while checkout requests are still served."""
+        for _ in range(7):
+            tracker.admit('checkout')
+        
+        response = Client().get(reverse('products:product_list'))
+        assert response.status_code == 503
+        assert response['Retry-After'] == '5'
+        assert response['Cache-Control'] == 'no-store'
+        assert response['X-Load-Shed'] == 'shed'
+        
+        client = Client()
+        client.login(username='customer', password='testpass123')
+        assert client.get(reverse('orders:cart')).status_code == 200
+        # Below its own level auth is still admitted; every admitted request is released.
+        assert client.get(reverse('accounts:profile')).status_code == 200
+        assert tracker.in_flight == {'checkout': 7, 'auth': 0, 'admin': 0, 'browse': 0}
+        
+        body = metrics.exposition()
+        assert 'pizzashop_load_shed_decisions_total{route_class="browse",decision="shed"}' in body
+        assert 'pizzashop_load_shed_decisions_total{route_class="checkout",decision="admitted"}' in body
+        assert 'pizzashop_http_requests_total{url_name="products:product_list",method="GET",status="503"}' in body
+    
+    def test_busy_sync_workers_shed_browsing(self, tracker, settings, monkeypatch):
+        """Test with gunicorn.conf.py's sync workers, requests busy in other workers shed browsing."""
+        monkeypatch.setenv('WEB_CONCURRENCY', '3')
+        monkeypatch.setenv('LOAD_SHEDDING_MAX_IN_FLIGHT', '')
+        monkeypatch.delenv('LOAD_SHEDDING_MAX_IN_FLIGHT')
+        conf = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        # Sync workers, one request each.
+        assert conf['workers'] == 3 and 'worker_class' not in conf and 'threads' not in conf
+        settings.LOAD_SHEDDING_MAX_IN_FLIGHT = int(os.environ['LOAD_SHEDDING_MAX_IN_FLIGHT'])
+        
+        workers = []
+        for _ in range(2):
+            ready, done = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    # A worker busy with a checkout until it is killed.
+                    tracker.admit('checkout')
+                    os.write(done, b'.')
+                    time.sleep(60)
+                finally:
+                    os._exit(0)
+            os.read(ready, 1)
+            workers.append(pid)
+        try:
+            assert tracker.in_flight['checkout'] == 2
+            assert Client().get(reverse('products:product_list')).status_code == 503
+            assert Client().get(reverse('orders:cart')).status_code == 302
+            
+            # A worker killed mid-request is dropped by the master's child_exit hook.
+            os.kill(workers[0], signal.SIGKILL)
+            os.waitpid(workers[0], 0)
+            conf['child_exit'](None, SimpleNamespace(pid=workers[0]))
+            assert tracker.in_flight['checkout'] == 1
+            assert Client().get(reverse('products:product_list')).status_code == 200
+        finally:
+            for pid in workers[1:]:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+    
+    def test_queue_latency_raises_pressure(self, tracker, settings):
+        """Test requests that keep waiting long in a trusted proxy's queue push pressure up."""
+        settings.LOAD_SHEDDING_TRUST_REQUEST_START = True
+        waited = f't={timezone.now().timestamp() - 2:.3f}'
+        shed = [Client().get(reverse('core:home'), HTTP_X_REQUEST_START=waited).get('X-Load-Shed') for _ in range(3)]
+        # Samples count for at most twice the 250ms target, a fifth at a time: 100ms, then 180ms.
+        assert shed == [None, 'cached', 'cached']
+        assert tracker.snapshot()['queue_ms']['browse'] == pytest.approx(244, abs=5)
+        # Checkout is admitted (and sends the anonymous visitor on to log in).
+        assert Client().get(reverse('orders:cart')).status_code == 302
+        assert 'pizzashop_request_queue_seconds_bucket{route_class="browse",le="+Inf"}' in metrics.exposition()
+    
+    def test_forged_request_start_does_not_shed(self, tracker, settings):
+        """Test a client-sent X-Request-Start is ignored by default and implausible values never count."""
+        forged = 't=1'
+        Client().get(reverse('core:home'), HTTP_X_REQUEST_START=forged)
+        Client().get(reverse('core:home'), HTTP_X_REQUEST_START=f't={timezone.now().timestamp() - 10:.3f}')
+        assert tracker.pressure() == 0
+        
+        settings.LOAD_SHEDDING_TRUST_REQUEST_START = True
+        for _ in range(5):
+            Client().get(reverse('core:home'), HTTP_X_REQUEST_START=forged)
+        assert tracker.pressure() == 0
+        assert [Client().get(reverse('core:home')).get('X-Load-Shed') for _ in range(20)] == [None] * 20
+    
+    def test_anonymous_catalog_served_from_cache(self, tracker, customer_user, product,
+                                                django_capture_on_commit_callbacks):
+        """Test a shed anonymous catalog page is answered with the last normal copy."""
+        fresh = Client().get(reverse('products:product_list'))
+        assert fresh.status_code == 200
+        for _ in range(7):
+            tracker.admit('checkout')
+        
+        response = Client().get(reverse('products:product_list'))
+        assert response.status_code == 200
+        assert response['X-Load-Shed'] == 'cached'
+        assert response.content == fresh.content
+        # No copy of other pages, and signed-in customers are never sent someone else's page.
+        assert Client().get(reverse('products:product_list') + '?page=2').status_code == 503
+        client = Client()
+        client.login(username='customer', password='testpass123')
+        assert client.get(reverse('products:product_list')).status_code == 503
+        # Changing the catalog retires the copies.
+        with django_capture_on_commit_callbacks(execute=True):
+            product.save()
+        assert Client().get(reverse('products:product_list')).status_code == 503
+
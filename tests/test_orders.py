@@ -1,10 +1,25 @@
+import asyncio
+import csv
 import pytest
+import threading
+import time
+from asgiref.sync import async_to_sync
+from datetime import timedelta
+from io import StringIO
 from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.test import Client
+from django.utils import timezone
+from django.test import AsyncClient, Client
 from decimal import Decimal
 from products.models import Category, Product
-from orders.models import Order, OrderItem
+from core import pubsub
+from orders import archive, export, kitchen, rollups, sse, transitions
+from orders.models import ArchivedOrder, DailyProductSales, HourlyStatusSales, Order, OrderItem
 from accounts.models import UserProfile
 
 
@@ -312,3 +327,653 @@ class TestOrderViews:
         assert response.context['order'] == order
 
 
+
+
+@pytest.mark.django_db
+class TestAsyncOrderViews:
+    """Test async read views for orders."""
+    
+    @pytest.fixture
+    def client(self):
+        return Client()
+    
+    @pytest.fixture
+    def order(self, customer_user, product):
+        order = Order.objects.create(customer=customer_user)
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+        return order
+    
+    def test_order_list_async(self, client, order):
+        """Test async order list shows the customer's orders."""
+        client.login(username='customer', password='testpass123')
+        response = client.get(reverse('orders:order_list_async'))
+        assert response.status_code == 200
+        assert response.context['orders'] == [order]
+    
+    def test_order_detail_async(self, client, order):
+        """Test async order detail view for the owner."""
+        client.login(username='customer', password='testpass123')
+        response = client.get(reverse('orders:order_detail_async', args=[order.id]))
+        assert response.status_code == 200
+        assert response.context['order'] == order
+    
+    def test_order_detail_async_other_customer(self, client, order):
+        """Test async order detail redirects other customers."""
+        User.objects.create_user(username='other', password='testpass123')
+        client.login(username='other', password='testpass123')
+        response = client.get(reverse('orders:order_detail_async', args=[order.id]))
+        assert response.status_code == 302
+    
+    def test_order_detail_async_requires_login(self, client, order):
+        """Test async order detail requires authentication."""
+        response = client.get(reverse('orders:order_detail_async', args=[order.id]))
+        assert response.status_code == 302
+        assert reverse('accounts:login') in response.url
+
+
+@pytest.mark.django_db
+class TestAdminOrderList:
+    """Test the admin order list."""
+    
+    @pytest.fixture
+    def client(self, admin_user):
+        client = Client()
+        client.login(username='admin', password='admin123')
+        return client
+    
+    def _add_orders(self, customer, count):
+        Order.objects.bulk_create([Order(customer=customer, total_price=Decimal('19.98')) for _ in range(count)])
+    
+    def test_single_shared_status_dialog(self, client, customer_user):
+        """Test every row opens the same dialog instead of rendering its own."""
+        self._add_orders(customer_user, 3)
+        content = client.get(reverse('orders:admin_order_list')).content.decode()
+        assert content.count('class="modal fade"') == 1
+        assert content.count('data-bs-target="#statusModal"') == 3
+        assert reverse('orders:update_order_status', args=[0]) in content
+    
+    def test_bytes_per_row(self, client, customer_user):
+        """Test each extra order adds a compact row to the page."""
+        url = reverse('orders:admin_order_list')
+        self._add_orders(customer_user, 1)
+        small = len(client.get(url).content)
+        self._add_orders(customer_user, 20)
+        large = len(client.get(url).content)
+        assert (large - small) / 20 < 600
+
+
+@pytest.mark.django_db
+class TestSalesRollups:
+    """Test the incrementally maintained sales rollups."""
+    
+    @pytest.fixture
+    def client(self, admin_user):
+        client = Client()
+        client.login(username='admin', password='admin123')
+        return client
+    
+    def _checkout(self, user, product, quantity):
+        client = Client()
+        client.force_login(user)
+        session = client.session
+        session['cart'] = {str(product.pk): {'quantity': quantity, 'price': str(product.price), 'name': product.name}}
+        session.save()
+        client.post(reverse('orders:checkout'))
+        return Order.objects.filter(customer=user).latest('id')
+    
+    def test_checkout_reserves_stock(self, customer_user, product):
+        """Test checkout takes stock, drops lines that cannot be filled and cancelling restocks."""
+        Product.objects.filter(pk=product.pk).update(stock=3)
+        client = Client()
+        client.force_login(customer_user)
+        session = client.session
+        session['cart'] = {str(product.pk): {'quantity': 4, 'price': str(product.price), 'name': product.name}}
+        session.save()
+        response = client.post(reverse('orders:checkout'))
+        # Nothing could be filled: no order, and the cart is kept.
+        assert response.url == reverse('orders:cart')
+        assert not Order.objects.filter(customer=customer_user).exists()
+        assert client.session['cart'] == session['cart']
+        order = self._checkout(customer_user, product, 3)
+        product.refresh_from_db()
+        assert order.items.get().quantity == 3
+        assert (product.stock, product.is_available) == (0, False)
+        
+        transitions.apply({order.pk: 'cancelled'})
+        product.refresh_from_db()
+        assert (product.stock, product.is_available) == (3, True)
+    
+    def _snapshot(self):
+        daily = set(DailyProductSales.objects.filter(units__gt=0).values_list('day', 'product_id', 'category_id', 'units', 'revenue'))
+        hourly = set(HourlyStatusSales.objects.filter(orders__gt=0).values_list('hour', 'status', 'orders', 'revenue'))
+        return daily, hourly
+    
+    def test_checkout_updates_rollups(self, customer_user, product):
+        """Test placing orders adds to the day/product and hour/status buckets."""
+        self._checkout(customer_user, product, 2)
+        self._checkout(customer_user, product, 1)
+        daily = DailyProductSales.objects.get(product=product)
+        assert daily.units == 3
+        assert daily.revenue == Decimal('38.97')
+        assert daily.category_id == product.category_id
+        hourly = HourlyStatusSales.objects.get(status='pending')
+        assert hourly.orders == 2
+        assert hourly.revenue == Decimal('38.97')
+    
+    def test_status_changes_move_buckets(self, client, customer_user, product):
+        """Test status updates move the order between statuses and cancellations drop its items."""
+        order = self._checkout(customer_user, product, 2)
+        url = reverse('orders:update_order_status', args=[order.pk])
+        client.post(url, {'status': 'paid'})
+        assert dict(HourlyStatusSales.objects.values_list('status', 'orders')) == {'pending': 0, 'paid': 1}
+        client.post(url, {'status': 'cancelled'})
+        assert DailyProductSales.objects.get(product=product).units == 0
+        rollups.record_transition(order, 'cancelled', 'delivered')
+        assert DailyProductSales.objects.get(product=product).units == 2
+        assert HourlyStatusSales.objects.get(status='delivered').orders == 1
+    
+    def test_admin_added_order_updates_rollups(self, customer_user, product):
+        """Test an order added in the Django admin is counted with its inline items."""
+        staff = User.objects.create_superuser('staff', password='staffpass123')
+        client = Client()
+        client.force_login(staff)
+        response = client.post(reverse('admin:orders_order_add'), {
+            'customer': customer_user.pk, 'status': 'paid', 'total_price': '25.98',
+            'items-TOTAL_FORMS': 1, 'items-INITIAL_FORMS': 0,
+            'items-0-product': product.pk, 'items-0-quantity': 2, 'items-0-price': '12.99',
+        })
+        assert response.status_code == 302
+        daily = DailyProductSales.objects.get(product=product)
+        assert (daily.units, daily.revenue) == (2, Decimal('25.98'))
+        hourly = HourlyStatusSales.objects.get(status='paid')
+        assert (hourly.orders, hourly.revenue) == (1, Decimal('25.98'))
+    
+    def test_rebuild_matches_incremental(self, client, customer_user, product):
+        """Test the chunked rebuild command reproduces the incrementally maintained rows."""
+        for quantity in (1, 2, 3):
+            order = self._checkout(customer_user, product, quantity)
+        client.post(reverse('orders:update_order_status', args=[order.pk]), {'status': 'cancelled'})
+        incremental = self._snapshot()
+        
+        DailyProductSales.objects.all().delete()
+        HourlyStatusSales.objects.all().delete()
+        call_command('rebuild_sales_rollups', batch_size=2, stdout=StringIO())
+        assert self._snapshot() == incremental
+    
+    def test_dashboard_reads_rollups(self, client, customer_user, product):
+        """Test the dashboard shows rollup rows and is admin only."""
+        self._checkout(customer_user, product, 2)
+        response = client.get(reverse('orders:sales_dashboard'), {'days': 7})
+        assert response.status_code == 200
+        assert product.name in response.content.decode()
+        assert response.context['summary']['units'] == 2
+        
+        customer = Client()
+        customer.force_login(customer_user)
+        assert customer.get(reverse('orders:sales_dashboard')).status_code == 302
+
+
+@pytest.mark.django_db
+class TestOrderExport:
+    """Test the streaming CSV export."""
+    
+    @pytest.fixture
+    def client(self, admin_user):
+        client = Client()
+        client.login(username='admin', password='admin123')
+        return client
+    
+    @pytest.fixture
+    def orders(self, customer_user, product):
+        paid = Order.objects.create(customer=customer_user, status='paid', total_price=Decimal('25.98'))
+        OrderItem.objects.create(order=paid, product=product, quantity=2, price=Decimal('12.99'))
+        empty = Order.objects.create(customer=customer_user, status='pending')
+        return paid, empty
+    
+    def _rows(self, response):
+        assert response.streaming
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+    
+    def test_streams_orders_and_items(self, client, orders):
+        """Test the export streams a header, one row per line item and item-less orders."""
+        paid, empty = orders
+        response = client.get(reverse('orders:export_orders'))
+        assert response['Content-Type'] == 'text/csv'
+        rows = self._rows(response)
+        assert rows[0] == export.HEADER
+        assert [row[0] for row in rows[1:]] == [str(paid.pk), str(empty.pk)]
+        assert rows[1][8:] == ['2', '12.99', '25.98']
+        assert rows[2][5:] == [''] * 6
+    
+    def test_filters(self, client, orders):
+        """Test status and date filters, and rejection of bad values."""
+        url = reverse('orders:export_orders')
+        assert len(self._rows(client.get(url, {'status': 'paid'}))) == 2
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        assert len(self._rows(client.get(url, {'start': tomorrow}))) == 1
+        assert client.get(url, {'start': 'yesterday'}).status_code == 400
+        assert client.get(url, {'status': 'lost'}).status_code == 400
+    
+    def test_asgi_streams_without_buffering(self, client, orders, admin_user, recwarn):
+        """Test under ASGI the export is an async stream with the same CSV as under WSGI."""
+        url = reverse('orders:export_orders')
+        
+        async def scenario():
+            async_client = AsyncClient()
+            await async_client.aforce_login(admin_user)
+            response = await async_client.get(url)
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+        
+        response, body = async_to_sync(scenario)()
+        assert response.is_async
+        assert body == b''.join(client.get(url).streaming_content)
+        assert not [w for w in recwarn if 'synchronous iterators' in str(w.message)]
+    
+    def test_formula_cells_are_escaped(self, client, customer_user, category):
+        """Test text cells that spreadsheets would evaluate are prefixed with an apostrophe."""
+        product = Product.objects.create(name='=HYPERLINK("http://x")', category=category, price=Decimal('9.99'))
+        order = Order.objects.create(customer=customer_user, status='paid', total_price=Decimal('9.99'))
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=Decimal('9.99'))
+        rows = self._rows(client.get(reverse('orders:export_orders')))
+        assert rows[1][7] == '\'=HYPERLINK("http://x")'
+        assert rows[1][3] == 'customer'
+    
+    def test_command_matches_view(self, client, orders, tmp_path):
+        """Test the management command writes the same CSV as the endpoint."""
+        path = tmp_path / 'orders.csv'
+        call_command('export_orders', output=str(path), status='paid,pending', stderr=StringIO())
+        response = client.get(reverse('orders:export_orders'), {'status': 'paid,pending'})
+        assert path.read_bytes() == b''.join(response.streaming_content)
+
+
+@pytest.mark.django_db
+class TestOrderArchive:
+    """Test archival of finished orders."""
+    
+    @pytest.fixture
+    def orders(self, customer_user, product):
+        """Old delivered, old pending and recent delivered orders, plus a newest one."""
+        created = {}
+        for name, status, age in [('old_delivered', 'delivered', 400), ('old_pending', 'pending', 400),
+                                  ('recent_delivered', 'delivered', 10), ('newest', 'cancelled', 400)]:
+            order = Order.objects.create(customer=customer_user, status=status, total_price=Decimal('25.98'))
+            OrderItem.objects.create(order=order, product=product, quantity=2, price=Decimal('12.99'))
+            Order.objects.filter(pk=order.pk).update(updated_at=timezone.now() - timedelta(days=age))
+            created[name] = order
+        return created
+    
+    def test_archives_old_finished_orders(self, orders):
+        """Test only old delivered/cancelled orders move, items included, and never the newest id."""
+        moved, _ = archive.archive_orders(archive.cutoff(180), batch_size=1)
+        assert moved == 1
+        old = orders['old_delivered']
+        assert not Order.objects.filter(pk=old.pk).exists()
+        assert not OrderItem.objects.filter(order_id=old.pk).exists()
+        archived = ArchivedOrder.objects.get(pk=old.pk)
+        assert archived.status == 'delivered'
+        assert archived.items.get().get_total() == Decimal('25.98')
+        assert set(Order.objects.values_list('pk', flat=True)) == {
+            orders['old_pending'].pk, orders['recent_delivered'].pk, orders['newest'].pk,
+        }
+    
+    def test_views_reach_archived_orders(self, orders, customer_user):
+        """Test order list and detail still show archived orders."""
+        call_command('archive_orders', days=180, sleep=0, stdout=StringIO())
+        old = orders['old_delivered']
+        client = Client()
+        client.force_login(customer_user)
+        response = client.get(reverse('orders:order_detail', args=[old.pk]))
+        assert response.status_code == 200
+        assert response.context['order'].is_archived
+        ids = [order.pk for order in client.get(reverse('orders:order_list')).context['orders']]
+        assert ids.count(old.pk) == 1 and len(ids) == 4
+        assert client.get(reverse('orders:order_detail', args=[9999])).status_code == 404
+    
+    def test_rollups_and_export_include_archive(self, client, orders):
+        """Test rebuilding rollups and exporting still count archived orders."""
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        before = DailyProductSales.objects.aggregate(units=Sum('units'))['units']
+        archive.archive_orders(archive.cutoff(180))
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        assert DailyProductSales.objects.aggregate(units=Sum('units'))['units'] == before
+        output = StringIO()
+        call_command('export_orders', stdout=output)
+        assert len(output.getvalue().splitlines()) == 5
+
+
+@pytest.mark.django_db
+class TestStatusTransitions:
+    """Test the order status state machine and bulk transitions."""
+    
+    @pytest.fixture
+    def client(self, admin_user):
+        client = Client()
+        client.login(username='admin', password='admin123')
+        return client
+    
+    def _orders(self, customer, *statuses):
+        return [Order.objects.create(customer=customer, status=status, total_price=Decimal('10.00')) for status in statuses]
+    
+    def test_state_machine(self):
+        """Test allowed and forbidden moves."""
+        assert transitions.can_transition('pending', 'paid')
+        assert transitions.can_transition('paid', 'delivered')
+        assert not transitions.can_transition('delivered', 'pending')
+        assert not transitions.can_transition('cancelled', 'paid')
+        assert sorted(transitions.sources('delivered')) == ['paid', 'pending']
+    
+    def test_bulk_endpoint_reports_per_order(self, client, customer_user):
+        """Test one UPDATE moves every eligible order and each order gets a result."""
+        pending, paid, cancelled = self._orders(customer_user, 'pending', 'paid', 'cancelled')
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post(reverse('orders:bulk_update_order_status'), {
+                'status': 'delivered', 'order_ids': [pending.pk, paid.pk, cancelled.pk, 9999],
+            })
+        assert response.status_code == 200
+        data = response.json()
+        assert data['updated'] == 2
+        assert data['results'] == {
+            str(pending.pk): {'result': 'updated', 'status': 'delivered'},
+            str(paid.pk): {'result': 'updated', 'status': 'delivered'},
+            str(cancelled.pk): {'result': 'invalid', 'status': 'cancelled'},
+            '9999': {'result': 'not_found', 'status': None},
+        }
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "orders_order"')]
+        assert len(updates) == 1
+        assert set(Order.objects.values_list('status', flat=True)) == {'delivered', 'cancelled'}
+    
+    def test_bulk_endpoint_validation(self, client, customer_user):
+        """Test bad input is rejected and only POST is accepted."""
+        url = reverse('orders:bulk_update_order_status')
+        assert client.post(url, {'status': 'lost', 'order_ids': [1]}).status_code == 400
+        assert client.post(url, {'status': 'paid', 'order_ids': ['x']}).status_code == 400
+        assert client.post(url, {'status': 'paid'}).status_code == 400
+        assert client.get(url).status_code == 405
+    
+    def test_single_update_rejects_invalid_transition(self, client, customer_user):
+        """Test update_order_status no longer accepts any status from any status."""
+        order, = self._orders(customer_user, 'cancelled')
+        client.post(reverse('orders:update_order_status', args=[order.pk]), {'status': 'paid'})
+        order.refresh_from_db()
+        assert order.status == 'cancelled'
+    
+    def test_admin_action(self, customer_user):
+        """Test the Django admin bulk action applies the state machine."""
+        staff = User.objects.create_superuser('staff', password='staffpass123')
+        pending, delivered = self._orders(customer_user, 'pending', 'delivered')
+        client = Client()
+        client.force_login(staff)
+        response = client.post(reverse('admin:orders_order_changelist'), {
+            'action': 'mark_paid', '_selected_action': [pending.pk, delivered.pk],
+        }, follow=True)
+        assert response.status_code == 200
+        assert dict(Order.objects.values_list('pk', 'status')) == {pending.pk: 'paid', delivered.pk: 'delivered'}
+        assert f'#{delivered.pk}' in response.content.decode()
+
+
+
+@pytest.mark.django_db
+class TestOrderEvents:
+    """Test live order status over server-sent events."""
+    
+    @pytest.fixture
+    def order(self, customer_user):
+        return Order.objects.create(customer=customer_user, total_price=Decimal('10.00'))
+    
+    def test_stream_pushes_changes_until_final(self, order, settings):
+        """Test the ASGI stream sends the current status, keep-alives and changes, then ends."""
+        settings.SSE_HEARTBEAT_SECONDS = 0.01
+        backend = pubsub.get_backend()
+        
+        async def scenario():
+            stream = sse.status_stream(order)
+            frames = [await stream.__anext__(), await stream.__anext__()]
+            backend.publish(transitions.channel(order.pk), transitions.event(order.pk, 'delivered'))
+            frames.append(await stream.__anext__())
+            with pytest.raises(StopAsyncIteration):
+                await stream.__anext__()
+            return frames
+        
+        current, keep_alive, delivered = async_to_sync(scenario)()
+        assert current.startswith('retry: ') and 'event: status' in current and '"status": "pending"' in current
+        assert keep_alive == ': keep-alive\n\n'
+        assert '"final": true' in delivered
+        assert backend.subscriber_count() == 0
+    
+    def test_asgi_stream_runs_through_django(self, order, customer_user, settings):
+        """Test the async view streams under ASGI behind the full middleware stack."""
+        settings.SSE_HEARTBEAT_SECONDS = 60
+        url = reverse('orders:order_events', args=[order.pk])
+        
+        async def scenario():
+            client = AsyncClient()
+            await client.aforce_login(customer_user)
+            response = await client.get(url)
+            chunks = []
+            async for chunk in response.streaming_content:
+                chunks.append(chunk)
+                if len(chunks) == 1:
+                    pubsub.publish(transitions.channel(order.pk), transitions.event(order.pk, 'delivered'))
+            refused = [
+                await AsyncClient().get(url),
+                await client.get(reverse('orders:order_events', args=[order.pk + 100])),
+                await client.get(url, headers={'host': 'evil.example'}),
+            ]
+            return response, b''.join(chunks).decode(), refused
+        
+        response, body, refused = async_to_sync(scenario)()
+        assert response['Content-Type'] == 'text/event-stream'
+        assert response['X-Content-Type-Options'] == 'nosniff'
+        assert body.count('event: status') == 2 and '"status": "delivered"' in body
+        assert [r.status_code for r in refused] == [302, 404, 400]
+    
+    @pytest.mark.django_db(transaction=True)
+    def test_idle_streams_hold_no_thread(self, order, customer_user, settings):
+        """Test open streams under Django's ASGI handler do not keep a thread each."""
+        settings.SSE_HEARTBEAT_SECONDS = 60
+        client = Client()
+        client.force_login(customer_user)
+        headers = [(b'host', b'testserver'), (b'cookie', f'sessionid={client.cookies["sessionid"].value}'.encode())]
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': reverse('orders:order_events', args=[order.pk]), 'query_string': b'', 'headers': headers,
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+        }
+        count = 10
+        
+        async def scenario():
+            handler = ASGIHandler()
+            opened = asyncio.Semaphore(0)
+            closing = asyncio.Event()
+            
+            async def stream():
+                requests = [{'type': 'http.request', 'body': b''}]
+                
+                async def receive():
+                    if requests:
+                        return requests.pop()
+                    await closing.wait()
+                    return {'type': 'http.disconnect'}
+                
+                async def send(message):
+                    if b'event: status' in message.get('body', b''):
+                        opened.release()
+                
+                await handler(scope, receive, send)
+            
+            before = threading.active_count()
+            tasks = [asyncio.create_task(stream()) for _ in range(count)]
+            for _ in range(count):
+                await asyncio.wait_for(opened.acquire(), 10)
+            # Released executors finish their threads shortly after.
+            await asyncio.sleep(0.2)
+            during = threading.active_count()
+            closing.set()
+            await asyncio.gather(*tasks)
+            return before, during
+        
+        # Not async_to_sync: under it sync work runs on the test's own thread.
+        before, during = asyncio.run(scenario())
+        assert during - before < 3
+    
+    def test_wsgi_fallback_and_permissions(self, order, customer_user):
+        """Test synchronous requests get one event and a retry hint; other customers are refused."""
+        url = reverse('orders:order_events', args=[order.pk])
+        client = Client()
+        client.force_login(customer_user)
+        response = client.get(url)
+        assert response['Content-Type'] == 'text/event-stream'
+        body = b''.join(response.streaming_content).decode()
+        assert body.count('event: status') == 1 and 'retry: ' in body
+        
+        other = Client()
+        other.force_login(User.objects.create_user(username='other', password='testpass123'))
+        assert other.get(url).status_code == 403
+    
+    def test_status_changes_are_published_on_commit(self, order, monkeypatch, django_capture_on_commit_callbacks):
+        """Test transitions publish the new status only once committed."""
+        published = []
+        monkeypatch.setattr(pubsub, 'publish', lambda channel, message: published.append((channel, message)))
+        with django_capture_on_commit_callbacks(execute=True):
+            transitions.apply({order.pk: 'paid'})
+            assert published == []
+        assert published == [(f'order:{order.pk}', transitions.event(order.pk, 'paid')), (kitchen.CHANNEL, {})]
+
+
+@pytest.mark.django_db
+class TestKitchenQueue:
+    """Test the kitchen queue and its since-cursor feed."""
+    
+    @pytest.fixture
+    def orders(self, customer_user, product):
+        orders = [Order.objects.create(customer=customer_user) for _ in range(3)]
+        for order in orders:
+            OrderItem.objects.create(order=order, product=product, quantity=2, price=product.price)
+        # Placed a while ago, outside the feed's lookback window.
+        Order.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+        return orders
+    
+    def test_cursor_round_trip(self):
+        """Test cursors survive encoding to the microsecond and reject garbage."""
+        stamp = timezone.now()
+        assert kitchen.parse_cursor(kitchen.encode_cursor(stamp, 7)) == (stamp, 7, frozenset())
+        seen = {(8, kitchen._microseconds(stamp) + 1500), (9, kitchen._microseconds(stamp))}
+        assert kitchen.parse_cursor(kitchen.encode_cursor(stamp, 7, seen)) == (stamp, 7, seen)
+        for garbage in ('yesterday', '1-2_3', '1-2_3.x', '1-2_3.4.5'):
+            with pytest.raises(kitchen.CursorError):
+                kitchen.parse_cursor(garbage)
+    
+    def test_changes_since_cursor(self, orders, settings):
+        """Test only orders changed after the cursor come back, oldest change first."""
+        cursor = kitchen.parse_cursor(kitchen.latest_cursor())
+        assert kitchen.changes(cursor)[0] == []
+        
+        transitions.apply({orders[1].pk: 'cancelled'})
+        transitions.apply({orders[0].pk: 'paid'})
+        changed, next_cursor = kitchen.changes(cursor)
+        assert [order.pk for order in changed] == [orders[1].pk, orders[0].pk]
+        # The position stays behind recent changes, but they are not delivered twice.
+        assert kitchen.parse_cursor(next_cursor)[0] < changed[0].updated_at
+        repeated, next_cursor = kitchen.changes(kitchen.parse_cursor(next_cursor))
+        assert repeated == []
+        transitions.apply({orders[0].pk: 'delivered'})
+        assert [order.pk for order in kitchen.changes(kitchen.parse_cursor(next_cursor))[0]] == [orders[0].pk]
+        settings.KITCHEN_LOOKBACK_SECONDS = 0
+        _, next_cursor = kitchen.changes(kitchen.parse_cursor(next_cursor))
+        assert kitchen.parse_cursor(next_cursor)[2] == frozenset()
+        assert kitchen.changes(kitchen.parse_cursor(next_cursor))[0] == []
+        assert [order.pk for order in kitchen.queue()] == [orders[2].pk]
+    
+    def test_late_commit_behind_cursor_is_delivered(self, orders, settings):
+        """Test an order stamped before the cursor but committed after it still comes back."""
+        settings.KITCHEN_LOOKBACK_SECONDS = 5
+        transitions.apply({orders[0].pk: 'paid'})
+        seen = Order.objects.get(pk=orders[0].pk).updated_at
+        cursor = kitchen.parse_cursor(kitchen.latest_cursor())
+        assert cursor[0] < seen
+        # Stamped just before the change the screen has seen, committed only now.
+        Order.objects.filter(pk=orders[2].pk).update(status='paid', updated_at=seen - timedelta(milliseconds=1))
+        
+        # Only the late commit: the change the screen has seen is not repeated.
+        assert [order.pk for order in kitchen.changes(cursor)[0]] == [orders[2].pk]
+        
+        # Without the lookback the cursor would already be past it.
+        settings.KITCHEN_LOOKBACK_SECONDS = 0
+        assert kitchen.parse_cursor(kitchen.latest_cursor()) == (seen, orders[0].pk, frozenset())
+    
+    def test_idle_poll_is_one_indexed_query(self, orders):
+        """Test a poll with nothing new runs one query, on the (status, updated_at) index."""
+        cursor = kitchen.parse_cursor(kitchen.latest_cursor())
+        with CaptureQueriesContext(connection) as queries:
+            kitchen.changes(cursor)
+        assert len(queries) == 1
+        
+        updated_at, order_id, _ = cursor
+        plan = Order.objects.filter(status__in=kitchen.ALL_STATUSES, updated_at__gt=updated_at).explain()
+        assert 'order_status_updated_idx' in plan
+    
+    def test_feed(self, orders, admin_user, customer_user):
+        """Test the feed returns the queue, then only changes; customers are refused."""
+        client = Client()
+        client.login(username='admin', password='admin123')
+        url = reverse('orders:kitchen_feed')
+        snapshot = client.get(url).json()
+        assert snapshot['reset'] and [order['id'] for order in snapshot['orders']] == [order.pk for order in orders]
+        assert snapshot['orders'][0]['items'] == [{'name': orders[0].items.get().product.name, 'quantity': 2}]
+        
+        transitions.apply({orders[2].pk: 'delivered'})
+        data = client.get(url, {'since': snapshot['cursor']}).json()
+        assert [(order['id'], order['queued']) for order in data['orders']] == [(orders[2].pk, False)]
+        # Still within the lookback window, but already delivered.
+        again = client.get(url, {'since': data['cursor']}).json()
+        assert again['orders'] == []
+        assert client.get(url, {'since': 'x'}).status_code == 400
+        
+        client.force_login(customer_user)
+        assert client.get(url).status_code == 403
+        assert client.get(reverse('orders:kitchen_queue')).status_code == 302
+    
+    def test_repeated_long_poll_waits(self, orders, admin_user, settings):
+        """Test an ASGI poll with an unchanged cursor waits instead of returning delivered orders."""
+        settings.KITCHEN_LOOKBACK_SECONDS = 5
+        transitions.apply({orders[0].pk: 'paid'})
+        url = reverse('orders:kitchen_feed')
+        
+        async def poll(since, wait):
+            client = AsyncClient()
+            await client.aforce_login(admin_user)
+            started = time.monotonic()
+            data = (await client.get(url, {'since': since, 'wait': wait})).json()
+            return data, time.monotonic() - started
+        
+        first, _ = async_to_sync(poll)(kitchen.encode_cursor(timezone.now() - timedelta(seconds=4), 0), 1)
+        assert [order['id'] for order in first['orders']] == [orders[0].pk]
+        for _ in range(2):
+            again, waited = async_to_sync(poll)(first['cursor'], 0.5)
+            assert again['orders'] == [] and waited >= 0.5
+    
+    def test_long_poll_wakes_on_change(self, orders, admin_user, monkeypatch):
+        """Test an ASGI poll waits for the kitchen message instead of answering empty."""
+        cursor = kitchen.latest_cursor()
+        new_order = Order.objects.create(customer=admin_user)
+        changes = kitchen.changes
+        calls = []
+        
+        def changes_after_wake(since):
+            # The first read predates the new order; the message wakes the second.
+            calls.append(since)
+            if len(calls) > 1:
+                return changes(since)
+            threading.Timer(0.1, pubsub.publish, (kitchen.CHANNEL, {})).start()
+            return [], cursor
+        
+        monkeypatch.setattr(kitchen, 'changes', changes_after_wake)
+        
+        async def poll():
+            client = AsyncClient()
+            await client.aforce_login(admin_user)
+            return await client.get(reverse('orders:kitchen_feed'), {'since': cursor, 'wait': '5'})
+        
+        data = async_to_sync(poll)().json()
+        assert len(calls) == 2
+        assert [order['id'] for order in data['orders']] == [new_order.pk]
@@ -0,0 +1,333 @@
+"""
+Query-budget regression tests for every named route.
+
+Each route is visited as an anonymous user, a customer and an admin against a
+seeded dataset, and the number of queries must stay within the budget below.
+Set PERF_REPORT=<path> to also write per-route query counts and wall-clock
+timings as JSON; compare two reports with
+``python -m benchmarks.compare_perf_reports old.json new.json``.
+"""
+import json
+import os
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from core import warmup
+from orders import archive
+from orders.models import ArchivedOrder, Order, OrderItem
+from products.models import Category, Product
+
+ROLES = ['anonymous', 'customer', 'admin']
+NAMESPACES = ['core', 'accounts', 'products', 'orders']
+
+# url name: (method, args factory, POST data or a factory for it)
+ROUTES = {
+    'core:home': ('get', lambda d: [], None),
+    'core:home_async': ('get', lambda d: [], None),
+    'core:metrics': ('get', lambda d: [], None),
+    'core:ready': ('get', lambda d: [], None),
+    'core:memory_report': ('get', lambda d: [], None),
+    'core:profile_list': ('get', lambda d: [], None),
+    'core:profile_download': ('get', lambda d: ['0-missing-0ms.prof'], None),
+    'accounts:register': ('get', lambda d: [], None),
+    'accounts:login': ('get', lambda d: [], None),
+    'accounts:logout': ('get', lambda d: [], None),
+    'accounts:profile': ('get', lambda d: [], None),
+    'products:product_list': ('get', lambda d: [], None),
+    'products:product_list_async': ('get', lambda d: [], None),
+    'products:product_detail': ('get', lambda d: [d['product'].pk], None),
+    'products:product_detail_async': ('get', lambda d: [d['product'].pk], None),
+    'products:product_create': ('get', lambda d: [], None),
+    'products:product_update': ('get', lambda d: [d['product'].pk], None),
+    'products:product_delete': ('get', lambda d: [d['product'].pk], None),
+    'products:category_detail': ('get', lambda d: [d['category'].slug], None),
+    'products:category_detail_async': ('get', lambda d: [d['category'].slug], None),
+    'orders:cart': ('get', lambda d: [], None),
+    'orders:add_to_cart': ('get', lambda d: [d['product'].pk], None),
+    'orders:remove_from_cart': ('post', lambda d: [d['product'].pk], {}),
+    'orders:update_cart': ('post', lambda d: [d['product'].pk], {'quantity': '3'}),
+    'orders:checkout': ('post', lambda d: [], {}),
+    'orders:order_list': ('get', lambda d: [], None),
+    'orders:order_list_async': ('get', lambda d: [], None),
+    'orders:order_detail': ('get', lambda d: [d['order'].pk], None),
+    'orders:order_events': ('get', lambda d: [d['order'].pk], None),
+    'orders:order_detail_async': ('get', lambda d: [d['order'].pk], None),
+    'orders:admin_order_list': ('get', lambda d: [], None),
+    'orders:update_order_status': ('post', lambda d: [d['order'].pk], {'status': 'paid'}),
+    'orders:bulk_update_order_status': ('post', lambda d: [], lambda d: {'status': 'paid', 'order_ids': [d['order'].pk]}),
+    'orders:export_orders': ('get', lambda d: [], {'status': 'pending'}),
+    'orders:kitchen_queue': ('get', lambda d: [], None),
+    'orders:kitchen_feed': ('get', lambda d: [], None),
+    'orders:sales_dashboard': ('get', lambda d: [], None),
+}
+
+# Maximum queries per route and role. Lower these when a route gets cheaper;
+# never raise one without understanding why the route got more expensive.
+BUDGETS = {
+    'core:home': {'anonymous': 2, 'customer': 5, 'admin': 5},
+    'core:home_async': {'anonymous': 2, 'customer': 7, 'admin': 7},
+    'core:metrics': {'anonymous': 0, 'customer': 0, 'admin': 0},
+    'core:ready': {'anonymous': 0, 'customer': 0, 'admin': 0},
+    'core:memory_report': {'anonymous': 0, 'customer': 3, 'admin': 3},
+    'core:profile_list': {'anonymous': 0, 'customer': 3, 'admin': 3},
+    'core:profile_download': {'anonymous': 0, 'customer': 3, 'admin': 3},
+    'accounts:register': {'anonymous': 0, 'customer': 3, 'admin': 3},
+    'accounts:login': {'anonymous': 0, 'customer': 3, 'admin': 3},
+    'accounts:logout': {'anonymous': 0, 'customer': 4, 'admin': 4},
+    'accounts:profile': {'anonymous': 0, 'customer': 3, 'admin': 3},
+    'products:product_list': {'anonymous': 3, 'customer': 6, 'admin': 6},
+    'products:product_list_async': {'anonymous': 3, 'customer': 8, 'admin': 8},
+    'products:product_detail': {'anonymous': 2, 'customer': 5, 'admin': 5},
+    'products:product_detail_async': {'anonymous': 1, 'customer': 4, 'admin': 4},
+    'products:product_create': {'anonymous': 0, 'customer': 3, 'admin': 4},
+    'products:product_update': {'anonymous': 0, 'customer': 3, 'admin': 5},
+    'products:product_delete': {'anonymous': 0, 'customer': 3, 'admin': 4},
+    'products:category_detail': {'anonymous': 2, 'customer': 5, 'admin': 5},
+    'products:category_detail_async': {'anonymous': 2, 'customer': 7, 'admin': 7},
+    'orders:cart': {'anonymous': 0, 'customer': 11, 'admin': 11},
+    'orders:add_to_cart': {'anonymous': 0, 'customer': 6, 'admin': 6},
+    'orders:remove_from_cart': {'anonymous': 0, 'customer': 5, 'admin': 5},
+    'orders:update_cart': {'anonymous': 0, 'customer': 5, 'admin': 5},
+    'orders:checkout': {'anonymous': 0, 'customer': 29, 'admin': 29},
+    'orders:order_list': {'anonymous': 0, 'customer': 6, 'admin': 5},
+    'orders:order_list_async': {'anonymous': 0, 'customer': 7, 'admin': 6},
+    'orders:order_detail': {'anonymous': 0, 'customer': 5, 'admin': 5},
+    'orders:order_events': {'anonymous': 0, 'customer': 3, 'admin': 4},
+    'orders:order_detail_async': {'anonymous': 0, 'customer': 6, 'admin': 6},
+    'orders:admin_order_list': {'anonymous': 0, 'customer': 3, 'admin': 5},
+    'orders:update_order_status': {'anonymous': 0, 'customer': 3, 'admin': 10},
+    'orders:bulk_update_order_status': {'anonymous': 0, 'customer': 3, 'admin': 9},
+    'orders:export_orders': {'anonymous': 0, 'customer': 3, 'admin': 5},
+    'orders:kitchen_queue': {'anonymous': 0, 'customer': 3, 'admin': 6},
+    'orders:kitchen_feed': {'anonymous': 0, 'customer': 3, 'admin': 6},
+    'orders:sales_dashboard': {'anonymous': 0, 'customer': 3, 'admin': 9},
+}
+
+# Admin changelists: model label: queries as a superuser (at most 100 rows).
+ADMIN_BUDGETS = {
+    'auth.Group': 5,
+    'auth.User': 6,
+    'accounts.UserProfile': 5,
+    'products.Category': 5,
+    'products.Product': 6,
+    'orders.Order': 5,
+    'orders.OrderItem': 5,
+    'orders.ArchivedOrder': 5,
+}
+
+# A list_filter choice to check too, where one cuts the table down.
+ADMIN_FILTERS = {
+    'accounts.UserProfile': {'role__exact': 'customer'},
+    'products.Product': {'is_available__exact': '1'},
+    'orders.Order': {'status__exact': 'pending'},
+    'orders.OrderItem': {'order__status': 'pending'},
+    'orders.ArchivedOrder': {'status__exact': 'delivered'},
+}
+
+_report = {}
+
+
+def _named_routes():
+    """Return every 'namespace:name' route of the project's apps."""
+    resolver = get_resolver()
+    names = set()
+    for namespace in NAMESPACES:
+        _, sub_resolver = resolver.namespace_dict[namespace]
+        names.update(
+            f'{namespace}:{name}' for name in sub_resolver.reverse_dict if isinstance(name, str)
+        )
+    return names
+
+
+@pytest.fixture(scope='module', autouse=True)
+def perf_report():
+    """Write the collected timings to $PERF_REPORT after the module runs."""
+    yield
+    path = os.environ.get('PERF_REPORT')
+    if path and _report:
+        with open(path, 'w') as f:
+            json.dump({'routes': _report}, f, indent=2, sort_keys=True)
+
+
+@pytest.fixture(autouse=True)
+def warmed_worker(monkeypatch):
+    """Measure routes as served by a worker that finished warm-up."""
+    monkeypatch.setitem(warmup._state, 'ready', True)
+
+
+@pytest.fixture
+def dataset(db):
+    """Seed a realistic menu and order history."""
+    categories = Category.objects.bulk_create([
+        Category(name=f'Category {i}', slug=f'category-{i}') for i in range(6)
+    ])
+    products = Product.objects.bulk_create([
+        Product(
+            name=f'Pizza {i}',
+            description='A seeded pizza',
+            price=Decimal('8.50') + i % 7,
+            category=categories[i % len(categories)],
+            is_available=i % 10 != 0,
+        )
+        for i in range(60)
+    ])
+    customer = User.objects.create(username='customer')
+    admin = User.objects.create(username='admin')
+    admin.profile.role = 'admin'
+    admin.profile.save()
+    orders = Order.objects.bulk_create([
+        Order(customer=customer, status='pending', total_price=Decimal('30.00')) for _ in range(25)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=products[(o + i) % len(products)], quantity=i + 1, price=Decimal('10.00'))
+        for o, order in enumerate(orders) for i in range(8)
+    ])
+    cart = {
+        str(product.pk): {'quantity': 2, 'price': str(product.price), 'name': product.name}
+        for product in products[1:9]
+    }
+    return {
+        'category': categories[1],
+        'product': products[1],
+        'order': orders[0],
+        'users': {'customer': customer, 'admin': admin},
+        'cart': cart,
+    }
+
+
+def _client_for(role, dataset):
+    client = Client()
+    if role != 'anonymous':
+        client.force_login(dataset['users'][role])
+        session = client.session
+        session['cart'] = dict(dataset['cart'])
+        session.save()
+    return client
+
+
+def test_every_route_has_a_budget():
+    """Test new routes cannot be added without a query budget."""
+    assert _named_routes() == set(ROUTES)
+    assert set(BUDGETS) == set(ROUTES)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('role', ROLES)
+@pytest.mark.parametrize('url_name', sorted(ROUTES))
+def test_route_query_budget(url_name, role, dataset):
+    """Test each route stays within its query budget."""
+    method, args, data = ROUTES[url_name]
+    client = _client_for(role, dataset)
+    url = reverse(url_name, args=args(dataset))
+    if callable(data):
+        data = data(dataset)
+
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as ctx:
+        response = getattr(client, method)(url, data)
+        if response.streaming:
+            # Streamed bodies run their queries as they are consumed.
+            b''.join(response.streaming_content)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    _report.setdefault(url_name, {})[role] = {
+        'status': response.status_code,
+        'queries': len(ctx.captured_queries),
+        'wall_ms': round(elapsed_ms, 3),
+    }
+    assert response.status_code < 500
+    budget = BUDGETS[url_name][role]
+    assert len(ctx.captured_queries) <= budget, (
+        f'{url_name} as {role} ran {len(ctx.captured_queries)} queries (budget {budget}):\n'
+        + '\n'.join(q['sql'] for q in ctx.captured_queries)
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('role', ['customer', 'admin'])
+@pytest.mark.parametrize('url_name', ['orders:order_detail', 'orders:order_detail_async'])
+def test_order_detail_queries_do_not_grow_with_lines(url_name, role, dataset):
+    """Test an order page costs the same queries for one line or sixty, hot or archived."""
+    customer = dataset['users']['customer']
+    products = list(Product.objects.all())
+    # The newest order is never archived, so the large one comes first.
+    large, small = Order.objects.bulk_create([Order(customer=customer), Order(customer=customer)])
+    OrderItem.objects.bulk_create(
+        [OrderItem(order=small, product=products[0], quantity=1, price=Decimal('10.00'))]
+        + [OrderItem(order=large, product=product, quantity=2, price=Decimal('10.00')) for product in products]
+    )
+    client = _client_for(role, dataset)
+    counts = {}
+    for label, order in [('1 line', small), (f'{len(products)} lines', large)]:
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse(url_name, args=[order.pk]))
+        assert response.status_code == 200
+        assert response.content.count(b'<td><strong>$') == order.items.count()
+        counts[label] = len(ctx.captured_queries)
+    
+    Order.objects.filter(pk=large.pk).update(status='delivered', updated_at=timezone.now() - timedelta(days=400))
+    archive.archive_orders(archive.cutoff())
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(reverse(url_name, args=[large.pk]))
+    assert b'Archived' in response.content
+    # The archive is only looked up after missing in the hot table.
+    counts['archived'] = len(ctx.captured_queries) - 1
+    
+    assert len(set(counts.values())) == 1, counts
+    assert counts['1 line'] <= BUDGETS[url_name][role]
+
+
+@pytest.fixture
+def admin_client(dataset):
+    """A superuser for the Django admin, with archived orders to list as well."""
+    customer = dataset['users']['customer']
+    now = timezone.now()
+    ArchivedOrder.objects.bulk_create([
+        ArchivedOrder(
+            id=10000 + i, customer=customer, created_at=now, updated_at=now, status='delivered', total_price=Decimal('9.99'),
+        )
+        for i in range(30)
+    ])
+    client = Client()
+    client.force_login(User.objects.create_superuser(username='superuser', password='x'))
+    return client
+
+
+def test_every_admin_changelist_has_a_budget():
+    """Test new admin registrations cannot be added without a query budget."""
+    assert {model._meta.label for model in admin.site._registry} == set(ADMIN_BUDGETS)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('label', sorted(ADMIN_BUDGETS))
+def test_admin_changelist_query_budget(label, admin_client):
+    """Test each admin changelist stays within its budget, also when searched and filtered."""
+    model = apps.get_model(label)
+    url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+    model_admin = admin.site._registry[model]
+    requests = [{}]
+    if model_admin.search_fields:
+        requests.append({'q': '1'})
+    if label in ADMIN_FILTERS:
+        requests.append(ADMIN_FILTERS[label])
+    for params in requests:
+        with CaptureQueriesContext(connection) as ctx:
+            response = admin_client.get(url, params)
+        assert response.status_code == 200
+        _report.setdefault(f'admin:{label}', {})[str(params or 'list')] = {'queries': len(ctx.captured_queries)}
+        budget = ADMIN_BUDGETS[label]
+        assert len(ctx.captured_queries) <= budget, (
+            f'{label} changelist {params} ran {len(ctx.captured_queries)} queries (budget {budget}):\n'
+            + '\n'.join(q['sql'] for q in ctx.captured_queries)
+        )
@@ -1,7 +1,11 @@
 import pytest
+import threading
+import time
 from django.contrib.auth.models import User
+from django.db import OperationalError, connection, transaction
 from django.urls import reverse
 from django.test import Client
+from products import stock
 from products.models import Category, Product
 from accounts.models import UserProfile
 
@@ -203,3 +207,133 @@ class TestProductViews:
         assert product in response.context['products']
 
 
+
+
+@pytest.mark.django_db
+class TestAsyncProductViews:
+    """Test async read views for products."""
+    
+    @pytest.fixture
+    def client(self):
+        return Client()
+    
+    @pytest.fixture
+    def category(self):
+        return Category.objects.create(name='Test Category', slug='test-category')
+    
+    @pytest.fixture
+    def products(self, category):
+        available = Product.objects.create(
+            name='Available', description='Test', price=10.00, category=category, is_available=True
+        )
+        unavailable = Product.objects.create(
+            name='Unavailable', description='Test', price=10.00, category=category, is_available=False
+        )
+        return available, unavailable
+    
+    def test_product_list_async_hides_unavailable(self, client, products):
+        """Test async product list filters unavailable products for customers."""
+        available, unavailable = products
+        response = client.get(reverse('products:product_list_async'))
+        assert response.status_code == 200
+        assert available in response.context['products']
+        assert unavailable not in response.context['products']
+        assert response.context['page_obj'].paginator.count == 1
+    
+    def test_product_list_async_invalid_page(self, client, products):
+        """Test async product list returns 404 for an out-of-range page."""
+        response = client.get(reverse('products:product_list_async'), {'page': 99})
+        assert response.status_code == 404
+    
+    def test_product_detail_async(self, client, products):
+        """Test async product detail view."""
+        available, _ = products
+        response = client.get(reverse('products:product_detail_async', args=[available.pk]))
+        assert response.status_code == 200
+        assert response.context['product'] == available
+    
+    def test_category_detail_async(self, client, category, products):
+        """Test async category detail view."""
+        available, unavailable = products
+        response = client.get(reverse('products:category_detail_async', args=[category.slug]))
+        assert response.status_code == 200
+        assert response.context['products'] == [available]
+
+
+@pytest.mark.django_db
+class TestStock:
+    """Test stock reservation for limited products."""
+    
+    @pytest.fixture
+    def special(self, product):
+        Product.objects.filter(pk=product.pk).update(stock=3)
+        return product
+    
+    def test_reserve_takes_units_until_sold_out(self, special):
+        """Test reservations decrement stock and the last units switch availability off."""
+        assert stock.reserve(special.pk, 2)
+        special.refresh_from_db()
+        assert (special.stock, special.is_available) == (1, True)
+        assert not stock.sold_out([special.pk])
+        
+        assert stock.reserve(special.pk, 1)
+        special.refresh_from_db()
+        assert (special.stock, special.is_available) == (0, False)
+        assert stock.sold_out([special.pk])
+        assert not stock.reserve(special.pk, 1)
+    
+    def test_reserve_never_takes_part_of_a_request(self, special):
+        """Test asking for more than is left changes nothing."""
+        assert not stock.reserve(special.pk, 4)
+        special.refresh_from_db()
+        assert (special.stock, special.is_available) == (3, True)
+    
+    def test_release_makes_sold_out_product_available(self, special):
+        """Test returned units restock a product that had sold out."""
+        stock.reserve(special.pk, 3)
+        stock.release(special.pk, 2)
+        special.refresh_from_db()
+        assert (special.stock, special.is_available) == (2, True)
+    
+    def test_catalog_version_moves_on_commit(self, special, django_capture_on_commit_callbacks):
+        """Test product saves and sell-outs retire cached catalog pages once committed."""
+        version = stock.catalog_version()
+        with django_capture_on_commit_callbacks(execute=True):
+            special.save()
+            assert stock.catalog_version() == version
+        assert stock.catalog_version() != version
+    
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_reservations_never_oversell(self, special):
+        """Test many threads competing for the last units take exactly the stock."""
+        workers = 24
+        results = []
+        barrier = threading.Barrier(workers)
+        
+        def buy():
+            barrier.wait()
+            deadline = time.monotonic() + 10
+            try:
+                while time.monotonic() < deadline:
+                    try:
+                        with transaction.atomic():
+                            results.append(stock.reserve(special.pk, 1))
+                        return
+                    except OperationalError:
+                        # The in-memory test database locks instead of waiting.
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=buy) for _ in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        
+        special.refresh_from_db()
+        assert len(results) == workers, f'{workers - len(results)} buyers never got an answer in {elapsed:.1f}s'
+        assert results.count(True) == 3
+        assert (special.stock, special.is_available) == (0, False)